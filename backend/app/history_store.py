@@ -1,24 +1,65 @@
 """Shared conversation-history store.
 
-Phase-1 deliverable: Provides a thin abstraction around LangChain's
-`InMemoryChatMessageHistory` so that multiple endpoints (chat & agent)
-can share the same underlying cache without being coupled to a concrete
-implementation.
+Provides a small store abstraction so that multiple endpoints (chat & agent)
+can share conversation history without being coupled to a concrete backend.
+`InMemoryHistoryStore` is the bounded process-local default; SQLite and Mongo
+live in `app.history_store_sqlite` and `app.history_store_mongo`.
 """
 from __future__ import annotations
 
-from typing import Dict, Protocol
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Sequence, Tuple
 import os
+import threading
+import time
 
-from langchain_core.chat_history import InMemoryChatMessageHistory, BaseChatMessageHistory
-from langchain_core.messages import BaseMessage
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    message_to_dict,
+    messages_from_dict,
+)
 from app.config import logger
-# Conditional import to avoid heavy deps when not needed
-try:
-    from app.history_store_mongo import MongoHistoryStore  # noqa: F401
-except Exception:  # pragma: no cover – optional dependency not available yet
-    MongoHistoryStore = None  # type: ignore
-    #logger.error("MongoHistoryStore is not available")
+from app.services.metrics import counter, gauge
+
+
+# ---------------------------------------------------------------------
+# Retention settings (shared by all backends)
+# ---------------------------------------------------------------------
+
+
+def max_messages() -> int:
+    """Messages kept per session (``HISTORY_MAX_MESSAGES``, 0 = unlimited).
+
+    Older messages are moved to an archive by persistent backends and dropped
+    by the in-memory one.
+    """
+    return int(os.getenv("HISTORY_MAX_MESSAGES", "1000"))
+
+
+def retention_days() -> float:
+    """Age after which messages expire (``HISTORY_TTL_DAYS``, 0 = never)."""
+    return float(os.getenv("HISTORY_TTL_DAYS", "0"))
+
+
+@dataclass
+class HistoryPage:
+    """One page of a session's history, oldest message first."""
+
+    messages: List[BaseMessage]
+    # Pass back as ``before`` to fetch the preceding page; None on the first message.
+    next_cursor: Optional[str]
+
+
+class InvalidCursor(ValueError):
+    """The ``before`` cursor was not produced by this backend."""
 
 
 class AbstractHistoryStore(Protocol):
@@ -32,81 +73,370 @@ class AbstractHistoryStore(Protocol):
         """Remove the conversation identified by *session_id* if it exists."""
         ...
 
+    async def aget(self, session_id: str) -> BaseChatMessageHistory:  # pragma: no cover
+        """Async variant of `get` for use inside async routes."""
+        ...
+
+    def get_page(self, session_id: str, limit: int = 50, before: Optional[str] = None) -> HistoryPage:  # pragma: no cover
+        """Return up to *limit* messages preceding cursor *before* (default: the newest)."""
+        ...
 
-class InMemoryHistoryStore(AbstractHistoryStore):
-    """Process-local dictionary-based store – good enough for dev & unit tests."""
 
-    _store: Dict[str, InMemoryChatMessageHistory]
+# ---------------------------------------------------------------------
+# In-memory backend
+# ---------------------------------------------------------------------
 
-    # -----------------------------------------------------------------
-    # Helper: ensure message.content is always a string (Gemini safeguard)
-    # -----------------------------------------------------------------
-    class _SafeChatHistory(InMemoryChatMessageHistory):
-        """In-memory history that prevents list-style content from being stored."""
+MEMORY_SESSIONS = gauge("documentor_history_memory_sessions", "Sessions held by the in-memory history store.")
+MEMORY_BYTES = gauge("documentor_history_memory_bytes", "Approximate bytes of messages held in memory.")
+MEMORY_EVICTIONS = counter(
+    "documentor_history_memory_evictions_total", "In-memory sessions evicted, by reason (ttl, lru, bytes)."
+)
 
-        @staticmethod
-        def _flatten_content(msg: BaseMessage):  # type: ignore[override]
-            if isinstance(getattr(msg, "content", None), list):
-                msg.content = "\n".join(map(str, msg.content))  # type: ignore[attr-defined]
+# Plain messages are kept as (type, content) tuples; anything carrying extra
+# fields (tool calls, ids, kwargs) keeps its full dict form.
+_COMPACT_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+_EXTRA_FIELDS = ("additional_kwargs", "response_metadata", "tool_calls", "invalid_tool_calls", "usage_metadata", "id", "name")
+_ENTRY_OVERHEAD = 64  # tuple + list slot, roughly
 
-        def add_message(self, message: BaseMessage):  # type: ignore[override]
-            self._flatten_content(message)
-            super().add_message(message)
 
-        def __init__(self, **data):  # type: ignore[override]
-            super().__init__(**data)
-            # Repair any legacy bad messages already present
-            for m in self.messages:
-                self._flatten_content(m)
+def _flatten_content(msg: BaseMessage) -> None:
+    # Gemini may stream list content; the prompt templates expect strings.
+    if isinstance(getattr(msg, "content", None), list):
+        msg.content = "\n".join(map(str, msg.content))  # type: ignore[attr-defined]
+
+
+def _encode(msg: BaseMessage) -> Tuple[str, Any]:
+    _flatten_content(msg)
+    if msg.type in _COMPACT_TYPES and not any(getattr(msg, f, None) for f in _EXTRA_FIELDS):
+        return msg.type, msg.content
+    return "", message_to_dict(msg)
+
+
+def _decode(entry: Tuple[str, Any]) -> BaseMessage:
+    kind, payload = entry
+    if kind:
+        return _COMPACT_TYPES[kind](content=payload)
+    return messages_from_dict([payload])[0]
+
+
+def _entry_size(entry: Tuple[str, Any]) -> int:
+    kind, payload = entry
+    if kind:
+        return _ENTRY_OVERHEAD + len(payload)
+    return _ENTRY_OVERHEAD + len(repr(payload))
+
+
+class _Session:
+    __slots__ = ("entries", "nbytes", "last_access", "dropped")
+
+    def __init__(self, now: float) -> None:
+        self.entries: List[Tuple[str, Any]] = []
+        self.nbytes = 0
+        self.last_access = now
+        self.dropped = 0  # messages trimmed by the per-session cap; keeps cursors stable
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions")
 
     def __init__(self) -> None:
-        self._store = {}
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()  # LRU order, oldest first
+
+
+class _MemoryChatHistory(BaseChatMessageHistory):
+    """View of one session in `InMemoryHistoryStore`; all state lives in the store."""
+
+    def __init__(self, store: "InMemoryHistoryStore", session_id: str) -> None:
+        self._store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        return self._store._read(self.session_id)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._store._append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self._store.clear(self.session_id)
+
+
+class InMemoryHistoryStore(AbstractHistoryStore):
+    """Process-local, bounded store – the default for dev and single-replica use.
+
+    Sessions are spread over ``HISTORY_MEMORY_SHARDS`` (16) lock-protected
+    shards, so concurrent requests only contend when their sessions share a
+    shard. Idle sessions expire after ``HISTORY_MEMORY_TTL_S`` (3600; 0
+    disables). Least-recently-used sessions are evicted beyond
+    ``HISTORY_MEMORY_MAX_SESSIONS`` (10000) or once the stored messages
+    exceed ``HISTORY_MEMORY_MAX_BYTES`` (256 MiB, measured approximately).
+    Sessions keep their newest `max_messages` messages.
+    """
+
+    def __init__(
+        self,
+        *,
+        shards: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+    ) -> None:
+        n_shards = max(1, shards or int(os.getenv("HISTORY_MEMORY_SHARDS", "16")))
+        self._shards = [_Shard() for _ in range(n_shards)]
+        max_sessions = max_sessions or int(os.getenv("HISTORY_MEMORY_MAX_SESSIONS", "10000"))
+        self._max_per_shard = max(1, -(-max_sessions // n_shards))
+        self._max_bytes = max_bytes or int(os.getenv("HISTORY_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+        self._ttl_s = float(os.getenv("HISTORY_MEMORY_TTL_S", "3600")) if ttl_s is None else ttl_s
+        self._max_messages = max_messages()
+
+        self._bytes = 0
+        self._count = 0
+        self._next_sweep = time.monotonic() + self._sweep_interval()
+        self._totals_lock = threading.Lock()  # guards _bytes / _count; innermost lock
 
     # ---------------------------------------------------------------------
     # API
     # ---------------------------------------------------------------------
-    def get(self, session_id: str) -> InMemoryChatMessageHistory:
-        if session_id not in self._store:
-            self._store[session_id] = self._SafeChatHistory()
-        # DEBUG observability – helpful in production support
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        shard = self._shard(session_id)
+        with shard.lock:
+            self._touch(shard, session_id, create=True)
+        logger.debug("HistoryStore.get(session=%s) -> size=%d", session_id, self._count)
+        return _MemoryChatHistory(self, session_id)
+
+    def clear(self, session_id: str) -> None:
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = shard.sessions.pop(session_id, None)
+        if session is not None:
+            self._account(-session.nbytes, -1)
+
+    async def aget(self, session_id: str) -> BaseChatMessageHistory:
+        return self.get(session_id)
+
+    def get_page(self, session_id: str, limit: int = 50, before: Optional[str] = None) -> HistoryPage:
+        # Cursors are absolute message positions, so trimming does not shift them.
         try:
-            from app.config import logger  # local import avoids circularity
+            end = int(before) if before is not None else None
+        except ValueError:
+            raise InvalidCursor(before) from None
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = self._touch(shard, session_id, create=False)
+            if session is None:
+                return HistoryPage([], None)
+            total = session.dropped + len(session.entries)
+            end = total if end is None else max(session.dropped, min(end, total))
+            start = max(session.dropped, end - limit)
+            entries = session.entries[start - session.dropped:end - session.dropped]
+            cursor = str(start) if start > session.dropped else None  # a concurrent trim moves `dropped`
+        return HistoryPage([_decode(e) for e in entries], cursor)
 
-            logger.debug(
-                "HistoryStore.get(session=%s) -> size=%d", session_id, len(self._store)
-            )
-        except Exception:
-            # Never break functional flow because of logging issues
-            pass
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": self._count, "bytes": self._bytes, "shards": len(self._shards)}
 
-        return self._store[session_id]
+    # ---------------------------------------------------------------------
+    # Internals used by `_MemoryChatHistory`
+    # ---------------------------------------------------------------------
+    def _read(self, session_id: str) -> List[BaseMessage]:
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = self._touch(shard, session_id, create=False)
+            entries = list(session.entries) if session else []
+        return [_decode(e) for e in entries]
 
-    def clear(self, session_id: str) -> None:
-        self._store.pop(session_id, None)
+    def _append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        entries = [_encode(m) for m in messages]
+        added = sum(_entry_size(e) for e in entries)
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = self._touch(shard, session_id, create=True)
+            session.entries.extend(entries)
+            session.nbytes += added
+            overflow = len(session.entries) - self._max_messages if self._max_messages else 0
+            if overflow > 0:
+                trimmed = sum(_entry_size(e) for e in session.entries[:overflow])
+                del session.entries[:overflow]
+                session.dropped += overflow
+                session.nbytes -= trimmed
+                added -= trimmed
+            freed, dropped = self._evict_lru(shard)
+        self._account(added - freed, -dropped)
+        if self._bytes > self._max_bytes:
+            self._enforce_byte_cap()
+        if self._ttl_s and time.monotonic() >= self._next_sweep:
+            self._sweep_expired()
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _touch(self, shard: _Shard, session_id: str, *, create: bool) -> Optional[_Session]:
+        """Return the session (refreshing its LRU position); caller holds ``shard.lock``."""
+        now = time.monotonic()
+        session = shard.sessions.get(session_id)
+        if session is not None and self._ttl_s and now - session.last_access > self._ttl_s:
+            del shard.sessions[session_id]
+            MEMORY_EVICTIONS.inc(reason="ttl")
+            self._account(-session.nbytes, -1)
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = shard.sessions[session_id] = _Session(now)
+            self._account(0, 1)
+        else:
+            shard.sessions.move_to_end(session_id)
+            session.last_access = now
+        return session
+
+    def _evict_lru(self, shard: _Shard) -> Tuple[int, int]:
+        """Drop expired and over-quota sessions of *shard*; caller holds its lock."""
+        freed = dropped = 0
+        now = time.monotonic()
+        while shard.sessions:
+            sid, oldest = next(iter(shard.sessions.items()))
+            if self._ttl_s and now - oldest.last_access > self._ttl_s:
+                reason = "ttl"
+            elif len(shard.sessions) > self._max_per_shard:
+                reason = "lru"
+            else:
+                break
+            del shard.sessions[sid]
+            MEMORY_EVICTIONS.inc(reason=reason)
+            freed += oldest.nbytes
+            dropped += 1
+        return freed, dropped
+
+    def _sweep_interval(self) -> float:
+        return min(self._ttl_s, 60.0) if self._ttl_s else 0.0
+
+    def _sweep_expired(self) -> None:
+        """Expire idle sessions in every shard (appends only expire their own shard)."""
+        self._next_sweep = time.monotonic() + self._sweep_interval()
+        for shard in self._shards:
+            with shard.lock:
+                freed, dropped = self._evict_lru(shard)
+            if dropped:
+                self._account(-freed, -dropped)
+
+    def _enforce_byte_cap(self) -> None:
+        """Evict the globally least-recently-used sessions until under the byte cap."""
+        while self._bytes > self._max_bytes:
+            # Oldest head across shards; approximate under concurrent access, which is fine.
+            heads = []
+            for shard in self._shards:
+                with shard.lock:
+                    if shard.sessions:
+                        heads.append((next(iter(shard.sessions.values())).last_access, shard))
+            if not heads:
+                return
+            _, shard = min(heads, key=lambda h: h[0])
+            with shard.lock:
+                if not shard.sessions:
+                    continue
+                _, session = shard.sessions.popitem(last=False)
+            MEMORY_EVICTIONS.inc(reason="bytes")
+            self._account(-session.nbytes, -1)
+
+    def _account(self, delta_bytes: int, delta_sessions: int) -> None:
+        with self._totals_lock:
+            self._bytes += delta_bytes
+            self._count += delta_sessions
+            MEMORY_BYTES.set(self._bytes)
+            MEMORY_SESSIONS.set(self._count)
 
     # ---------------------------------------------------------------------
     # Convenience helpers
     # ---------------------------------------------------------------------
     def __len__(self) -> int:  # pragma: no cover
-        return len(self._store)
+        return self._count
 
     def __contains__(self, session_id: str) -> bool:  # pragma: no cover
-        return session_id in self._store
+        shard = self._shard(session_id)
+        with shard.lock:
+            return session_id in shard.sessions
 
 
 # ---------------------------------------------------------------------
 # Backend selection (env-flag)
 # ---------------------------------------------------------------------
+# The store is built on first use rather than at import time so that importing
+# the API never opens database connections (and works offline).
+
+
+@lru_cache()
+def get_history_store() -> AbstractHistoryStore:
+    """Return the process-wide history store selected by ``HISTORY_BACKEND``."""
+    backend_choice = os.getenv("HISTORY_BACKEND", "mongo").lower()
+
+    if backend_choice == "mongo":
+        # Conditional import to avoid heavy deps when not needed
+        try:
+            from app.history_store_mongo import MongoHistoryStore
+
+            return MongoHistoryStore()
+        except Exception as exc:  # pragma: no cover – optional dependency / config missing
+            logger.error("MongoHistoryStore is not available (%s); using in-memory history.", exc)
+
+    if backend_choice == "sqlite":
+        try:
+            from app.history_store_sqlite import SQLiteHistoryStore
+
+            return SQLiteHistoryStore()
+        except Exception as exc:  # pragma: no cover – unwritable path etc.
+            logger.error("SQLiteHistoryStore is not available (%s); using in-memory history.", exc)
+
+    return InMemoryHistoryStore()
+
+
+# ---------------------------------------------------------------------
+# Resident histories (long-lived connections)
+# ---------------------------------------------------------------------
+
+_RESIDENT: ContextVar[Optional[Tuple[str, BaseChatMessageHistory]]] = ContextVar(
+    "documentor_resident_history", default=None
+)
+
+
+@contextmanager
+def resident_history(session_id: str, history: BaseChatMessageHistory) -> Iterator[None]:
+    """Serve *history* for *session_id* without a store lookup in the enclosed code.
+
+    A WebSocket session loads its history once and keeps it for the life of
+    the connection; turns run inside this context.
+    """
+    token = _RESIDENT.set((session_id, history))
+    try:
+        yield
+    finally:
+        _RESIDENT.reset(token)
+
+
+def session_history(session_id: str) -> BaseChatMessageHistory:
+    """History of *session_id*: the resident one if set, else from the store."""
+    resident = _RESIDENT.get()
+    if resident is not None and resident[0] == session_id:
+        return resident[1]
+    return get_history_store().get(session_id)
+
 
-backend_choice = os.getenv("HISTORY_BACKEND", "mongo").lower()
+def __getattr__(name: str) -> Any:
+    # Backwards compatibility: `from app.history_store import DEFAULT_HISTORY_STORE`
+    if name == "DEFAULT_HISTORY_STORE":
+        return get_history_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-if backend_choice == "mongo" and MongoHistoryStore is not None:
-    DEFAULT_HISTORY_STORE = MongoHistoryStore()  # type: ignore
-else:
-    DEFAULT_HISTORY_STORE = InMemoryHistoryStore()
 
 __all__ = [
     "AbstractHistoryStore",
+    "HistoryPage",
+    "InvalidCursor",
     "InMemoryHistoryStore",
     "DEFAULT_HISTORY_STORE",
-] 
\ No newline at end of file
+    "get_history_store",
+    "max_messages",
+    "resident_history",
+    "retention_days",
+    "session_history",
+]
@@ -3,22 +3,75 @@
 Implements the same contract as *InMemoryHistoryStore* but persists every
 message in a flat *messages* collection so multiple API replicas can share the
 conversation log and the data survives process restarts.
+
+Concurrency model: sync callers (`get`, `append`, `clear`) use the pooled
+pymongo client directly – no event loop involved – while async routes use
+the native Motor methods (`aget`, `aappend_many`, `aclear`) on the client
+bound to their running loop.
+
+Appends go through a write-behind buffer (`app.history_write_behind`): they
+return immediately and are written in ``insert_many`` batches by a
+background thread. Reads flush the session first, so they always see earlier
+appends. Set ``HISTORY_WRITE_BEHIND=false`` to write synchronously.
+
+Loaded sessions are kept in a per-process LRU cache (``HISTORY_CACHE_SESSIONS``,
+default 1024; 0 disables it). On a hit only documents at or after the cached
+``created_at`` watermark are fetched. ``created_at`` is stamped when a batch
+is written, not when it is queued, so a delayed or retried flush still lands
+ahead of other replicas' watermarks. The query window reaches back
+``HISTORY_CACHE_OVERLAP_S`` seconds (default 5) for clock skew and in-flight
+writes; already-seen ids are skipped. A recently seen message missing from
+that window means the session was cleared (possibly on another replica), and
+triggers a full reload. Every entry is fully reloaded at least every
+``HISTORY_CACHE_TTL_S`` seconds (default 300).
+
+Retention: after each write, sessions that may exceed ``HISTORY_MAX_MESSAGES``
+have their oldest messages moved to ``messages_archive``; `clear` deletes
+a session from both collections. Expiry after ``HISTORY_TTL_DAYS`` is a TTL
+index created by ``scripts/init_indexes``.
+`get_page` reads a session backwards in pages through the
+``(session_id, created_at, _id)`` index, however long the session is.
 """
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
-from typing import List
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
 
-from app.mongo import get_mongo_client
-from app.history_store import AbstractHistoryStore, DEFAULT_HISTORY_STORE
+from app.config import logger
+from app.mongo import get_async_mongo_client, get_sync_mongo_client
+from app.history_store import AbstractHistoryStore, HistoryPage, InvalidCursor, max_messages
+from app.history_write_behind import WriteBehindBuffer, write_behind_enabled
+from app.services.metrics import counter
 
 # MongoDB / Atlas constants ---------------------------------------------------
-DB_NAME = "documentor"
+DB_NAME = os.getenv("MONGODB_DB", "documentor")
 COLLECTION_NAME = "messages"
+ARCHIVE_SUFFIX = "_archive"
+
+# Insertion order: created_at can tie within one insert_many, _id cannot.
+_SORT = [("created_at", 1), ("_id", 1)]
+_SORT_DESC = [("created_at", -1), ("_id", -1)]
+# Only what deserialisation and the watermark need (no session_id, no extras).
+_PROJECTION = {"message": 1, "created_at": 1}
+
+HISTORY_CACHE = counter(
+    "documentor_history_cache_total", "Session-history loads by cache result (hit or miss)."
+)
+HISTORY_DOCS_FETCHED = counter(
+    "documentor_history_docs_fetched_total", "Message documents transferred from Mongo for history loads."
+)
+HISTORY_ARCHIVED = counter(
+    "documentor_history_archived_messages_total", "Messages moved to the archive by the per-session cap."
+)
 
 
 # Helpers ---------------------------------------------------------------------
@@ -53,26 +106,146 @@ def _deserialise_messages(raw: List[dict]) -> List[BaseMessage]:
     return msgs
 
 
+def _stamp(docs: List[dict]) -> List[dict]:
+    """Set ``created_at`` to the write time.
+
+    Other replicas only fetch documents newer than what they have seen, so a
+    document must not carry the (possibly much earlier) time it was queued.
+    A retried document that is already stored keeps its stored timestamp.
+    """
+    now = datetime.now(timezone.utc)
+    for doc in docs:
+        doc["created_at"] = now
+    return docs
+
+
+# Session cache ---------------------------------------------------------------
+
+@dataclass
+class _CachedSession:
+    messages: List[BaseMessage] = field(default_factory=list)
+    watermark: Optional[datetime] = None  # newest created_at seen
+    recent_ids: Dict[Any, datetime] = field(default_factory=dict)  # _id -> created_at inside the overlap window
+    loaded_at: float = field(default_factory=time.monotonic)  # last full load
+
+
+class _SessionCache:
+    """LRU of loaded sessions with incremental (watermark) refresh."""
+
+    def __init__(self, max_sessions: int, overlap: timedelta, max_messages: int = 0, ttl_s: float = 300.0) -> None:
+        self._max_sessions = max_sessions
+        self._overlap = overlap
+        self._ttl_s = ttl_s
+        self._max_messages = max_messages
+        self._entries: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_sessions > 0
+
+    def query(self, session_id: str) -> Tuple[dict, bool]:
+        """Mongo filter for the documents the cache may not have, and whether it is a full load."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            fresh = entry is not None and time.monotonic() - entry.loaded_at < self._ttl_s
+            watermark = entry.watermark if fresh else None
+        HISTORY_CACHE.inc(result="hit" if watermark is not None else "miss")
+        if watermark is None:
+            return {"session_id": session_id}, True
+        return {"session_id": session_id, "created_at": {"$gte": watermark - self._overlap}}, False
+
+    def merge(self, session_id: str, docs: List[dict], *, full: bool) -> Optional[List[BaseMessage]]:
+        """Fold fetched *docs* into the cache and return the full history.
+
+        *full* marks a complete load (cache miss), which replaces the entry.
+        Returns None when an incremental load shows that messages were
+        deleted since they were cached; the caller then loads in full.
+        """
+        HISTORY_DOCS_FETCHED.inc(len(docs))
+        if not self.enabled:
+            return _deserialise_messages(docs)
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if not full and entry is not None:
+                fetched = {d.get("_id") for d in docs}
+                if any(_id not in fetched for _id in entry.recent_ids):
+                    return None  # cleared (or trimmed) by another process
+            if full or entry is None:
+                entry = _CachedSession()
+            horizon = entry.watermark - self._overlap if entry.watermark else None
+            new_docs = [
+                d for d in docs
+                if d.get("_id") not in entry.recent_ids
+                and (horizon is None or d.get("created_at") is None or d["created_at"] >= horizon)
+            ]
+            entry.messages.extend(_deserialise_messages(new_docs))
+            if self._max_messages and len(entry.messages) > self._max_messages:
+                del entry.messages[:-self._max_messages]  # archived in the database too
+            for doc in new_docs:
+                created_at = doc.get("created_at")
+                if created_at is None:
+                    continue
+                entry.recent_ids[doc.get("_id")] = created_at
+                if entry.watermark is None or created_at > entry.watermark:
+                    entry.watermark = created_at
+            if entry.watermark is not None:
+                horizon = entry.watermark - self._overlap
+                entry.recent_ids = {k: v for k, v in entry.recent_ids.items() if v >= horizon}
+            self._entries[session_id] = entry
+            while len(self._entries) > self._max_sessions:
+                self._entries.popitem(last=False)
+            return list(entry.messages)
+
+    def evict(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+def _make_cursor(doc: dict) -> str:
+    return f"{doc['created_at'].isoformat()}|{doc['_id']}"
+
+
+def _parse_cursor(cursor: str) -> Tuple[datetime, Any]:
+    from bson import ObjectId
+    from bson.errors import InvalidId
+
+    try:
+        created_at, oid = cursor.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise InvalidCursor(cursor) from None
+
+
 # Proxy wrapper ---------------------------------------------------------------
 
+def _flatten(message: BaseMessage) -> BaseMessage:
+    # Gemini may return content as list[str]; flatten to single string
+    if isinstance(getattr(message, "content", None), list):
+        message.content = "\n".join(map(str, message.content))  # type: ignore[attr-defined]
+    return message
+
+
 class _PersistentChatHistory(ChatMessageHistory):
-    """`ChatMessageHistory` that writes to Mongo on every message append."""
+    """`ChatMessageHistory` that persists appends via its store (write-behind by default)."""
 
     def __init__(self, session_id: str, store: "MongoHistoryStore", initial: List[BaseMessage]):
-        super().__init__(initial)  # type: ignore[arg-type]
+        super().__init__(messages=initial)
         self._session_id = session_id
         self._store = store
 
     def add_message(self, message: BaseMessage) -> None:  # type: ignore[override]
-        # Gemini may return content as list[str]; flatten to single string
-        if isinstance(getattr(message, "content", None), list):
-            message.content = "\n".join(map(str, message.content))  # type: ignore[attr-defined]
+        self.add_messages([message])
 
-        super().add_message(message)
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:  # type: ignore[override]
+        batch = [_flatten(m) for m in messages]
+        self.messages.extend(batch)
+        self._store.append_many(self._session_id, batch)
 
-        # Fire-and-forget persistence to avoid blocking (best-effort)
-        self._store.append(self._session_id, message)
-        # pragma: no cover – never crash user flow
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:  # type: ignore[override]
+        batch = [_flatten(m) for m in messages]
+        self.messages.extend(batch)
+        await self._store.aappend_many(self._session_id, batch)
 
 
 # Store implementation --------------------------------------------------------
@@ -81,43 +254,176 @@ class MongoHistoryStore(AbstractHistoryStore):
     """Conversation-history store backed by MongoDB Atlas."""
 
     def __init__(self, db_name: str = DB_NAME, collection: str = COLLECTION_NAME):
-        self._client = get_mongo_client()
-        self._coll = self._client[db_name][collection]
+        self._db_name = db_name
+        self._collection_name = collection
+        # Fail fast on missing configuration; no connection is opened yet.
+        self._coll = get_sync_mongo_client()[db_name][collection]
+        self._buffer = WriteBehindBuffer(self._insert, name="mongo") if write_behind_enabled() else None
+        self._cache = _SessionCache(
+            max_sessions=int(os.getenv("HISTORY_CACHE_SESSIONS", "1024")),
+            overlap=timedelta(seconds=float(os.getenv("HISTORY_CACHE_OVERLAP_S", "5"))),
+            max_messages=max_messages(),
+            ttl_s=float(os.getenv("HISTORY_CACHE_TTL_S", "300")),
+        )
+        self._max_messages = max_messages()
+        self._archive = get_sync_mongo_client()[db_name][collection + ARCHIVE_SUFFIX]
+
+    def _insert(self, docs: List[dict]) -> None:
+        from pymongo.errors import BulkWriteError
+
+        _stamp(docs)
+        # pymongo assigns each doc's _id on the first attempt, so a retried
+        # batch is idempotent: documents that already made it are rejected as
+        # duplicates and everything else is inserted. Order on read comes
+        # from (created_at, _id), not from insertion order.
+        try:
+            self._coll.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if not errors or not all(err.get("code") == 11000 for err in errors):
+                raise RuntimeError(f"insert_many failed: {errors[:1] or exc}") from exc
+        if self._max_messages:
+            self._enforce_cap(docs)
+
+    def _enforce_cap(self, docs: List[dict]) -> None:
+        """Archive the oldest messages of sessions in *docs* beyond the cap."""
+        # Always asks the database (one indexed query per session and batch):
+        # other replicas write to the same sessions, so a cached size is no bound.
+        for session_id in dict.fromkeys(doc["session_id"] for doc in docs):
+            try:
+                self._archive_overflow(session_id)
+            except Exception as exc:  # retention must never fail a write
+                logger.warning("Archiving history of %s failed: %s", session_id, exc)
+
+    def _archive_overflow(self, session_id: str) -> None:
+        from pymongo.errors import BulkWriteError
+
+        overflow = list(
+            self._coll.find({"session_id": session_id}).sort(_SORT_DESC).skip(self._max_messages)
+        )
+        if not overflow:
+            return
+        try:
+            self._archive.insert_many(overflow, ordered=False)
+        except BulkWriteError as exc:  # already archived by an earlier, interrupted run
+            if not all(err.get("code") == 11000 for err in exc.details.get("writeErrors", [])):
+                raise
+        self._coll.delete_many({"_id": {"$in": [doc["_id"] for doc in overflow]}})
+        HISTORY_ARCHIVED.inc(len(overflow))
+
+    def _needs_flush(self, session_id: str) -> bool:
+        return self._buffer is not None and self._buffer.needs_flush(session_id)
+
+    def _acoll(self) -> Any:
+        """Motor collection for the running event loop."""
+        return get_async_mongo_client()[self._db_name][self._collection_name]
+
+    @staticmethod
+    def _documents(session_id: str, messages: Sequence[BaseMessage]) -> List[dict]:
+        docs = []
+        for message in messages:
+            doc = _serialise_message(message)
+            doc["session_id"] = session_id
+            docs.append(doc)
+        return docs
 
     # ------------------------------------------------------------------
-    # Public API (sync signature, runs async ops via asyncio)
+    # Sync API (pymongo connection pool)
     # ------------------------------------------------------------------
     def get(self, session_id: str):  # type: ignore[override]
         """Return `ChatMessageHistory` for *session_id*, creating it if necessary."""
-        raw_docs = asyncio.run(self._async_fetch(session_id))
-        msgs = _deserialise_messages(raw_docs)
-        return _PersistentChatHistory(session_id, self, msgs)
-
-    def append(self, session_id: str, message: BaseMessage):
-        asyncio.run(self._async_append(session_id, message))
+        if self._needs_flush(session_id):
+            self._buffer.flush_session(session_id)  # read-your-writes
+        query, full = self._cache.query(session_id)
+        raw_docs = list(self._coll.find(query, _PROJECTION).sort(_SORT))
+        messages = self._cache.merge(session_id, raw_docs, full=full)
+        if messages is None:
+            raw_docs = list(self._coll.find({"session_id": session_id}, _PROJECTION).sort(_SORT))
+            messages = self._cache.merge(session_id, raw_docs, full=True)
+        return _PersistentChatHistory(session_id, self, messages)
+
+    def get_page(self, session_id: str, limit: int = 50, before: Optional[str] = None) -> HistoryPage:
+        query: Dict[str, Any] = {"session_id": session_id}
+        if before is not None:
+            created_at, oid = _parse_cursor(before)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": oid}},
+            ]
+        if self._needs_flush(session_id):
+            self._buffer.flush_session(session_id)
+        # One extra document tells whether an older page exists.
+        docs = list(self._coll.find(query, _PROJECTION).sort(_SORT_DESC).limit(limit + 1))
+        more = len(docs) > limit
+        docs = docs[:limit][::-1]
+        return HistoryPage(_deserialise_messages(docs), _make_cursor(docs[0]) if more else None)
+
+    def append(self, session_id: str, message: BaseMessage) -> None:
+        self.append_many(session_id, [message])
+
+    def append_many(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        docs = self._documents(session_id, messages)
+        if self._buffer is not None:
+            self._buffer.append(session_id, docs)
+            return
+        try:
+            self._insert(docs)
+        except Exception:
+            logger.exception("Mongo insert failed")
+            raise        # let the API return 500 so you notice
 
     def clear(self, session_id: str) -> None:
-        asyncio.run(self._async_clear(session_id))
+        if self._needs_flush(session_id):
+            # Write queued docs first so none land after the delete.
+            self._buffer.flush_session(session_id)
+        self._cache.evict(session_id)
+        self._coll.delete_many({"session_id": session_id})
+        self._archive.delete_many({"session_id": session_id})
+
+    def close(self) -> None:
+        """Write any buffered messages (called on application shutdown)."""
+        if self._buffer is not None:
+            self._buffer.close()
 
     # ------------------------------------------------------------------
-    # Internal async helpers
+    # Async API (Motor, client bound to the running loop)
     # ------------------------------------------------------------------
-    async def _async_fetch(self, session_id: str):
-        cursor = self._coll.find({"session_id": session_id}).sort("created_at", 1)
-        return await cursor.to_list(length=None)
-
-    async def _async_append(self, session_id: str, message: BaseMessage):
-        doc = _serialise_message(message)
-        doc["session_id"] = session_id
+    async def aget(self, session_id: str):
+        if self._needs_flush(session_id):
+            await asyncio.to_thread(self._buffer.flush_session, session_id)
+        query, full = self._cache.query(session_id)
+        raw_docs = await self._acoll().find(query, _PROJECTION).sort(_SORT).to_list(length=None)
+        messages = self._cache.merge(session_id, raw_docs, full=full)
+        if messages is None:
+            cursor = self._acoll().find({"session_id": session_id}, _PROJECTION).sort(_SORT)
+            raw_docs = await cursor.to_list(length=None)
+            messages = self._cache.merge(session_id, raw_docs, full=True)
+        return _PersistentChatHistory(session_id, self, messages)
+
+    async def aappend(self, session_id: str, message: BaseMessage) -> None:
+        await self.aappend_many(session_id, [message])
+
+    async def aappend_many(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        docs = self._documents(session_id, messages)
+        if self._buffer is not None:
+            self._buffer.append(session_id, docs)
+            return
         try:
-            await self._coll.insert_one(doc)
-        except Exception as exc:
-            from app.config import logger
+            await self._acoll().insert_many(_stamp(docs), ordered=True)
+        except Exception:
             logger.exception("Mongo insert failed")
-            raise        # let the API return 500 so you notice
-
-    async def _async_clear(self, session_id: str):
-        await self._coll.delete_many({"session_id": session_id})
-
-print(type(DEFAULT_HISTORY_STORE))
-# should print MongoHistoryStore 
\ No newline at end of file
+            raise
+        if self._max_messages:
+            await asyncio.to_thread(self._enforce_cap, docs)
+
+    async def aclear(self, session_id: str) -> None:
+        if self._needs_flush(session_id):
+            await asyncio.to_thread(self._buffer.flush_session, session_id)
+        self._cache.evict(session_id)
+        await self._acoll().delete_many({"session_id": session_id})
+        archive = get_async_mongo_client()[self._db_name][self._collection_name + ARCHIVE_SUFFIX]
+        await archive.delete_many({"session_id": session_id})
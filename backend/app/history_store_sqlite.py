@@ -0,0 +1,212 @@
+"""SQLite-backed chat history store.
+
+Implements the same contract as *InMemoryHistoryStore* for single-node
+deployments: history survives restarts without a Mongo cluster, and every
+worker process on the host shares the same file.
+
+* WAL mode (``synchronous=NORMAL``) so readers never block the writer.
+* ``messages`` is keyed by ``(session_id, seq)`` (a ``WITHOUT ROWID`` table),
+  so reading a session is a single range scan in order.
+* One connection per thread with a statement cache; every statement is a
+  fixed parameterised string, so SQLite prepares it once per connection.
+* Appends go through the write-behind buffer (`app.history_write_behind`) and
+  are committed in one transaction per batch. Reads flush the session first.
+  ``HISTORY_WRITE_BEHIND=false`` commits on every append instead.
+
+Retention: each batch moves messages beyond ``HISTORY_MAX_MESSAGES`` per
+session into ``messages_archive`` in the same transaction. With
+``HISTORY_TTL_DAYS`` set, expired rows are purged periodically. `clear`
+deletes a session from both tables.
+
+The file location is ``HISTORY_SQLITE_PATH`` (default
+``.cache/history.sqlite3``).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from app.config import logger
+from app.history_store import AbstractHistoryStore, HistoryPage, InvalidCursor, max_messages, retention_days
+from app.history_write_behind import WriteBehindBuffer, write_behind_enabled
+
+DEFAULT_PATH = os.path.join(".cache", "history.sqlite3")
+
+_TABLE = (
+    "CREATE TABLE IF NOT EXISTS {name} ("
+    " session_id TEXT NOT NULL,"
+    " seq INTEGER NOT NULL,"
+    " message TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " PRIMARY KEY (session_id, seq)"
+    ") WITHOUT ROWID"
+)
+# seq is assigned inside the write transaction, so concurrent writers (other
+# worker processes) cannot hand out the same number.
+_INSERT = (
+    "INSERT INTO messages (session_id, seq, message, created_at) VALUES "
+    "(?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?), ?, ?)"
+)
+_SELECT = "SELECT message FROM messages WHERE session_id = ? ORDER BY seq"
+_SELECT_PAGE = (
+    "SELECT seq, message FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?"
+)
+_DELETE = "DELETE FROM messages WHERE session_id = ?"
+_DELETE_ARCHIVED = "DELETE FROM messages_archive WHERE session_id = ?"
+# Overflow beyond the cap: everything older than the newest N rows.
+_OVERFLOW = "session_id = ? AND seq <= (SELECT MAX(seq) FROM messages WHERE session_id = ?) - ?"
+_ARCHIVE = f"INSERT OR IGNORE INTO messages_archive SELECT * FROM messages WHERE {_OVERFLOW}"
+_TRIM = f"DELETE FROM messages WHERE {_OVERFLOW}"
+_PURGE = "DELETE FROM messages WHERE created_at < ?"
+
+_PURGE_EVERY = 200  # batches between purges of expired rows
+
+
+def _flatten(msg: BaseMessage) -> BaseMessage:
+    # Flatten list-like content (observed when Gemini streams) before storing
+    if isinstance(getattr(msg, "content", None), list):
+        msg.content = "\n".join(map(str, msg.content))  # type: ignore[attr-defined]
+    return msg
+
+
+class _PersistentChatHistory(ChatMessageHistory):
+    """`ChatMessageHistory` that persists appends via its store."""
+
+    def __init__(self, session_id: str, store: "SQLiteHistoryStore", initial: List[BaseMessage]):
+        super().__init__(messages=initial)
+        self._session_id = session_id
+        self._store = store
+
+    def add_message(self, message: BaseMessage) -> None:  # type: ignore[override]
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:  # type: ignore[override]
+        batch = [_flatten(m) for m in messages]
+        self.messages.extend(batch)
+        self._store.append_many(self._session_id, batch)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:  # type: ignore[override]
+        # Enqueueing is non-blocking with write-behind; otherwise it is a local commit.
+        self.add_messages(messages)
+
+
+class SQLiteHistoryStore(AbstractHistoryStore):
+    """Conversation-history store backed by a local SQLite file."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self._path = path or os.getenv("HISTORY_SQLITE_PATH", DEFAULT_PATH)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._max_messages = max_messages()
+        self._ttl_s = retention_days() * 86400
+        self._batches = 0
+        conn = self._conn()
+        conn.execute(_TABLE.format(name="messages"))
+        conn.execute(_TABLE.format(name="messages_archive"))
+        if self._ttl_s:
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_created_at ON messages (created_at)")
+        conn.commit()
+        self._buffer = WriteBehindBuffer(self._insert, name="sqlite") if write_behind_enabled() else None
+        logger.info("SQLite history store at %s.", self._path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, check_same_thread=False, cached_statements=32)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, rows: List[tuple]) -> None:
+        """Write one batch in a single transaction (all or nothing, so retries are safe)."""
+        conn = self._conn()
+        with conn:  # commits, or rolls back on error
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(_INSERT, rows)
+            if self._max_messages:
+                capped = [(sid, sid, self._max_messages) for sid in {row[0] for row in rows}]
+                conn.executemany(_ARCHIVE, capped)
+                conn.executemany(_TRIM, capped)
+            self._batches += 1
+            if self._ttl_s and self._batches % _PURGE_EVERY == 0:
+                conn.execute(_PURGE, (time.time() - self._ttl_s,))
+
+    def _needs_flush(self, session_id: str) -> bool:
+        return self._buffer is not None and self._buffer.needs_flush(session_id)
+
+    @staticmethod
+    def _rows(session_id: str, messages: Sequence[BaseMessage]) -> List[tuple]:
+        now = time.time()
+        return [
+            (session_id, session_id, json.dumps(message_to_dict(_flatten(m))), now) for m in messages
+        ]
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def get(self, session_id: str):  # type: ignore[override]
+        """Return `ChatMessageHistory` for *session_id*, creating it if necessary."""
+        if self._needs_flush(session_id):
+            self._buffer.flush_session(session_id)  # read-your-writes
+        rows = self._conn().execute(_SELECT, (session_id,)).fetchall()
+        messages = messages_from_dict([json.loads(row[0]) for row in rows])
+        return _PersistentChatHistory(session_id, self, messages)
+
+    def get_page(self, session_id: str, limit: int = 50, before: Optional[str] = None) -> HistoryPage:
+        try:
+            end = int(before) if before is not None else 2**62
+        except ValueError:
+            raise InvalidCursor(before) from None
+        if self._needs_flush(session_id):
+            self._buffer.flush_session(session_id)
+        # One extra row tells whether an older page exists.
+        rows = self._conn().execute(_SELECT_PAGE, (session_id, end, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        messages = messages_from_dict([json.loads(row[1]) for row in rows])
+        return HistoryPage(messages, str(rows[0][0]) if more else None)
+
+    def append(self, session_id: str, message: BaseMessage) -> None:
+        self.append_many(session_id, [message])
+
+    def append_many(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        rows = self._rows(session_id, messages)
+        if self._buffer is not None:
+            self._buffer.append(session_id, rows)
+            return
+        try:
+            self._insert(rows)
+        except Exception:
+            logger.exception("SQLite insert failed")
+            raise
+
+    def clear(self, session_id: str) -> None:
+        if self._needs_flush(session_id):
+            # Write queued rows first so none land after the delete.
+            self._buffer.flush_session(session_id)
+        conn = self._conn()
+        with conn:
+            conn.execute(_DELETE, (session_id,))
+            conn.execute(_DELETE_ARCHIVED, (session_id,))
+
+    def close(self) -> None:
+        """Write any buffered messages (called on application shutdown)."""
+        if self._buffer is not None:
+            self._buffer.close()
+
+    async def aget(self, session_id: str):
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aclear(self, session_id: str) -> None:
+        await asyncio.to_thread(self.clear, session_id)
@@ -0,0 +1,282 @@
+"""Write-behind buffer for chat-history persistence.
+
+Appending a message should not cost a database round trip on the request
+path. `WriteBehindBuffer` queues documents per session and a background
+thread writes them in batches through a single ``flush_fn(docs)`` call
+(``insert_many`` for Mongo).
+
+Guarantees:
+
+* **Ordering** – documents of a session are written in append order. Only
+  one flush runs at a time, and a failed batch is put back in front of newer
+  documents. If a partial write is reported (``BulkWriteError``), only the
+  unwritten tail is retried.
+* **Read-your-writes** – `flush_session` writes a session's pending
+  documents (and waits for an in-flight batch) before it is read.
+* **Bounded memory** – beyond ``max_pending`` queued documents, appends
+  flush synchronously. If the store keeps failing, the oldest queued
+  documents are dropped (and counted) so the queue never exceeds
+  ``max_pending``; failed synchronous flushes are retried at most once per
+  ``interval_s``, not on every append.
+
+Flushes happen when ``max_batch`` documents are queued, every
+``interval_s`` seconds, and on `close` (process shutdown).
+
+Metrics: ``documentor_history_buffer_depth``,
+``documentor_history_flush_seconds``,
+``documentor_history_flushed_messages_total``,
+``documentor_history_flush_errors_total`` and
+``documentor_history_dropped_messages_total``.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from app.config import logger
+from app.services.metrics import counter, gauge, histogram
+
+__all__ = ["WriteBehindBuffer", "write_behind_enabled"]
+
+BUFFER_DEPTH = gauge(
+    "documentor_history_buffer_depth", "Chat-history documents waiting to be written."
+)
+FLUSH_SECONDS = histogram(
+    "documentor_history_flush_seconds", "Duration of one write-behind flush (one batched insert)."
+)
+FLUSHED_MESSAGES = counter(
+    "documentor_history_flushed_messages_total", "Chat-history documents written by the write-behind buffer."
+)
+FLUSH_ERRORS = counter(
+    "documentor_history_flush_errors_total", "Write-behind flushes that failed and were re-queued."
+)
+DROPPED = counter(
+    "documentor_history_dropped_messages_total",
+    "Queued documents dropped because the buffer was full while the store was failing.",
+)
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("HISTORY_WRITE_BEHIND", "true").lower() in {"1", "true", "yes"}
+
+
+def _written_count(exc: Exception) -> int:
+    """Documents a failed ordered bulk insert managed to write before failing."""
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        return int(details.get("nInserted", 0))
+    return 0
+
+
+class WriteBehindBuffer:
+    """Per-session FIFO queues drained in batches by a background thread."""
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[dict]], None],
+        *,
+        name: str = "history",
+        max_batch: Optional[int] = None,
+        interval_s: Optional[float] = None,
+        max_pending: Optional[int] = None,
+    ) -> None:
+        self._flush_fn = flush_fn
+        self._name = name
+        self._max_batch = max_batch or int(os.getenv("HISTORY_FLUSH_MAX_BATCH", "100"))
+        self._interval_s = interval_s or float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "200")) / 1000
+        self._max_pending = max_pending or int(os.getenv("HISTORY_BUFFER_MAX_PENDING", "10000"))
+
+        self._queues: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+        self._depth = 0
+        self._lock = threading.Lock()  # guards _queues / _depth
+        self._flush_lock = threading.Lock()  # one batch in flight at a time
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._retry_at = 0.0  # no synchronous flush before this (monotonic) after a failure
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def append(self, session_id: str, docs: Sequence[dict]) -> None:
+        """Queue *docs* for *session_id* (non-blocking unless over capacity)."""
+        if not docs:
+            return
+        if self._closed:  # after shutdown: write straight through
+            self._write(list(docs), [(session_id, len(docs))])
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._queues.setdefault(session_id, deque()).extend(docs)
+            self._depth += len(docs)
+            depth = self._depth
+        BUFFER_DEPTH.set(depth, buffer=self._name)
+
+        if depth >= self._max_pending:
+            if time.monotonic() >= self._retry_at:
+                self.flush()
+            self._shed()
+        elif depth >= self._max_batch:
+            self._wakeup.set()
+
+    def _shed(self) -> None:
+        """Drop the oldest queued documents while the buffer is over capacity.
+
+        A tenth of the capacity is freed at once, so a failing store costs a
+        drop (and a log line) per batch of appends rather than per append.
+        The session queued longest loses its oldest documents first.
+        """
+        if self._depth < self._max_pending:
+            return
+        target = self._max_pending - max(1, self._max_pending // 10)
+        dropped = 0
+        with self._lock:
+            while self._depth > target and self._queues:
+                session_id, queue = next(iter(self._queues.items()))
+                queue.popleft()
+                if not queue:
+                    del self._queues[session_id]
+                self._depth -= 1
+                dropped += 1
+            BUFFER_DEPTH.set(self._depth, buffer=self._name)
+        if dropped:
+            DROPPED.inc(dropped, buffer=self._name)
+            logger.error(
+                "%s write-behind buffer full and the store is failing; dropped %d queued documents.",
+                self._name,
+                dropped,
+            )
+
+    def pending(self, session_id: str) -> int:
+        with self._lock:
+            queue = self._queues.get(session_id)
+            return len(queue) if queue else 0
+
+    def needs_flush(self, session_id: str) -> bool:
+        """Whether a read of *session_id* could miss queued or in-flight docs."""
+        return self.pending(session_id) > 0 or self._flush_lock.locked()
+
+    def __len__(self) -> int:
+        return self._depth
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+    def _drain(self, session_id: Optional[str]) -> Tuple[List[dict], List[Tuple[str, int]]]:
+        """Take queued docs (all sessions, or one); returns docs and (session, count) spans."""
+        docs: List[dict] = []
+        spans: List[Tuple[str, int]] = []
+        with self._lock:
+            sessions = [session_id] if session_id is not None else list(self._queues)
+            for sid in sessions:
+                queue = self._queues.pop(sid, None)
+                if queue:
+                    docs.extend(queue)
+                    spans.append((sid, len(queue)))
+            self._depth -= len(docs)
+            BUFFER_DEPTH.set(self._depth, buffer=self._name)
+        return docs, spans
+
+    def _requeue(self, docs: List[dict], spans: List[Tuple[str, int]]) -> None:
+        """Put unwritten *docs* back in front of anything queued since."""
+        with self._lock:
+            # Walk the spans backwards so the sessions keep their original order
+            # at the front of the queue (oldest first, which `_shed` relies on).
+            offset = len(docs)
+            for sid, count in reversed(spans):
+                start = max(0, offset - count)
+                chunk = docs[start:offset]
+                offset = start
+                if not chunk:
+                    continue
+                queue = self._queues.setdefault(sid, deque())
+                queue.extendleft(reversed(chunk))
+                self._queues.move_to_end(sid, last=False)
+            self._depth += len(docs)
+            BUFFER_DEPTH.set(self._depth, buffer=self._name)
+
+    def _write(self, docs: List[dict], spans: List[Tuple[str, int]]) -> bool:
+        start = time.perf_counter()
+        try:
+            self._flush_fn(docs)
+        except Exception as exc:
+            written = _written_count(exc)
+            FLUSH_ERRORS.inc(buffer=self._name)
+            FLUSHED_MESSAGES.inc(written, buffer=self._name)
+            self._retry_at = time.monotonic() + self._interval_s
+            logger.warning(
+                "History flush failed after %d/%d documents (%s); re-queued the rest.", written, len(docs), exc
+            )
+            # Drop the written prefix from the spans before re-queueing.
+            remaining = docs[written:]
+            trimmed: List[Tuple[str, int]] = []
+            skip = written
+            for sid, count in spans:
+                used = min(skip, count)
+                skip -= used
+                if count - used:
+                    trimmed.append((sid, count - used))
+            self._requeue(remaining, trimmed)
+            return False
+        finally:
+            FLUSH_SECONDS.observe(time.perf_counter() - start, buffer=self._name)
+        FLUSHED_MESSAGES.inc(len(docs), buffer=self._name)
+        return True
+
+    def flush(self) -> bool:
+        """Write everything queued; returns False if the write failed."""
+        with self._flush_lock:
+            docs, spans = self._drain(None)
+            return self._write(docs, spans) if docs else True
+
+    def flush_session(self, session_id: str) -> bool:
+        """Write *session_id*'s queued docs, waiting for any batch in flight.
+
+        Call before reading the session so the read sees every append.
+        """
+        with self._flush_lock:
+            docs, spans = self._drain(session_id)
+            return self._write(docs, spans) if docs else True
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self._name}-write-behind", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self._interval_s)
+            self._wakeup.clear()
+            if self._depth:
+                try:
+                    self.flush()
+                except Exception:  # never let the flusher die
+                    logger.exception("History write-behind flush crashed")
+
+    def close(self, timeout_s: float = 5.0) -> None:
+        """Stop the flusher and write everything still queued."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+        deadline = time.monotonic() + timeout_s
+        while self._depth and time.monotonic() < deadline:
+            if not self.flush():
+                time.sleep(0.1)
+        if self._depth:
+            logger.error("History write-behind closed with %d unwritten documents.", self._depth)
@@ -1,9 +1,22 @@
-from fastapi import FastAPI
+import os
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from app.config import logger
+from app.services.metrics import PROMETHEUS_CONTENT_TYPE, counter, histogram, render_prometheus
 from app.routers.ingest_router import router as ingest_router
 from app.routers.chat_router import router as chat_router
 from app.routers.agent_router import router as agent_router
+from app.routers.history_router import router as history_router
+from app.routers.usage_router import router as usage_router
+from app.routers.admin_router import router as admin_router
+from app.routers.ws_router import router as ws_router
+from app.services import warmup
+from app.services.admission import AdmissionMiddleware, configure_threadpool
+from app.services.profiling import ProfilingMiddleware
 
 openapi_tags = [
     {
@@ -19,10 +32,24 @@ openapi_tags = [
         ),
     },
     {"name": "ingest", "description": "Administration endpoints for adding docs to the vector store."},
+    {"name": "history", "description": "Paginated read access to stored conversation history."},
+    {"name": "usage", "description": "Token usage and budgets per session."},
+    {"name": "ws", "description": "WebSocket sessions: resident history, pipelined and cancellable turns."},
+    {"name": "admin", "description": "Request profiles (requires `PROFILE_TOKEN`)."},
     {"name": "health", "description": "Liveness / readiness probe."},
+    {"name": "metrics", "description": "Prometheus metrics."},
 ]
 
-app = FastAPI(title="DocuMentor Backend API", version="1.0.0", openapi_tags=openapi_tags)
+app = FastAPI(
+    title="DocuMentor Backend API",
+    version="1.0.0",
+    openapi_tags=openapi_tags,
+    default_response_class=ORJSONResponse,
+)
+
+# Per-route-class concurrency limits; sheds /chat, /agent and /ingest overload with 503.
+# Added first so it runs inside CORS and its 503s carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
 
 # CORS middleware (allow all origins for now; restrict in production)
 app.add_middleware(
@@ -33,10 +60,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Gzip for bodies over GZIP_MIN_BYTES (full-text sources, history pages, collections).
+class _GZipMiddleware(GZipMiddleware):
+    """Compress large bodies, but never token streams: gzip would hold chunks back."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(_GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1024")), compresslevel=5)
+
+# Opt-in request profiling (PROFILE_TOKEN / PROFILE_SAMPLE_RATE); a pass-through otherwise.
+app.add_middleware(ProfilingMiddleware)
+
+HTTP_REQUESTS = counter("documentor_http_requests_total", "HTTP requests by route, method and status.")
+HTTP_SECONDS = histogram(
+    "documentor_http_request_seconds", "Time until response headers are sent (streams: until the first chunk)."
+)
+
+
+@app.middleware("http")
+async def _record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template (/history/{session_id}), not the raw path.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=status_code)
+
 # Register routers
 app.include_router(ingest_router)
 app.include_router(chat_router)
 app.include_router(agent_router)
+app.include_router(history_router)
+app.include_router(usage_router)
+app.include_router(admin_router)
+app.include_router(ws_router)
+
+@app.on_event("startup")
+def _start_warmup() -> None:
+    """Build and prime clients in the background; `/ready` reports progress."""
+    warmup.start()
+
+
+@app.on_event("startup")
+async def _size_threadpool() -> None:
+    """Give every admitted request a thread (must run on the event loop)."""
+    configure_threadpool()
+
+
+@app.on_event("shutdown")
+def _flush_history() -> None:
+    """Write buffered chat history and token usage before the process exits."""
+    from app.history_store import get_history_store
+    from app.services.usage_store import get_usage_store
+
+    if get_history_store.cache_info().currsize:  # only if a store was created
+        close = getattr(get_history_store(), "close", None)
+        if close is not None:
+            close()
+    if get_usage_store.cache_info().currsize:
+        store = get_usage_store()
+        if store is not None:
+            store.close()
+
+
+@app.get("/metrics", tags=["metrics"], include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 
 @app.get("/health", tags=["health"])
 def health_check():
@@ -44,4 +146,14 @@ def health_check():
     Health check endpoint.
     """
     logger.info("Health check called.")
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/ready", tags=["health"])
+def readiness_check() -> JSONResponse:
+    """
+    Readiness probe: 200 once every critical dependency is warm, else 503.
+    The body lists each dependency's warm-up status and timing.
+    """
+    report = warmup.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503) 
\ No newline at end of file
@@ -1,6 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from langchain_core.documents import Document
+from typing import Any, Dict, List, Literal, Optional, Union
 
 class IngestRequest(BaseModel):
     """
@@ -14,13 +13,54 @@ class ChatRequest(BaseModel):
 
     user_question: str = Field(..., description="User's natural language question about the API docs")
     session_id: Optional[str] = Field(None, description="Client-provided session identifier for conversational memory")
+    include_usage: bool = Field(False, description="Return the request's token usage in the `usage` field")
+    source_mode: Literal["ref", "snippet", "full"] = Field(
+        "ref",
+        description="How sources are returned: references only, with a short snippet, or with the full chunk text",
+    )
+
+class TokenUsage(BaseModel):
+    """Token counts (embedding tokens are estimated) and their cost."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    embedding_tokens: int = 0
+    total_tokens: int = Field(0, description="Model tokens: input + output")
+    llm_calls: int = 0
+    cost_usd: float = 0.0
+
+
+class RequestUsage(TokenUsage):
+    """Token usage of one request, with a breakdown by component (e.g. `tool:code_snippet`)."""
+
+    by_component: Dict[str, TokenUsage] = Field(default_factory=dict)
+
+
+class SourceRef(BaseModel):
+    """Reference to a retrieved chunk; the text itself only when asked for.
+
+    `/chat` and `/agent` serialise responses with ``response_model_exclude_none``,
+    so unset fields are left out and a reference stays a few dozen bytes.
+    """
+
+    id: str = Field(..., description="Stable chunk identifier")
+    source: Optional[str] = Field(None, description="Ingestion source type (`pdf` or `url`)")
+    url: Optional[str] = None
+    chunk_id: Optional[int] = None
+    start: Optional[int] = Field(None, description="Offset of the chunk in the ingested document (characters)")
+    end: Optional[int] = None
+    snippet: Optional[str] = Field(None, description="Start of the chunk (`source_mode=snippet`)")
+    text: Optional[str] = Field(None, description="Full chunk text (`source_mode=full`)")
+
 
 class ChatResponse(BaseModel):
     """
     Response model for chat endpoint.
+    Null ``sources`` and ``usage`` are omitted from the body (see `SourceRef`).
     """
     answer: str = Field(..., description="LLM-generated answer to the user's question")
-    sources: Optional[List[str]] = Field(None, description="List of source document chunks used for the answer") 
+    sources: Optional[List[SourceRef]] = Field(None, description="Chunks the answer was generated from")
+    usage: Optional[RequestUsage] = Field(None, description="Token usage, when `include_usage` was requested")
 
 # ---------------------------------------------------------------------------
 # Agent endpoint schemas (reuse structure of chat but separate type for clarity)
@@ -34,4 +74,62 @@ class AgentRequest(ChatRequest):
 # For responses we can reuse ChatResponse since structure is identical.
 
 
+# ---------------------------------------------------------------------------
+# Postman collection export
+# ---------------------------------------------------------------------------
+
+class PostmanEndpoint(BaseModel):
+    """Structured endpoint descriptor for collection export."""
+
+    method: str = Field("GET", description="HTTP verb")
+    path: str = Field(..., description="Path such as /users/{id} (or an absolute URL)")
+    name: Optional[str] = Field(None, description="Request name (defaults to 'METHOD path')")
+    tag: Optional[str] = Field(None, description="Folder name (defaults to the first path segment)")
+    description: Optional[str] = None
+    params: Optional[Union[Dict[str, Any], str]] = Field(
+        None, description="Flat JSON, or split into path/query/body/headers"
+    )
+    headers: Dict[str, str] = Field(default_factory=dict)
+
+
+class PostmanRequest(BaseModel):
+    """Request model for building a Postman v2.1 collection."""
+
+    name: str = Field(..., description="Collection name")
+    endpoints: List[Union[PostmanEndpoint, str]] = Field(
+        ..., description="Endpoint descriptors, e.g. 'GET /users/{id}' or structured objects"
+    )
+    base_url: Optional[str] = Field(None, description="Value of the {{baseUrl}} collection variable")
+
+
+# ---------------------------------------------------------------------------
+# Conversation history
+# ---------------------------------------------------------------------------
+
+class HistoryMessage(BaseModel):
+    """One stored chat message."""
+
+    type: str = Field(..., description="Message type: human, ai, system or tool")
+    content: str
+
+
+class HistoryPageResponse(BaseModel):
+    """A page of a session's history, oldest message first."""
+
+    session_id: str
+    messages: List[HistoryMessage]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `before` to fetch the preceding page; null when there is none"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Token usage
+# ---------------------------------------------------------------------------
+
+class SessionUsageResponse(RequestUsage):
+    """Stored token usage of a session and its remaining budget."""
 
+    session_id: str
+    budget: Optional[int] = Field(None, description="SESSION_TOKEN_BUDGET; null when unlimited")
+    remaining: Optional[int] = Field(None, description="Model tokens left; null when unlimited")
@@ -1,36 +1,93 @@
 """MongoDB helpers.
 
-Provides a lazily-initialised *singleton* `AsyncIOMotorClient` that other
-modules can import without risking multiple connection pools.
+Two lazily-initialised clients share one configuration:
+
+* `get_sync_mongo_client` – a process-wide `pymongo.MongoClient` for sync
+  callers (FastAPI runs sync routes in a thread pool; pymongo's pool is
+  thread-safe).
+* `get_async_mongo_client` – an `AsyncIOMotorClient` for the *running* event
+  loop. Motor binds a client to the loop it was first used on, so one client
+  is kept per loop instead of a global that outlives its loop.
+
+Pool sizing is explicit: ``MONGODB_MAX_POOL_SIZE`` (default 50),
+``MONGODB_MIN_POOL_SIZE`` (default 0) and ``MONGODB_TIMEOUT_MS`` (server
+selection / connect timeout, default 5000). Neither client performs network
+I/O until the first operation.
 """
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Optional
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from app.config import logger
+
+if TYPE_CHECKING:  # pragma: no cover
+    from motor.motor_asyncio import AsyncIOMotorClient  # type: ignore
+    from pymongo import MongoClient
+
+__all__ = ["get_mongo_client", "get_sync_mongo_client", "get_async_mongo_client", "pool_options"]
+
 
-from motor.motor_asyncio import AsyncIOMotorClient  # type: ignore
+_sync_client: Optional["MongoClient"] = None
+# Keyed by loop; the client references its loop, so entries for closed loops
+# are dropped explicitly when a new client is created.
+_async_clients: Dict[asyncio.AbstractEventLoop, "AsyncIOMotorClient"] = {}
+_lock = threading.Lock()
 
-__all__ = ["get_mongo_client"]
 
+def _mongo_uri() -> str:
+    mongo_uri = os.getenv("MONGODB_URI")
+    if not mongo_uri:
+        raise RuntimeError("Environment variable MONGODB_URI not set.")
+    return mongo_uri
 
-_client: Optional[AsyncIOMotorClient] = None
 
+def pool_options() -> Dict[str, Any]:
+    """Connection-pool settings shared by the sync and async clients."""
+    timeout_ms = int(os.getenv("MONGODB_TIMEOUT_MS", "5000"))
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": timeout_ms,
+        "connectTimeoutMS": timeout_ms,
+    }
 
-def get_mongo_client() -> AsyncIOMotorClient:
-    """Return a process-wide `AsyncIOMotorClient` instance.
 
-    The connection string is read from the ``MONGODB_URI`` environment variable.
-    This helper never raises on repeated calls and delays network IO until the
-    first actual operation (Motor's lazy connection behaviour).
+def get_sync_mongo_client() -> "MongoClient":
+    """Return the process-wide pooled `pymongo.MongoClient`."""
+    global _sync_client
+
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                from pymongo import MongoClient
+
+                _sync_client = MongoClient(_mongo_uri(), **pool_options())
+                logger.info("MongoDB sync client initialised (%s).", pool_options())
+    return _sync_client
+
+
+def get_async_mongo_client() -> "AsyncIOMotorClient":
+    """Return the `AsyncIOMotorClient` bound to the running event loop.
+
+    Must be called from a coroutine.
     """
-    global _client
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient  # type: ignore
+
+        with _lock:
+            for stale in [l for l in _async_clients if l.is_closed()]:
+                _async_clients.pop(stale).close()
+            client = AsyncIOMotorClient(_mongo_uri(), io_loop=loop, **pool_options())
+            _async_clients[loop] = client
+        logger.info("MongoDB async client initialised for loop %#x.", id(loop))
+    return client
 
-    if _client is None:
-        mongo_uri = os.getenv("MONGODB_URI")
-        if not mongo_uri:
-            raise RuntimeError("Environment variable MONGODB_URI not set.")
 
-        _client = AsyncIOMotorClient(mongo_uri)
-        
-    print("MongoDB client initialized")
-    return _client 
\ No newline at end of file
+def get_mongo_client() -> "AsyncIOMotorClient":
+    """Backwards-compatible alias of `get_async_mongo_client`."""
+    return get_async_mongo_client()
@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.services.profiling import (
+    list_profiles,
+    load_profile,
+    profile_path,
+    profile_token,
+    to_collapsed,
+    token_matches,
+)
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def _authorise(x_profile_token: Optional[str]) -> None:
+    # Without PROFILE_TOKEN the admin endpoints do not exist.
+    if not profile_token():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token.")
+
+
+@router.get("/profiles")
+def profiles_index(x_profile_token: Optional[str] = Header(None)) -> List[Dict[str, Any]]:
+    """Stored request profiles, newest first."""
+    _authorise(x_profile_token)
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+def profile_download(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$", description="`collapsed` for flame-graph tools"),
+    x_profile_token: Optional[str] = Header(None),
+) -> Response:
+    """Download one profile: span tree and stack samples (JSON), or collapsed stacks."""
+    _authorise(x_profile_token)
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    if format == "collapsed":
+        return PlainTextResponse(
+            to_collapsed(load_profile(profile_id) or {}),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed.txt"'},
+        )
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.json")
@@ -1,30 +1,65 @@
-from fastapi import APIRouter, HTTPException, status
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 
 from app.config import logger
-from app.models.schemas import AgentRequest, ChatResponse
+from app.models.schemas import AgentRequest, ChatResponse, PostmanRequest
+from app.routers.usage_router import attach_usage, enforce_token_budget
 from app.services.agent_engine import run_agent_query, stream_agent_answer
+from app.tools.postman_builder import iter_collection_json
+from app.utils.deadline import RequestBudget
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
 
-@router.post("/", response_model=ChatResponse, status_code=status.HTTP_200_OK)
-def agent_endpoint(request: AgentRequest) -> ChatResponse:
+@router.post("/", response_model=ChatResponse, response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+def agent_endpoint(request: AgentRequest, response: Response) -> ChatResponse:
     """Developer assistant agent endpoint (non-streaming)."""
+    session_id = request.session_id or "default"
+    enforce_token_budget(session_id)
+    budget = RequestBudget.for_route("agent")
     try:
-        response = run_agent_query(request.user_question, session_id=request.session_id or "default")
-        return response
+        result = run_agent_query(
+            request.user_question, session_id=session_id, budget=budget, source_mode=request.source_mode
+        )
     except Exception as e:
         logger.error(f"/agent failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to process agent request.")
+    attach_usage(result, response, budget, request.include_usage)
+    return result
 
 
 @router.post("/stream", status_code=status.HTTP_200_OK)
 def agent_stream_endpoint(request: AgentRequest):
     """Stream agent response chunk-by-chunk via SSE/plain text."""
+    session_id = request.session_id or "default"
+    enforce_token_budget(session_id)
     try:
-        generator = stream_agent_answer(request.user_question, session_id=request.session_id or "default")
+        generator = stream_agent_answer(
+            request.user_question,
+            session_id=session_id,
+            budget=RequestBudget.for_route("agent"),
+        )
         return StreamingResponse(generator, media_type="text/plain")
     except Exception as e:
         logger.error(f"/agent/stream failed: {e}")
-        raise HTTPException(status_code=500, detail="Failed to stream agent response.") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to stream agent response.")
+
+
+@router.post("/postman", status_code=status.HTTP_200_OK)
+def postman_collection_endpoint(request: PostmanRequest):
+    """Build a Postman v2.1 collection and stream it as a JSON download."""
+    endpoints = [e if isinstance(e, str) else e.model_dump() for e in request.endpoints]
+    # Headers are latin-1: an ASCII fallback name, plus the real one per RFC 5987.
+    fallback = "".join(c if (c.isascii() and c.isalnum()) or c in "-_" else "_" for c in request.name)
+    filename = f"{request.name or 'collection'}.postman_collection.json"
+    disposition = (
+        f'attachment; filename="{fallback or "collection"}.postman_collection.json"; '
+        f"filename*=UTF-8''{quote(filename, safe='')}"
+    )
+    return StreamingResponse(
+        iter_collection_json(request.name, endpoints, request.base_url),
+        media_type="application/json",
+        headers={"Content-Disposition": disposition},
+    )
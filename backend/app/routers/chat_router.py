@@ -1,23 +1,31 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 from app.config import logger
 from app.models.schemas import ChatRequest, ChatResponse
+from app.routers.usage_router import attach_usage, enforce_token_budget
 from app.services.query_engine import answer_query, stream_answer
+from app.utils.deadline import RequestBudget
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-@router.post("/", response_model=ChatResponse, status_code=status.HTTP_200_OK)
-def chat_endpoint(request: ChatRequest) -> ChatResponse:
+@router.post("/", response_model=ChatResponse, response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+def chat_endpoint(request: ChatRequest, response: Response) -> ChatResponse:
     """
     Chat endpoint for natural language Q&A over API docs.
     Accepts a ChatRequest and returns a ChatResponse from the LLM agent.
     """
+    session_id = request.session_id or "default"
+    enforce_token_budget(session_id)
+    budget = RequestBudget.for_route("chat")
     try:
-        response = answer_query(request.user_question, session_id=request.session_id or "default")
-        return response
+        result = answer_query(
+            request.user_question, session_id=session_id, budget=budget, source_mode=request.source_mode
+        )
     except Exception as e:
         logger.error(f"/chat failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to process chat request.")
+    attach_usage(result, response, budget, request.include_usage)
+    return result
 
 # Streaming endpoint ---------------------------------------------------------
 
@@ -25,9 +33,15 @@ def chat_endpoint(request: ChatRequest) -> ChatResponse:
 def chat_stream_endpoint(request: ChatRequest):
     """Stream the LLM answer chunk-by-chunk using Server-Sent Events."""
 
+    session_id = request.session_id or "default"
+    enforce_token_budget(session_id)
     try:
-        generator = stream_answer(request.user_question, session_id=request.session_id or "default")
+        generator = stream_answer(
+            request.user_question,
+            session_id=session_id,
+            budget=RequestBudget.for_route("chat"),
+        )
         return StreamingResponse(generator, media_type="text/plain")
     except Exception as e:
         logger.error(f"/chat/stream failed: {e}")
-        raise HTTPException(status_code=500, detail="Failed to stream chat response.") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to stream chat response.") 
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from app.config import logger
+from app.history_store import InvalidCursor, get_history_store
+from app.models.schemas import HistoryMessage, HistoryPageResponse
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+
+@router.get("/{session_id}", response_model=HistoryPageResponse, status_code=status.HTTP_200_OK)
+def history_page(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=500, description="Maximum messages per page"),
+    before: Optional[str] = Query(None, description="Cursor from a previous page's `next_cursor`"),
+) -> HistoryPageResponse:
+    """Read a session's history newest page first, without loading the whole session."""
+    try:
+        page = get_history_store().get_page(session_id, limit=limit, before=before)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid history cursor.")
+    except Exception as e:
+        logger.error(f"/history failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read history.")
+    return HistoryPageResponse(
+        session_id=session_id,
+        messages=[HistoryMessage(type=m.type, content=str(m.content)) for m in page.messages],
+        next_cursor=page.next_cursor,
+    )
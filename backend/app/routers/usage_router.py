@@ -0,0 +1,61 @@
+from fastapi import APIRouter, HTTPException, Response, status
+
+from app.config import logger
+from app.models.schemas import ChatResponse, RequestUsage, SessionUsageResponse
+from app.services.usage import (
+    TokenBudgetExceeded,
+    UsageTotals,
+    check_session_budget,
+    session_budget,
+    session_usage,
+    usage_header_enabled,
+)
+from app.utils.deadline import RequestBudget
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+
+def enforce_token_budget(session_id: str) -> None:
+    """Reject the request with 429 when the session has used its token budget."""
+    try:
+        check_session_budget(session_id)
+    except TokenBudgetExceeded as exc:
+        logger.warning("Token budget exhausted (session=%s): %d of %d", session_id, exc.used, exc.limit)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Session token budget exhausted ({exc.used} of {exc.limit} tokens used).",
+        )
+
+
+def attach_usage(result: ChatResponse, response: Response, budget: RequestBudget, include: bool) -> None:
+    """Report the request's token usage in the header and, if asked, the body."""
+    if budget.usage is None:
+        return
+    if usage_header_enabled():
+        response.headers["X-Token-Usage"] = budget.usage.header()
+    if include:
+        result.usage = RequestUsage(**budget.usage.summary())
+
+
+@router.get("/{session_id}", response_model=SessionUsageResponse, status_code=status.HTTP_200_OK)
+def usage_report(session_id: str) -> SessionUsageResponse:
+    """Stored token usage of a session, by component, and its remaining budget."""
+    try:
+        by_component = session_usage(session_id)
+    except Exception as e:
+        logger.error(f"/usage failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read token usage.")
+    if by_component is None:
+        raise HTTPException(status_code=404, detail="Token usage is not recorded (set TOKEN_USAGE_BACKEND).")
+
+    totals = UsageTotals()
+    for component in by_component.values():
+        totals.add(component)
+    limit = session_budget() or None
+    return SessionUsageResponse(
+        session_id=session_id,
+        **totals.as_dict(),
+        by_component={name: component.as_dict() for name, component in by_component.items()},
+        budget=limit,
+        remaining=max(0, limit - totals.total) if limit else None,
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, WebSocket
+
+from app.services.live_session import LiveSession
+
+router = APIRouter(prefix="/ws", tags=["ws"])
+
+
+@router.websocket("/{session_id}")
+async def session_socket(websocket: WebSocket, session_id: str) -> None:
+    """
+    Live conversation over a WebSocket: history stays loaded for the whole
+    connection, questions can be pipelined and cancelled, tokens stream as
+    they are generated. See `app.services.live_session` for the protocol.
+    """
+    await websocket.accept()
+    await LiveSession(websocket, session_id).run()
@@ -0,0 +1,230 @@
+"""Admission control: per-route-class concurrency limits with load shedding.
+
+Sync routes all run on AnyIO's shared thread pool. Without a limit, a burst
+of ``/ingest`` jobs can hold every thread while ``/chat`` requests queue
+behind them. `AdmissionMiddleware` gives each route class its own gate:
+
+* at most ``limit`` requests of the class run at once. A slot is held until
+  the last response byte is sent, so streamed answers count for their whole
+  duration;
+* up to ``queue`` more requests wait, first in first out, for at most
+  ``queue_timeout_s``;
+* anything beyond that gets an immediate ``503`` with ``Retry-After``. That
+  value comes from the recent service time and the queue length.
+
+Classes and defaults (``ADMISSION_<CLASS>_LIMIT`` / ``_QUEUE`` /
+``_QUEUE_TIMEOUT_S``):
+
+=========  =====  =====  ================
+class      limit  queue  queue timeout s
+=========  =====  =====  ================
+chat       16     32     2
+agent      8      16     5
+ingest     2      4      30
+=========  =====  =====  ================
+
+Other paths (health, metrics, history, admin …) and CORS preflights
+(``OPTIONS``) are not gated. The middleware sits inside ``CORSMiddleware`` so
+that a 503 still carries the CORS headers a browser needs to read it. WebSocket
+sessions take a slot of their turn's class for each turn (``/ws``). At start-up
+the AnyIO thread pool is sized to hold every admitted request plus headroom
+(`configure_threadpool`), so an admitted request never waits for a thread.
+``ADMISSION_ENABLED=false`` turns the middleware into a pass-through.
+
+Metrics: ``documentor_admission_in_flight``, ``documentor_admission_queue_depth``,
+``documentor_admission_wait_seconds`` and ``documentor_admission_rejected_total``
+(by ``route_class`` and ``reason``).
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import logger
+from app.services.metrics import counter, gauge, histogram
+
+__all__ = ["AdmissionMiddleware", "Gate", "admission_enabled", "configure_threadpool", "get_gate", "route_class"]
+
+IN_FLIGHT = gauge("documentor_admission_in_flight", "Admitted requests currently running, by route class.")
+QUEUE_DEPTH = gauge("documentor_admission_queue_depth", "Requests waiting for admission, by route class.")
+WAIT_SECONDS = histogram(
+    "documentor_admission_wait_seconds", "Time admitted requests waited in the admission queue."
+)
+REJECTED = counter(
+    "documentor_admission_rejected_total", "Requests shed with 503, by route class and reason."
+)
+
+# (limit, queue, queue timeout s) per class.
+_DEFAULTS: Dict[str, Tuple[int, int, float]] = {
+    "chat": (16, 32, 2.0),
+    "agent": (8, 16, 5.0),
+    "ingest": (2, 4, 30.0),
+}
+# First matching prefix wins; None = not gated.
+_ROUTES: Tuple[Tuple[str, Optional[str]], ...] = (
+    ("/agent/postman", None),  # template rendering, no model call
+    ("/chat", "chat"),
+    ("/agent", "agent"),
+    ("/ingest", "ingest"),
+)
+
+
+def admission_enabled() -> bool:
+    return os.getenv("ADMISSION_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+def route_class(path: str) -> Optional[str]:
+    for prefix, name in _ROUTES:
+        if path.startswith(prefix):
+            return name
+    return None
+
+
+class Gate:
+    """Concurrency limit with a bounded FIFO queue (used from the event loop only)."""
+
+    def __init__(self, name: str, limit: int, queue: int, queue_timeout_s: float) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, queue)
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_s = 1.0  # EWMA of how long a slot is held
+
+    @classmethod
+    def from_env(cls, name: str) -> "Gate":
+        limit, queue, timeout = _DEFAULTS[name]
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name,
+            int(os.getenv(f"{prefix}_LIMIT", limit)),
+            int(os.getenv(f"{prefix}_QUEUE", queue)),
+            float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_S", timeout)),
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a newcomer."""
+        ahead = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_s * ahead / self.limit))
+
+    def _publish(self) -> None:
+        IN_FLIGHT.set(self.active, route_class=self.name)
+        QUEUE_DEPTH.set(len(self._waiters), route_class=self.name)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None when admitted, else the rejection reason."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._publish()
+            WAIT_SECONDS.observe(0.0, route_class=self.name)
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            return "queue_timeout"
+        except asyncio.CancelledError:  # client went away while queued
+            self._abandon(waiter)
+            raise
+        WAIT_SECONDS.observe(time.perf_counter() - start, route_class=self.name)
+        return None
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # The slot was handed over just as we gave up; pass it on.
+            self.release(None)
+            return
+        waiter.cancel()
+        self._waiters.remove(waiter)
+        self._publish()
+
+    def release(self, held_s: Optional[float]) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        if held_s is not None:
+            self._service_s = 0.8 * self._service_s + 0.2 * held_s
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves over; active is unchanged
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+
+@lru_cache()
+def get_gate(name: str) -> Gate:
+    """Process-wide gate of route class *name* (also used per WebSocket turn)."""
+    return Gate.from_env(name)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying one `Gate` per route class."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.enabled = admission_enabled()
+        self.gates = {name: get_gate(name) for name in _DEFAULTS}
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        gated = self.enabled and scope["type"] == "http" and scope["method"] != "OPTIONS"
+        name = route_class(scope["path"]) if gated else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        gate = self.gates[name]
+        reason = await gate.acquire()
+        if reason is not None:
+            REJECTED.inc(route_class=name, reason=reason)
+            await _reject(send, gate.retry_after())
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+
+async def _reject(send: Any, retry_after: int) -> None:
+    body = b'{"detail":"Server is busy, retry later."}'
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def configure_threadpool(headroom: int = 16) -> None:
+    """Size AnyIO's thread pool for every admitted request plus *headroom*.
+
+    Must run on the event loop (an app start-up hook).
+    """
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    wanted = sum(Gate.from_env(name).limit for name in _DEFAULTS) + headroom
+    if admission_enabled() and wanted > limiter.total_tokens:
+        limiter.total_tokens = wanted
+        logger.info("Thread pool sized to %d for admitted requests.", wanted)
@@ -1,50 +1,67 @@
-from typing import Dict, Generator, Any, Sequence
+from typing import Dict, Generator, Any, List, Optional, Sequence
 import json
+import logging
+import os
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.prebuilt import create_react_agent  # type: ignore
 from langchain_core.messages import HumanMessage, BaseMessage, AIMessage
-from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain import hub
 
-from app.config import get_settings, logger
+from app.config import logger
 from app.models.schemas import ChatResponse
-from app.tools import TOOLS
+from app.prompts.agent import DEVELOPER_AGENT_PROMPT
+from app.services.llm import get_chat_model
+from app.services.query_engine import answer_query, stream_answer
+from app.services.question_router import Route, route_question
+from app.services.telemetry import StageCallbackHandler
+from app.services.usage import track_usage
+from app.utils.deadline import (
+    STEP_BUDGET_EXHAUSTED,
+    DeadlineExceeded,
+    RequestBudget,
+    iter_with_deadline,
+    record_timeout,
+)
 
 # Shared history store
-from app.history_store import DEFAULT_HISTORY_STORE
+from app.history_store import session_history
+from app.utils.timing import StageTimings
 
 # ---------------------------------------------------------------------------
 # Build agent (singleton)
 # ---------------------------------------------------------------------------
 
 _agent_executor = None
-prompt = hub.pull("hwchase17/react") 
+
+# Upper bound on tool calls executed concurrently within a single agent step.
+# Independent calls requested in the same turn run in parallel (results keep
+# the order of the model's tool_calls); the cap protects Gemini/Chroma quotas.
+_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+
+# Reply langgraph's ReAct agent substitutes when it runs out of steps while
+# the model still wants to call tools.
+_STEP_LIMIT_REPLY = "Sorry, need more steps to process this request."
+_STEP_BUDGET_REASON = "the reasoning-step budget was used up"
 
 def _build_agent_executor():
     global _agent_executor
     if _agent_executor is not None:
         return _agent_executor
 
-    settings = get_settings()
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=settings.gemini_api_key,
-        temperature=0,
-        # Gemini doesn't understand a separate "system" role; this merges the
-        # system prompt into the first user turn so the request is always valid.
-        convert_system_message_to_human=True,
-    )
-
-    base_agent = create_react_agent(llm, TOOLS)
-    # Wrap with message history so the agent is conversational
-    _agent_executor = RunnableWithMessageHistory(
-        base_agent,
-        _get_session_history,
-        input_messages_key="messages",
-        history_messages_key="messages",  # re-use same key for past msgs
-    )
+    # LangGraph and the tool implementations are heavy imports; load them on
+    # first use rather than when the API process starts.
+    from langgraph.prebuilt import ToolNode, create_react_agent  # type: ignore
+    from app.tools import get_tools
+
+    # Gemini doesn't understand a separate "system" role; system_as_human merges
+    # the system prompt into the first user turn so the request is always valid.
+    llm = get_chat_model(temperature=0, system_as_human=True)
+
+    # A failing tool is turned into an error ToolMessage for that call only, so
+    # sibling calls from the same step still return their results.
+    tool_node = ToolNode(get_tools(), handle_tool_errors=True)
+    # Conversation history is prepended by `_agent_inputs` and the finished
+    # turn is written back by `_record_turn`, so the graph itself is stateless.
+    _agent_executor = create_react_agent(llm, tool_node, prompt=DEVELOPER_AGENT_PROMPT)
     return _agent_executor
 
 
@@ -63,64 +80,169 @@ def _serialise_message(m: BaseMessage) -> dict:
     }
 
 
-def _log_payload(session_id: str, outgoing: Sequence[BaseMessage]) -> None:
+def _agent_config(budget: RequestBudget) -> Dict[str, Any]:
+    """Runnable config for one agent run (tool fan-out cap, step budget, usage)."""
+    callbacks: List[Any] = [StageCallbackHandler("agent")]
+    if budget.usage is not None:
+        callbacks.append(budget.usage)
+    config: Dict[str, Any] = {
+        "run_name": "agent",
+        "max_concurrency": _TOOL_CONCURRENCY,
+        "callbacks": callbacks,
+    }
+    if budget.max_steps:
+        # One ReAct step = model node + tools node; +1 for the final answer.
+        config["recursion_limit"] = 2 * budget.max_steps + 1
+    return config
+
+
+def _content_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    # Gemini may return content as list[str]; join it.
+    if isinstance(content, list):
+        return "\n".join(map(str, content))
+    return str(content)
+
+
+def _event_messages(event: Any) -> Optional[List[BaseMessage]]:
+    # The agent may return:
+    #   1) list[BaseMessage]             – older behaviour
+    #   2) {"messages": list[BaseMessage]} – current behaviour
+    if isinstance(event, list):
+        return event
+    if isinstance(event, dict) and "messages" in event:
+        return event["messages"]
+    return None
+
+
+def _partial_answer(msgs: Optional[List[BaseMessage]], reason: str) -> str:
+    """Best-effort answer from the messages produced before the agent was stopped."""
+    for message in reversed(msgs or []):
+        if isinstance(message, HumanMessage):
+            break
+        text = _content_text(message).strip()
+        if text:
+            return f"{text}\n\n[Partial answer: {reason}.]"
+    return f"Sorry, the agent could not finish: {reason}."
+
+
+def _stop_reason(exc: Exception, session_id: str, budget: RequestBudget) -> Optional[str]:
+    """Classify budget-related stops (and record them); None for other errors."""
+    if isinstance(exc, DeadlineExceeded):
+        record_timeout(budget, exc.stage)
+        logger.warning("Agent timed out after %.1fs (session=%s)", budget.timeout_s, session_id)
+        return "the request deadline was reached"
+
+    from langgraph.errors import GraphRecursionError  # type: ignore
+
+    if isinstance(exc, GraphRecursionError):
+        STEP_BUDGET_EXHAUSTED.inc(route=budget.route)
+        logger.warning("Agent used its %d-step budget (session=%s)", budget.max_steps, session_id)
+        return _STEP_BUDGET_REASON
+    return None
+
+
+def _finish(msgs: Optional[List[BaseMessage]], session_id: str, budget: RequestBudget) -> Optional[str]:
+    """Final answer text, or a partial answer if the step budget ran out."""
+    if not msgs:
+        return None
+    answer_text = _content_text(msgs[-1])
+    if answer_text.strip() == _STEP_LIMIT_REPLY:
+        STEP_BUDGET_EXHAUSTED.inc(route=budget.route)
+        logger.warning("Agent used its %d-step budget (session=%s)", budget.max_steps, session_id)
+        return _partial_answer(msgs[:-1], _STEP_BUDGET_REASON)
+    return answer_text
+
+
+def _log_payload(outgoing: Sequence[BaseMessage]) -> None:
     """Log the full message list that will be sent to Gemini."""
+    # Serialising the whole conversation is only worth it when it is printed.
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     try:
-        history = _get_session_history(session_id).messages
         logger.debug(">>> PAYLOAD >>> %s", json.dumps(
-            [_serialise_message(m) for m in history + list(outgoing)], indent=2)
+            [_serialise_message(m) for m in outgoing], indent=2)
         )
     except Exception:  # never allow debug helpers to kill the request
         pass
 
 
+def _agent_inputs(user_question: str, history: BaseChatMessageHistory) -> List[BaseMessage]:
+    """Past conversation followed by the new question."""
+    messages = list(history.messages) + [HumanMessage(content=user_question.strip())]
+    _log_payload(messages)
+    return messages
+
+
+def _stream_agent(agent: Any, messages: List[BaseMessage], budget: RequestBudget):
+    """Stream graph state values (the growing message list) within the deadline."""
+    return iter_with_deadline(
+        lambda: agent.stream({"messages": messages}, config=_agent_config(budget), stream_mode="values"),
+        budget,
+        "agent",
+    )
+
+
+def _record_turn(history: BaseChatMessageHistory, user_question: str, answer_text: str) -> None:
+    # Only the question and the final answer are kept; intermediate tool
+    # traffic would bloat every later prompt (and the RAG chain shares it).
+    history.add_messages([HumanMessage(content=user_question.strip()), AIMessage(content=answer_text)])
+
+
 # ---------------------------------------------------------------------------
 # Public helper
 # ---------------------------------------------------------------------------
 
 
-def run_agent_query(user_question: str, session_id: str = "default") -> ChatResponse:
-    """Run the developer assistant agent with the given question."""
+def run_agent_query(
+    user_question: str,
+    session_id: str = "default",
+    budget: Optional[RequestBudget] = None,
+    source_mode: str = "ref",
+) -> ChatResponse:
+    """Run the developer assistant agent with the given question.
+
+    The run is bounded by *budget* (deadline and maximum reasoning steps);
+    when either is exhausted the best partial answer so far is returned.
+    *source_mode* applies to fast-path answers, the only ones with sources.
+    """
     if not user_question or not user_question.strip():
         logger.warning("Rejected empty user_question for /agent (session=%s)", session_id)
         return ChatResponse(answer="Question must not be empty.", sources=None)
 
-    agent = _build_agent_executor()
+    budget = budget or RequestBudget.for_route("agent")
+    track_usage(budget, session_id)
 
-    try:
-        current_msgs = [HumanMessage(content=user_question.strip())]
-        _log_payload(session_id, current_msgs)
+    # Fast path: plain documentation lookups skip the ReAct loop entirely.
+    if route_question(user_question, session_id).route is Route.RAG:
+        return answer_query(user_question, session_id=session_id, budget=budget, source_mode=source_mode)
 
-        result = agent.invoke(
-            {"messages": current_msgs},
-            config={"configurable": {"session_id": session_id}},
-        )
+    agent = _build_agent_executor()
 
-        # The agent may return:
-        #   1) list[BaseMessage]             – older behaviour
-        #   2) {"messages": list[BaseMessage]} – current behaviour
-        # Fall back to str(result) for anything unexpected.
-        if isinstance(result, list):
-            msgs = result
-        elif isinstance(result, dict) and "messages" in result:
-            msgs = result["messages"]
-        else:
-            msgs = None
-
-        if msgs:
-            last: BaseMessage = msgs[-1]
-            content = getattr(last, "content", str(last))
-
-            # NEW ──────────────────────────────────────────────
-            # Gemini may return content as list[str]; join it.
-            if isinstance(content, list):
-                answer_text = "\n".join(map(str, content))
-            else:
-                answer_text = str(content)
-        else:
-            answer_text = str(result)
+    msgs: Optional[List[BaseMessage]] = None
+    timings = StageTimings("agent")
+    try:
+        with timings.stage("history_load"):
+            history = _get_session_history(session_id)
+        inputs = _agent_inputs(user_question, history)
+
+        # Stream the graph state so a run stopped by the deadline or the step
+        # budget still leaves the latest messages to build an answer from.
+        result: Any = None
+        with timings.stage("run"):
+            for event in _stream_agent(agent, inputs, budget):
+                result = event
+                msgs = _event_messages(event) or msgs
+
+        answer_text = _finish(msgs, session_id, budget) or str(result)
+        with timings.stage("history_append"):
+            _record_turn(history, user_question, answer_text)
+        logger.info("Agent timings (session=%s): %s", session_id, timings.summary())
         return ChatResponse(answer=answer_text, sources=None)
     except Exception as e:
+        reason = _stop_reason(e, session_id, budget)
+        if reason:
+            return ChatResponse(answer=_partial_answer(msgs, reason), sources=None)
         logger.error("Agent failed (session=%s): %s", session_id, e)
         return ChatResponse(answer="Error executing agent", sources=None)
 
@@ -130,37 +252,54 @@ def run_agent_query(user_question: str, session_id: str = "default") -> ChatResp
 # ---------------------------------------------------------------------------
 
 
-def stream_agent_answer(user_question: str, session_id: str = "default") -> Generator[str, None, None]:
+def stream_agent_answer(
+    user_question: str,
+    session_id: str = "default",
+    budget: Optional[RequestBudget] = None,
+) -> Generator[str, None, None]:
     """Yield agent answer chunks as they stream from the model."""
     if not user_question or not user_question.strip():
         yield "Question must not be empty."
         return
 
+    budget = budget or RequestBudget.for_route("agent")
+    track_usage(budget, session_id)
+
+    if route_question(user_question, session_id).route is Route.RAG:
+        yield from stream_answer(user_question, session_id=session_id, budget=budget)
+        return
+
     agent = _build_agent_executor()
 
-    current_msgs = [HumanMessage(content=user_question.strip())]
-    print(current_msgs)
-    _log_payload(session_id, current_msgs)
-
-    # The agent's .stream returns events containing the messages list.
-    for event in agent.stream(
-        {"messages": current_msgs},
-        config={"configurable": {"session_id": session_id}},
-        stream_mode="values",
-    ):
-        try:
-            # Each `event` is a dict with key "messages"; yield latest AI content.
-            msgs = event.get("messages") if isinstance(event, dict) else None
-            if msgs:
-                ai_msg = msgs[-1]
-                content = getattr(ai_msg, "content", str(ai_msg))
-                yield content
-            else:
-                yield str(event)
-        except Exception:
-            yield str(event)
+    timings = StageTimings("agent")
+    with timings.stage("history_load"):
+        history = _get_session_history(session_id)
+    inputs = _agent_inputs(user_question, history)
+
+    # Each event carries the full messages list; yield the latest content.
+    answer_text: Optional[str] = None
+    try:
+        for event in _stream_agent(agent, inputs, budget):
+            msgs = _event_messages(event)
+            if msgs is not None and len(msgs) <= len(inputs):
+                continue  # initial state echo of the question
+            if answer_text is None:
+                timings.first_token(budget.route)
+            answer_text = _finish(msgs, session_id, budget)
+            yield answer_text if answer_text is not None else str(event)
+        if answer_text is not None:
+            with timings.stage("history_append"):
+                _record_turn(history, user_question, answer_text)
+        logger.info("Agent timings (session=%s): %s", session_id, timings.summary())
+    except Exception as e:
+        reason = _stop_reason(e, session_id, budget)
+        if reason is None:
+            logger.error("Agent stream failed (session=%s): %s", session_id, e)
+            yield "Error executing agent"
+            return
+        yield f"[Stopped: {reason}.]"
 
 
 def _get_session_history(session_id: str) -> BaseChatMessageHistory:
-    """Fetch shared history for *session_id*."""
-    return DEFAULT_HISTORY_STORE.get(session_id) 
\ No newline at end of file
+    """Fetch shared (or connection-resident) history for *session_id*."""
+    return session_history(session_id) 
\ No newline at end of file
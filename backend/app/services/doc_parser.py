@@ -2,13 +2,9 @@ import logging
 import tempfile
 from typing import List
 
-# LangChain loaders
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
-
-# Fallback deps for local parsing (kept for backwards compatibility)
-import fitz  # PyMuPDF
-import requests
-from bs4 import BeautifulSoup
+# LangChain loaders and the fallback parsers (PyMuPDF, requests +
+# BeautifulSoup) are imported inside the functions: they are only needed
+# during ingestion and noticeably slow down API start-up.
 from langchain_core.documents import Document
 
 try:
@@ -29,6 +25,8 @@ def parse_pdf(file: bytes) -> str:
     on a path. If the loader fails for any reason, we fall back to the
     previous PyMuPDF extraction to avoid breaking ingestion.
     """
+    from langchain_community.document_loaders import PyPDFLoader
+
     try:
         with tempfile.NamedTemporaryFile(delete=True, suffix=".pdf") as tmp:
             tmp.write(file)
@@ -41,6 +39,8 @@ def parse_pdf(file: bytes) -> str:
     except Exception as e:
         logger.warning("PyPDFLoader failed (%s). Falling back to PyMuPDF extraction.", e)
         try:
+            import fitz  # PyMuPDF
+
             doc = fitz.open(stream=file, filetype="pdf")
             text = "\n".join(page.get_text("text") for page in doc)
             logger.info("PDF parsed via PyMuPDF fallback. Pages: %d", doc.page_count)
@@ -56,6 +56,8 @@ def parse_url(url: str) -> str:
     Falls back to a simple requests+BeautifulSoup scraper if the loader
     raises.
     """
+    from langchain_community.document_loaders import WebBaseLoader
+
     try:
         loader = WebBaseLoader(web_paths=(url,))
         docs = loader.load()
@@ -65,6 +67,9 @@ def parse_url(url: str) -> str:
     except Exception as e:
         logger.warning("WebBaseLoader failed (%s). Falling back to requests scraping.", e)
         try:
+            import requests
+            from bs4 import BeautifulSoup
+
             response = requests.get(url, timeout=10)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, "html.parser")
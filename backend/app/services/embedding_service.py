@@ -1,24 +1,53 @@
 """Service layer for text embeddings via Google Generative AI (Gemini)."""
 from functools import lru_cache
-from typing import List, Any, cast
+from typing import TYPE_CHECKING, List, Any, cast
 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from pydantic import SecretStr
 
 from app.config import get_settings
+from app.services import telemetry, usage
+from app.services.rate_limiter import get_limiter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+
+class _TimedEmbeddings(Embeddings):
+    """Delegating wrapper that rate-limits and reports every embedding call (stage timing, tokens)."""
+
+    def __init__(self, inner: Embeddings) -> None:
+        self.inner = inner
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with telemetry.stage("embedding", "embed_documents", count=len(texts)):
+            vectors = get_limiter("embedding").call(lambda: self.inner.embed_documents(texts))
+        usage.record_embedding("embed_documents", texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with telemetry.stage("embedding", "embed_query"):
+            vector = get_limiter("embedding").call(lambda: self.inner.embed_query(text))
+        usage.record_embedding("embed_query", [text])
+        return vector
 
 
 @lru_cache()
-def get_embedder() -> GoogleGenerativeAIEmbeddings:
-    """Return a singleton instance of the Gemini embedding model."""
+def get_embedder() -> Embeddings:
+    """Return a singleton instance of the (instrumented) Gemini embedding model."""
+    # Deferred: importing the Gemini SDK is slow and not needed until first use.
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
     settings = get_settings()
-    return GoogleGenerativeAIEmbeddings(
-        model="models/text-embedding-004",
-        google_api_key=SecretStr(settings.gemini_api_key),
+    return _TimedEmbeddings(
+        GoogleGenerativeAIEmbeddings(
+            model="models/text-embedding-004",
+            google_api_key=SecretStr(settings.gemini_api_key),
+        )
     )
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """Embed a list of texts into vectors using Gemini embeddings."""
     embedder = get_embedder()
-    return embedder.embed_documents(texts) 
\ No newline at end of file
+    return embedder.embed_documents(texts)
@@ -0,0 +1,345 @@
+"""Endpoint index: one embedding per API endpoint, ranked locally.
+
+At ingest time every ``METHOD /path`` mentioned in a document is extracted
+together with a short description and embedded once into the dedicated
+``documentor_endpoints`` Chroma collection (ids are derived from method and
+path, so re-ingesting updates entries instead of duplicating them).
+
+Queries never call the chat model in the common case. The index keeps a
+local snapshot of all endpoint vectors (a normalised numpy matrix, refreshed
+after ingestion and every ``ENDPOINT_INDEX_TTL_S`` seconds) and ranks
+candidates by::
+
+    score = 0.6 * cosine(question, endpoint) + 0.4 * lexical(question, endpoint)
+
+where the lexical part matches path segments and the action implied by the
+question ("create" → POST, "delete" → DELETE …). Only when the best two
+scores are within ``ENDPOINT_TIE_MARGIN`` does the caller need a tie-break.
+
+While one caller reloads an expired snapshot, the others keep ranking with
+the stale one. A failed load is retried after ``ENDPOINT_INDEX_RETRY_S``
+(10) seconds instead of a full TTL.
+
+Deployments whose documents were ingested before the index existed fall back
+to extracting endpoints from the top retrieved chunks and ranking them
+lexically.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.config import logger
+from app.services.embedding_service import get_embedder
+
+if TYPE_CHECKING:  # pragma: no cover
+    import numpy as np
+
+__all__ = [
+    "EndpointRecord",
+    "EndpointMatch",
+    "EndpointIndex",
+    "extract_endpoints",
+    "get_endpoint_index",
+    "is_ambiguous",
+]
+
+_SIMILARITY_WEIGHT = 0.6
+_MAX_DESCRIPTION_CHARS = 200
+_QUERY_EMBEDDING_CACHE = 1024
+
+_ENDPOINT_RE = re.compile(
+    r"\b(GET|POST|PUT|PATCH|DELETE)\s+(?:https?://[^\s/]+)?(/[^\s,;)\]\"'`<>]*)"
+)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+_PATH_PARAM_RE = re.compile(r"^(\{.*\}|:.+|<.+>)$")
+_SKIP_SEGMENT_RE = re.compile(r"^(api|rest|v\d+(\.\d+)*)$", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+# Verbs in a question that hint at the HTTP method.
+_METHOD_HINTS: Dict[str, Set[str]] = {
+    "POST": {"create", "add", "new", "register", "submit", "upload", "post", "send", "make"},
+    "PUT": {"replace", "update", "edit", "modify", "change", "set"},
+    "PATCH": {"update", "edit", "modify", "change", "patch", "partially"},
+    "DELETE": {"delete", "remove", "cancel", "revoke", "destroy", "unsubscribe"},
+    "GET": {"get", "list", "fetch", "retrieve", "read", "show", "find", "search", "lookup", "view"},
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+@dataclass(frozen=True)
+class EndpointRecord:
+    method: str
+    path: str
+    description: str = ""
+    source: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def id(self) -> str:
+        return hashlib.sha1(self.key.encode("utf-8")).hexdigest()
+
+    def embedding_text(self) -> str:
+        return f"{self.key} {self.description}".strip()
+
+
+@dataclass(frozen=True)
+class EndpointMatch:
+    record: EndpointRecord
+    score: float
+    similarity: float
+    lexical: float
+
+
+def is_ambiguous(matches: Sequence[EndpointMatch]) -> bool:
+    """Whether the two best candidates are too close to call."""
+    if len(matches) < 2:
+        return False
+    return matches[0].score - matches[1].score < _env_float("ENDPOINT_TIE_MARGIN", 0.03)
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+
+def _describe(text: str, start: int, end: int) -> str:
+    """Text following an endpoint mention, up to the next endpoint or sentence."""
+    following = text[end:end + 2 * _MAX_DESCRIPTION_CHARS]
+    next_endpoint = _ENDPOINT_RE.search(following)
+    if next_endpoint:
+        following = following[: next_endpoint.start()]
+    sentence = _SENTENCE_END_RE.split(following.strip(" -–—:"), maxsplit=1)[0]
+    return sentence.strip()[:_MAX_DESCRIPTION_CHARS]
+
+
+def extract_endpoints(text: str, source: str = "") -> List[EndpointRecord]:
+    """Find every ``METHOD /path`` in *text* (first mention wins, longest description kept)."""
+    found: Dict[str, EndpointRecord] = {}
+    for match in _ENDPOINT_RE.finditer(text):
+        path = match.group(2).rstrip(".:")
+        if len(path) < 2:
+            continue
+        record = EndpointRecord(match.group(1), path, _describe(text, match.start(), match.end()), source)
+        existing = found.get(record.key)
+        if existing is None or len(record.description) > len(existing.description):
+            found[record.key] = record
+    return list(found.values())
+
+
+# ---------------------------------------------------------------------------
+# Lexical scoring
+# ---------------------------------------------------------------------------
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _question_terms(question: str) -> Set[str]:
+    return {_stem(w) for w in _WORD_RE.findall(question.lower())}
+
+
+@lru_cache(maxsize=4096)
+def _path_terms(path: str) -> Tuple[str, ...]:
+    terms: List[str] = []
+    for segment in path.split("?")[0].strip("/").split("/"):
+        if not segment or _PATH_PARAM_RE.match(segment) or _SKIP_SEGMENT_RE.match(segment):
+            continue
+        terms.extend(_stem(w) for w in _WORD_RE.findall(_CAMEL_RE.sub(" ", segment).lower()))
+    return tuple(dict.fromkeys(terms))
+
+
+def _hinted_methods(terms: Set[str]) -> Set[str]:
+    return {method for method, verbs in _METHOD_HINTS.items() if terms & verbs}
+
+
+def lexical_score(terms: Set[str], hinted: Set[str], record: EndpointRecord) -> float:
+    path_terms = _path_terms(record.path)
+    overlap = sum(1 for t in path_terms if t in terms) / len(path_terms) if path_terms else 0.0
+    if not hinted:
+        method_score = 0.5
+    else:
+        method_score = 1.0 if record.method in hinted else 0.0
+    return 0.75 * overlap + 0.25 * method_score
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class _Snapshot:
+    records: List[EndpointRecord]
+    matrix: Optional["np.ndarray"]  # (n, dim), rows L2-normalised
+    expires_at: float = 0.0
+
+
+class EndpointIndex:
+    """Endpoint records plus a local vector snapshot for millisecond ranking."""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, retry_seconds: Optional[float] = None) -> None:
+        self._ttl = ttl_seconds if ttl_seconds is not None else _env_float("ENDPOINT_INDEX_TTL_S", 300)
+        self._retry = retry_seconds if retry_seconds is not None else _env_float("ENDPOINT_INDEX_RETRY_S", 10)
+        self._snapshot: Optional[_Snapshot] = None
+        self._generation = 0  # bumped by `invalidate`
+        self._lock = threading.Lock()  # guards _snapshot / _generation
+        self._refresh_lock = threading.Lock()  # one load at a time
+
+    # -- writes -------------------------------------------------------------
+
+    def add(self, records: Iterable[EndpointRecord]) -> int:
+        """Embed and upsert *records*; returns how many were written."""
+        from app.vector.chroma_client import get_endpoint_vectorstore
+
+        unique = {r.id: r for r in records}
+        if not unique:
+            return 0
+        store = get_endpoint_vectorstore()
+        ids = list(unique)
+        # Chroma's upsert semantics: re-ingesting an endpoint replaces it.
+        store.add_texts(
+            texts=[unique[i].embedding_text() for i in ids],
+            metadatas=[
+                {"method": r.method, "path": r.path, "description": r.description, "source": r.source}
+                for r in (unique[i] for i in ids)
+            ],
+            ids=ids,
+        )
+        self.invalidate()
+        logger.info("Indexed %d endpoints.", len(ids))
+        return len(ids)
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale; the next read reloads it."""
+        with self._lock:
+            self._generation += 1
+            if self._snapshot is not None:
+                self._snapshot = replace(self._snapshot, expires_at=0.0)
+
+    # -- reads --------------------------------------------------------------
+
+    def _load(self) -> _Snapshot:
+        import numpy as np
+
+        from app.vector.chroma_client import get_endpoint_vectorstore
+
+        data = get_endpoint_vectorstore().get(include=["metadatas", "embeddings"])
+        metadatas = data.get("metadatas") or []
+        embeddings = data.get("embeddings")
+        records = [
+            EndpointRecord(m.get("method", "GET"), m.get("path", ""), m.get("description", ""), m.get("source", ""))
+            for m in metadatas
+        ]
+        matrix = None
+        if records and embeddings is not None and len(embeddings):
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1.0, norms)
+        logger.info("Endpoint index snapshot loaded (%d endpoints).", len(records))
+        return _Snapshot(records, matrix)
+
+    def snapshot(self) -> _Snapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() < snap.expires_at:
+            return snap
+        # One caller reloads; the others keep the stale snapshot meanwhile.
+        # Only the very first load is waited for.
+        if not self._refresh_lock.acquire(blocking=snap is None):
+            return snap  # type: ignore[return-value]
+        try:
+            current = self._snapshot
+            if current is not None and time.monotonic() < current.expires_at:
+                return current  # reloaded while we waited
+            return self._refresh(current)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, stale: Optional[_Snapshot]) -> _Snapshot:
+        with self._lock:
+            generation = self._generation
+        try:
+            snap, ttl = self._load(), self._ttl
+        except Exception as exc:  # keep what we have (or behave as empty) and retry soon
+            logger.warning("Endpoint index unavailable (retrying in %.0fs): %s", self._retry, exc)
+            snap, ttl = stale or _Snapshot([], None), self._retry
+        with self._lock:
+            # Invalidated during the load: it may predate the new endpoints.
+            expires_at = time.monotonic() + ttl if generation == self._generation else 0.0
+            self._snapshot = snap = replace(snap, expires_at=expires_at)
+        return snap
+
+    def __len__(self) -> int:
+        return len(self.snapshot().records)
+
+    def rank(self, question: str, k: int = 5) -> List[EndpointMatch]:
+        """Return the *k* best endpoints for *question*, best first."""
+        snap = self.snapshot()
+        if not snap.records:
+            return []
+
+        terms = _question_terms(question)
+        hinted = _hinted_methods(terms)
+        lexical = [lexical_score(terms, hinted, r) for r in snap.records]
+
+        if snap.matrix is not None:
+            import numpy as np
+
+            query = np.asarray(_embed_query(question), dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            similarity = (snap.matrix @ query).tolist()
+            weight = _SIMILARITY_WEIGHT
+        else:
+            similarity = [0.0] * len(snap.records)
+            weight = 0.0
+
+        matches = [
+            EndpointMatch(r, weight * sim + (1 - weight) * lex, sim, lex)
+            for r, sim, lex in zip(snap.records, similarity, lexical)
+        ]
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:k]
+
+
+def rank_lexically(question: str, records: Sequence[EndpointRecord], k: int = 5) -> List[EndpointMatch]:
+    """Rank *records* by lexical score alone (used without a vector snapshot).
+
+    Input order acts as a small prior, so retrieval rank breaks exact ties.
+    """
+    terms = _question_terms(question)
+    hinted = _hinted_methods(terms)
+    matches = []
+    for position, record in enumerate(records):
+        lex = lexical_score(terms, hinted, record)
+        matches.append(EndpointMatch(record, lex - 0.001 * position, 0.0, lex))
+    matches.sort(key=lambda m: m.score, reverse=True)
+    return matches[:k]
+
+
+@lru_cache(maxsize=_QUERY_EMBEDDING_CACHE)
+def _embed_query(question: str) -> Tuple[float, ...]:
+    return tuple(get_embedder().embed_query(question))
+
+
+@lru_cache()
+def get_endpoint_index() -> EndpointIndex:
+    """Return the process-wide endpoint index."""
+    return EndpointIndex()
@@ -4,13 +4,30 @@ import logging
 
 from app.config import logger
 from app.services.doc_parser import parse_pdf, parse_url
-from app.utils.text_utils import clean_text, chunk_text
+from app.utils.text_utils import clean_text, chunk_text_with_offsets
 from app.vector.chroma_client import store_embeddings
-from langchain_community.vectorstores import Chroma
+from app.services.endpoint_index import extract_endpoints, get_endpoint_index
+from app.services.rate_limiter import priority
+from app.tools.cache import get_tool_cache
+from app.utils.timing import StageTimings
+
+
+def _index_endpoints(text: str, source: str) -> int:
+    """Embed the endpoints mentioned in *text* into the endpoint index.
+
+    A failure here must not fail the ingestion – the chunks are already stored
+    and the endpoint suggester can fall back to chunk retrieval.
+    """
+    try:
+        return get_endpoint_index().add(extract_endpoints(text, source))
+    except Exception as e:
+        logger.warning(f"Endpoint indexing failed for {source}: {e}")
+        return 0
 
 
 
 
+@priority("ingest")  # embedding calls yield to interactive requests
 def ingest_pdf(file: bytes) -> Dict[str, Any]:
     """
     Parses, cleans, chunks, embeds, and stores a PDF document.
@@ -20,18 +37,29 @@ def ingest_pdf(file: bytes) -> Dict[str, Any]:
         Dict[str, Any]: Summary of ingestion (counts, status).
     """
     try:
-        raw_text = parse_pdf(file)
-        cleaned = clean_text(raw_text)
-        chunks = chunk_text(cleaned)
-        metadatas = [{"source": "pdf", "chunk_id": i} for i in range(len(chunks))]
-        store_embeddings(chunks, metadatas)
-        logger.info(f"PDF ingestion complete. {len(chunks)} chunks stored.")
-        return {"status": "success", "chunks": len(chunks), "source": "pdf"}
+        timings = StageTimings("ingest")
+        with timings.stage("parse"):
+            raw_text = parse_pdf(file)
+        with timings.stage("clean"):
+            cleaned = clean_text(raw_text)
+        with timings.stage("chunk"):
+            spans = chunk_text_with_offsets(cleaned)
+        chunks = [chunk for chunk, _ in spans]
+        metadatas = [{"source": "pdf", "chunk_id": i, "start_index": start} for i, (_, start) in enumerate(spans)]
+        with timings.stage("vector_store"):  # includes embedding the chunks
+            store_embeddings(chunks, metadatas)
+        with timings.stage("endpoint_index"):
+            endpoints = _index_endpoints(cleaned, "pdf")
+        # Retrieval-backed tool answers may now be stale.
+        get_tool_cache().invalidate_corpus_dependent()
+        logger.info(f"PDF ingestion complete. {len(chunks)} chunks, {endpoints} endpoints stored. {timings.summary()}")
+        return {"status": "success", "chunks": len(chunks), "endpoints": endpoints, "source": "pdf"}
     except Exception as e:
         logger.error(f"PDF ingestion failed: {e}")
         return {"status": "error", "error": str(e), "source": "pdf"}
 
 
+@priority("ingest")
 def ingest_url(url: str) -> Dict[str, Any]:
     """
     Parses, cleans, chunks, embeds, and stores a document from a URL.
@@ -41,13 +69,25 @@ def ingest_url(url: str) -> Dict[str, Any]:
         Dict[str, Any]: Summary of ingestion (counts, status).
     """
     try:
-        raw_text = parse_url(url)
-        cleaned = clean_text(raw_text)
-        chunks = chunk_text(cleaned)
-        metadatas = [{"source": "url", "url": url, "chunk_id": i} for i in range(len(chunks))]
-        store_embeddings(chunks, metadatas)
-        logger.info(f"URL ingestion complete. {len(chunks)} chunks stored.")
-        return {"status": "success", "chunks": len(chunks), "source": "url"}
+        timings = StageTimings("ingest")
+        with timings.stage("parse"):
+            raw_text = parse_url(url)
+        with timings.stage("clean"):
+            cleaned = clean_text(raw_text)
+        with timings.stage("chunk"):
+            spans = chunk_text_with_offsets(cleaned)
+        chunks = [chunk for chunk, _ in spans]
+        metadatas = [
+            {"source": "url", "url": url, "chunk_id": i, "start_index": start} for i, (_, start) in enumerate(spans)
+        ]
+        with timings.stage("vector_store"):  # includes embedding the chunks
+            store_embeddings(chunks, metadatas)
+        with timings.stage("endpoint_index"):
+            endpoints = _index_endpoints(cleaned, url)
+        # Retrieval-backed tool answers may now be stale.
+        get_tool_cache().invalidate_corpus_dependent()
+        logger.info(f"URL ingestion complete. {len(chunks)} chunks, {endpoints} endpoints stored. {timings.summary()}")
+        return {"status": "success", "chunks": len(chunks), "endpoints": endpoints, "source": "url"}
     except Exception as e:
         logger.error(f"URL ingestion failed: {e}")
         return {"status": "error", "error": str(e), "source": "url"} 
\ No newline at end of file
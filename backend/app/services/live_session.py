@@ -0,0 +1,263 @@
+"""Live conversation sessions over a WebSocket.
+
+Over HTTP every turn is a new ``POST /chat`` or ``/agent`` that resolves the
+session again, reloads its history from the store and opens a new stream. A
+`LiveSession` does that work once per connection instead:
+
+* the session's history is loaded when the socket opens and stays resident
+  (`app.history_store.resident_history`) until it closes;
+* questions can be sent back to back: they are queued and answered in
+  order, at most ``WS_MAX_PENDING`` (default 8) at a time;
+* tokens are sent as the model produces them, and any turn, queued or
+  running, can be cancelled by id.
+
+Each turn is still bounded like its HTTP counterpart: the session token
+budget is checked, the turn takes a slot of its class's admission gate and
+runs under the route's `RequestBudget`.
+
+Protocol (JSON text frames)::
+
+    -> {"type": "ask", "id": "q1", "question": "...", "mode": "chat", "include_usage": false}
+    -> {"type": "cancel", "id": "q1"}
+    -> {"type": "ping"}
+    <- {"type": "ready", "session_id": "..."}
+    <- {"type": "queued", "id": "q1", "position": 1}
+    <- {"type": "token", "id": "q1", "text": "..."}
+    <- {"type": "done", "id": "q1", "elapsed_ms": 812.4, "usage": {...}}
+    <- {"type": "cancelled", "id": "q1"}
+    <- {"type": "error", "id": "q1", "status": 503, "detail": "...", "retry_after": 2}
+    <- {"type": "pong"}
+
+Metrics: ``documentor_ws_sessions`` (open connections) and
+``documentor_ws_turns_total`` (by ``mode`` and ``outcome``).
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import anyio.to_thread
+import orjson
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from app.config import logger
+from app.history_store import get_history_store, resident_history
+from app.services import admission
+from app.services.metrics import counter, gauge
+from app.services.usage import TokenBudgetExceeded, check_session_budget, session_budget, track_usage
+from app.utils.deadline import RequestBudget, budget_context
+
+__all__ = ["LiveSession", "MODES"]
+
+MODES = ("chat", "agent")
+
+WS_SESSIONS = gauge("documentor_ws_sessions", "Open WebSocket sessions.")
+WS_TURNS = counter("documentor_ws_turns_total", "WebSocket turns by mode and outcome.")
+
+_END = object()  # end of a turn's token stream
+
+
+def _max_pending() -> int:
+    return max(1, int(os.getenv("WS_MAX_PENDING", "8")))
+
+
+@dataclass
+class _Turn:
+    id: str
+    question: str
+    mode: str
+    include_usage: bool = False
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    started: bool = False
+
+
+class LiveSession:
+    """One WebSocket connection bound to one conversation session."""
+
+    def __init__(self, websocket: WebSocket, session_id: str) -> None:
+        self.websocket = websocket
+        self.session_id = session_id
+        self._history: Any = None
+        self._turns: Dict[str, _Turn] = {}  # queued or running, by id
+        self._queue: "asyncio.Queue[_Turn]" = asyncio.Queue()
+        self._send_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+
+    async def run(self) -> None:
+        """Serve the connection until the client goes away."""
+        self._history = await anyio.to_thread.run_sync(get_history_store().get, self.session_id)
+        await self._send(type="ready", session_id=self.session_id)
+        WS_SESSIONS.inc()
+        worker = asyncio.create_task(self._work())
+        try:
+            while True:
+                await self._handle(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            WS_SESSIONS.dec()
+            for turn in self._turns.values():
+                turn.cancelled.set()
+            worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await worker
+
+    async def _send(self, **message: Any) -> None:
+        # The receive loop and the worker both write; frames must not interleave.
+        async with self._send_lock:
+            await self.websocket.send_text(orjson.dumps(message).decode())
+
+    async def _error(self, status: int, detail: str, turn_id: Optional[str] = None, **extra: Any) -> None:
+        await self._send(type="error", id=turn_id, status=status, detail=detail, **extra)
+
+    # -- receive side ---------------------------------------------------------
+
+    async def _handle(self, raw: str) -> None:
+        try:
+            message = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            await self._error(400, "Messages must be JSON objects.")
+            return
+        if not isinstance(message, dict):
+            await self._error(400, "Messages must be JSON objects.")
+            return
+
+        kind = message.get("type")
+        if kind == "ask":
+            await self._ask(message)
+        elif kind == "cancel":
+            await self._cancel(str(message.get("id")))
+        elif kind == "ping":
+            await self._send(type="pong")
+        else:
+            await self._error(400, f"Unknown message type {kind!r}.")
+
+    async def _ask(self, message: Dict[str, Any]) -> None:
+        turn_id = str(message.get("id") or next(self._ids))
+        question = str(message.get("question") or "").strip()
+        mode = message.get("mode", "chat")
+        if not question:
+            await self._error(400, "Question must not be empty.", turn_id)
+        elif mode not in MODES:
+            await self._error(400, f"mode must be one of {', '.join(MODES)}.", turn_id)
+        elif turn_id in self._turns:
+            await self._error(409, f"Turn {turn_id!r} is already pending.", turn_id)
+        elif len(self._turns) >= _max_pending():
+            await self._error(429, "Too many pending questions on this connection.", turn_id)
+        else:
+            turn = _Turn(turn_id, question, mode, bool(message.get("include_usage")))
+            self._turns[turn_id] = turn
+            self._queue.put_nowait(turn)
+            await self._send(type="queued", id=turn_id, position=self._queue.qsize())
+
+    async def _cancel(self, turn_id: str) -> None:
+        turn = self._turns.get(turn_id)
+        if turn is None:
+            await self._error(404, f"No pending turn {turn_id!r}.", turn_id)
+            return
+        turn.cancelled.set()
+        if not turn.started:
+            # Still queued: confirm now; the worker drops it when it gets there.
+            self._turns.pop(turn_id, None)
+            WS_TURNS.inc(mode=turn.mode, outcome="cancelled")
+            await self._send(type="cancelled", id=turn_id)
+
+    # -- answer side ----------------------------------------------------------
+
+    async def _work(self) -> None:
+        while True:
+            turn = await self._queue.get()
+            if not turn.cancelled.is_set():
+                await self._answer(turn)
+
+    async def _answer(self, turn: _Turn) -> None:
+        turn.started = True
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            if session_budget():
+                try:
+                    await anyio.to_thread.run_sync(check_session_budget, self.session_id)
+                except TokenBudgetExceeded as exc:
+                    outcome = "rejected"
+                    detail = f"Session token budget exhausted ({exc.used} of {exc.limit} tokens used)."
+                    await self._error(429, detail, turn.id)
+                    return
+
+            gate = admission.get_gate(turn.mode) if admission.admission_enabled() else None
+            if gate is not None:
+                reason = await gate.acquire()
+                if reason is not None:
+                    outcome = "rejected"
+                    admission.REJECTED.inc(route_class=turn.mode, reason=reason)
+                    await self._error(503, "Server is busy, retry later.", turn.id, retry_after=gate.retry_after())
+                    return
+
+            admitted = time.perf_counter()
+            try:
+                budget = await self._stream(turn)
+            finally:
+                if gate is not None:
+                    gate.release(time.perf_counter() - admitted)
+
+            if turn.cancelled.is_set():
+                outcome = "cancelled"
+                await self._send(type="cancelled", id=turn.id)
+                return
+            outcome = "ok"
+            done: Dict[str, Any] = {"elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+            if turn.include_usage and budget.usage is not None:
+                done["usage"] = budget.usage.summary()
+            await self._send(type="done", id=turn.id, **done)
+        except Exception as exc:
+            logger.error(f"/ws turn failed (session={self.session_id}): {exc}")
+            await self._error(500, "Failed to process the question.", turn.id)
+        finally:
+            self._turns.pop(turn.id, None)
+            WS_TURNS.inc(mode=turn.mode, outcome=outcome)
+
+    async def _stream(self, turn: _Turn) -> RequestBudget:
+        """Run the turn's answer generator on a worker thread and relay its chunks."""
+        from app.services.agent_engine import stream_agent_answer
+        from app.services.query_engine import stream_answer
+
+        generate = stream_answer if turn.mode == "chat" else stream_agent_answer
+        budget = RequestBudget.for_route(turn.mode)
+        track_usage(budget, self.session_id)
+        loop = asyncio.get_running_loop()
+        chunks: "asyncio.Queue[Any]" = asyncio.Queue()
+
+        def pump() -> None:
+            try:
+                with resident_history(self.session_id, self._history):
+                    stream = generate(turn.question, session_id=self.session_id, budget=budget)
+                    try:
+                        for chunk in stream:
+                            if turn.cancelled.is_set():
+                                break
+                            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                    finally:
+                        stream.close()
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, _END)
+
+        # On disconnect the thread is abandoned; it stops at its next chunk.
+        worker = asyncio.ensure_future(
+            anyio.to_thread.run_sync(budget_context(budget).run, pump, abandon_on_cancel=True)
+        )
+        try:
+            while (chunk := await chunks.get()) is not _END:
+                if not turn.cancelled.is_set():
+                    await self._send(type="token", id=turn.id, text=chunk)
+            await worker  # surfaces errors raised in the generator
+        finally:
+            if not worker.done():
+                turn.cancelled.set()
+                worker.cancel()
+        return budget
@@ -0,0 +1,154 @@
+"""Factory for Gemini chat models.
+
+Every component that talks to Gemini obtains its client here. Importing
+`langchain_google_genai` costs close to a second, so the import is deferred
+until the first model is actually requested instead of happening when the
+API starts.
+
+Two env-vars bound the cost of a single call regardless of the caller:
+``LLM_TIMEOUT_S`` (client-side request timeout, default 60) and
+``LLM_MAX_OUTPUT_TOKENS`` (generation cap, unset = model default).
+
+Every call goes through the shared Gemini limiter (`app.services.rate_limiter`),
+which also owns retries.
+"""
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services.rate_limiter import get_limiter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+__all__ = ["get_chat_model", "GEMINI_CHAT_MODEL"]
+
+GEMINI_CHAT_MODEL = "gemini-2.5-flash"
+
+
+# Arguments of the SDK's `_prepare_request`; everything else goes to the client call.
+_REQUEST_ARGS = (
+    "tools",
+    "functions",
+    "safety_settings",
+    "tool_config",
+    "generation_config",
+    "cached_content",
+    "tool_choice",
+)
+_USAGE_KEYS = ("input_tokens", "output_tokens", "total_tokens")
+
+
+@lru_cache()
+def _rate_limited_model_class() -> type:
+    """`ChatGoogleGenerativeAI` whose calls go through the shared ``chat`` limiter.
+
+    The SDK wraps every call in its own fixed retry (two attempts, two seconds
+    apart, on any API error); the limiter retries with jitter and within the
+    request deadline instead. So the overrides below call the Gemini client
+    directly rather than through the SDK's retrying helpers. They reuse the
+    SDK's request and response conversion, which is why
+    ``langchain-google-genai`` is pinned (2.1.5) in ``requirements.txt``.
+    """
+    from langchain_core.messages import BaseMessage
+    from langchain_core.outputs import ChatGenerationChunk, ChatResult
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_google_genai.chat_models import _response_to_result
+
+    def chunk(response: Any, prev: Optional[dict], run_manager: Any) -> Tuple[ChatGenerationChunk, Optional[dict]]:
+        # Gemini reports cumulative usage on every chunk; each chunk keeps its delta.
+        generation = _response_to_result(response, stream=True, prev_usage=prev).generations[0]
+        usage = generation.message.usage_metadata
+        if usage:
+            prev = {key: (prev or {}).get(key, 0) + usage[key] for key in _USAGE_KEYS}
+        if run_manager:
+            run_manager.on_llm_new_token(generation.text)
+        return generation, prev
+
+    class RateLimitedChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+        def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> Tuple[Any, dict]:
+            """The SDK request for *messages* and the keyword arguments of the client call."""
+            kwargs = dict(kwargs)
+            args = {name: kwargs.pop(name) for name in _REQUEST_ARGS if name in kwargs}
+            args["cached_content"] = args.get("cached_content") or self.cached_content
+            request = self._prepare_request(messages, stop=stop, **args)
+            # No transport-level retry of 503s (up to 600 s by default), and the
+            # client timeout, which this SDK version does not apply by itself.
+            return request, {"retry": None, "timeout": self.timeout, **kwargs, "metadata": self.default_metadata}
+
+        def _generate(
+            self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+        ) -> ChatResult:
+            request, call_kwargs = self._request(messages, stop, kwargs)
+            return get_limiter("chat").call(
+                lambda: _response_to_result(self.client.generate_content(request=request, **call_kwargs))
+            )
+
+        def _stream(
+            self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+        ) -> Iterator[ChatGenerationChunk]:
+            request, call_kwargs = self._request(messages, stop, kwargs)
+
+            def chunks() -> Iterator[ChatGenerationChunk]:
+                prev = None
+                for response in self.client.stream_generate_content(request=request, **call_kwargs):
+                    generation, prev = chunk(response, prev, run_manager)
+                    yield generation
+
+            yield from get_limiter("chat").stream(chunks)
+
+        async def _agenerate(
+            self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+        ) -> ChatResult:
+            if not self.async_client:  # falls back to _generate on a thread, which is limited
+                return await super()._agenerate(messages, stop, run_manager, **kwargs)
+            request, call_kwargs = self._request(messages, stop, kwargs)
+
+            async def generate() -> ChatResult:
+                return _response_to_result(await self.async_client.generate_content(request=request, **call_kwargs))
+
+            return await get_limiter("chat").acall(generate)
+
+        async def _astream(
+            self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+        ) -> AsyncIterator[ChatGenerationChunk]:
+            if not self.async_client:  # falls back to _stream on a thread, which is limited
+                async for generation in super()._astream(messages, stop, run_manager, **kwargs):
+                    yield generation
+                return
+            request, call_kwargs = self._request(messages, stop, kwargs)
+
+            async def chunks() -> AsyncIterator[ChatGenerationChunk]:
+                prev = None
+                async for response in await self.async_client.stream_generate_content(request=request, **call_kwargs):
+                    generation, prev = chunk(response, prev, run_manager)
+                    yield generation
+
+            async for generation in get_limiter("chat").astream(chunks):
+                yield generation
+
+    return RateLimitedChatGoogleGenerativeAI
+
+
+@lru_cache()
+def get_chat_model(temperature: float = 0.7, system_as_human: bool = False) -> "ChatGoogleGenerativeAI":
+    """Return a cached Gemini chat model for the given generation settings.
+
+    Args:
+        temperature: Sampling temperature (tools use 0 for determinism).
+        system_as_human: Merge the system prompt into the first user turn,
+            which Gemini requires when a chain sends a separate system role.
+    """
+    settings = get_settings()
+    max_output_tokens = os.getenv("LLM_MAX_OUTPUT_TOKENS")
+    return _rate_limited_model_class()(
+        model=GEMINI_CHAT_MODEL,
+        google_api_key=settings.gemini_api_key,
+        temperature=temperature,
+        convert_system_message_to_human=system_as_human,
+        timeout=float(os.getenv("LLM_TIMEOUT_S", "60")),
+        max_output_tokens=int(max_output_tokens) if max_output_tokens else None,
+    )
@@ -0,0 +1,361 @@
+"""On-demand request profiling.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or is
+picked at random with probability ``PROFILE_SAMPLE_RATE``. Only paths that
+start with one of ``PROFILE_PATHS`` (default ``/agent,/chat``) are
+considered. A profiled request captures two things:
+
+* a wall-clock stack sample every ``PROFILE_INTERVAL_MS`` (5) of each thread
+  that is running application code. This covers the request thread and the
+  worker threads it hands work to (retrieval, LLM streaming, agent tools).
+  Samples are stored as collapsed stacks for flame-graph tools (speedscope,
+  ``flamegraph.pl``). Other requests in flight at the same time show up too;
+  the thread names tell them apart only partly.
+* the span tree of the stages it ran (`app.services.telemetry.stage` plus
+  the agent's model and tool calls), with start offsets and durations.
+
+Each profile is written to ``PROFILE_DIR`` (default ``.cache/profiles``) as
+one JSON file; the oldest files beyond ``PROFILE_MAX_FILES`` (100) are
+deleted. The response carries ``X-Profile-Id`` and the file can be downloaded
+from ``/admin/profiles/{id}`` with the same token.
+
+When neither a token nor a sample rate is configured, the middleware passes
+requests straight through and stages only do a context-variable lookup.
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.config import logger
+from app.services.metrics import counter
+
+__all__ = [
+    "ProfileSession",
+    "ProfilingMiddleware",
+    "current_profile",
+    "list_profiles",
+    "load_profile",
+    "profile_dir",
+    "profile_path",
+    "profile_token",
+    "record_span",
+    "token_matches",
+    "to_collapsed",
+]
+
+PROFILES = counter("documentor_profiles_total", "Requests profiled, by trigger (header or sample).")
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_ID_CHARS = set("0123456789abcdefghijklmnopqrstuvwxyz-")
+
+
+def profile_token() -> str:
+    return os.getenv("PROFILE_TOKEN", "")
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles"))
+
+
+def token_matches(value: Optional[str]) -> bool:
+    token = profile_token()
+    return bool(token and value) and hmac.compare_digest(value.encode(), token.encode())  # type: ignore[union-attr]
+
+
+# ---------------------------------------------------------------------------
+# Per-request session
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class _Span:
+    id: int
+    parent: Optional[int]
+    name: str
+    start: float
+    end: float = 0.0
+    thread: str = ""
+
+
+@dataclass
+class ProfileSession:
+    """Spans and stack samples of one profiled request."""
+
+    id: str
+    trigger: str
+    interval_s: float
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[_Span] = field(default_factory=list)
+    stacks: Counter = field(default_factory=Counter)
+    samples: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _stop: threading.Event = field(default_factory=threading.Event)
+    _sampler: Optional[threading.Thread] = None
+
+    # -- spans ------------------------------------------------------------------
+
+    def open_span(self, name: str, parent: Optional[int]) -> _Span:
+        with self._lock:
+            span = _Span(len(self.spans), parent, name, time.perf_counter(), thread=threading.current_thread().name)
+            self.spans.append(span)
+        return span
+
+    def span_tree(self) -> List[Dict[str, Any]]:
+        nodes = {
+            s.id: {
+                "name": s.name,
+                "thread": s.thread,
+                "start_ms": round((s.start - self.started) * 1000, 2),
+                "duration_ms": round(((s.end or time.perf_counter()) - s.start) * 1000, 2),
+                "children": [],
+            }
+            for s in self.spans
+        }
+        parents = {s.id: s.parent for s in self.spans}
+        # Callback spans (agent model/tool calls) are recorded when they end, so
+        # stages that ran inside a tool have the enclosing stage as parent.
+        # Re-parent them under the innermost sibling that contains them in time
+        # on the same thread.
+        for s in self.spans:
+            end = s.end or float("inf")
+            enclosing = [
+                o for o in self.spans
+                if o is not s and o.parent == s.parent and o.thread == s.thread
+                and o.start <= s.start and (o.end or float("inf")) >= end
+            ]
+            if enclosing:
+                parents[s.id] = max(enclosing, key=lambda o: o.start).id
+        roots: List[Dict[str, Any]] = []
+        for s in sorted(self.spans, key=lambda x: x.start):
+            parent = nodes.get(parents[s.id]) if parents[s.id] is not None else None
+            (parent["children"] if parent is not None else roots).append(nodes[s.id])
+        return roots
+
+    # -- sampling ---------------------------------------------------------------
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack: List[str] = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                in_app = in_app or code.co_filename.startswith(_APP_DIR)
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if in_app:  # idle pool workers and the event loop carry no app frames
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run_sampler(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self._sample()
+            except Exception:  # never let the profiler break the request
+                logger.debug("Profile sample failed", exc_info=True)
+
+    def start(self) -> None:
+        self._sampler = threading.Thread(target=self._run_sampler, name=f"profiler-{self.id[:8]}", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling; returns once the sampler no longer touches `stacks`."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+
+_PROFILE: ContextVar[Optional[ProfileSession]] = ContextVar("documentor_profile", default=None)
+_SPAN: ContextVar[Optional[int]] = ContextVar("documentor_profile_span", default=None)
+
+
+def current_profile() -> Optional[ProfileSession]:
+    return _PROFILE.get()
+
+
+class _SpanScope:
+    """Context manager recording one span in the active profile."""
+
+    __slots__ = ("session", "name", "span", "token")
+
+    def __init__(self, session: ProfileSession, name: str) -> None:
+        self.session = session
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.span = self.session.open_span(self.name, _SPAN.get())
+        self.token = _SPAN.set(self.span.id)
+
+    def __exit__(self, *exc: Any) -> None:
+        self.span.end = time.perf_counter()
+        try:
+            _SPAN.reset(self.token)
+        except ValueError:  # generator finished in another context
+            pass
+
+
+def span(session: ProfileSession, name: str) -> _SpanScope:
+    return _SpanScope(session, name)
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Add a finished span (from a callback) under the current span."""
+    session = _PROFILE.get()
+    if session is None:
+        return
+    recorded = session.open_span(name, _SPAN.get())
+    recorded.start, recorded.end = start, end
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """File of a stored profile, or None if there is none with that id."""
+    if not profile_id or not set(profile_id) <= _ID_CHARS:
+        return None  # never let an id escape the directory
+    path = os.path.join(profile_dir(), f"{profile_id}.json")
+    return path if os.path.exists(path) else None
+
+
+def _write(session: ProfileSession, request: Dict[str, Any]) -> None:
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    document = {
+        "id": session.id,
+        "trigger": session.trigger,
+        "request": request,
+        "spans": session.span_tree(),
+        "sampling": {"interval_ms": session.interval_s * 1000, "samples": session.samples},
+        "stacks": dict(session.stacks.most_common()),
+    }
+    with open(os.path.join(directory, f"{session.id}.json"), "w", encoding="utf-8") as fh:
+        json.dump(document, fh)
+
+    limit = int(os.getenv("PROFILE_MAX_FILES", "100"))
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    for stale in files[:-limit] if limit > 0 else []:
+        os.remove(os.path.join(directory, stale))
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored profiles, newest first (id, request summary)."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted((f for f in os.listdir(directory) if f.endswith(".json")), reverse=True):
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as fh:
+                doc = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        profiles.append({"id": doc["id"], "trigger": doc["trigger"], **doc["request"]})
+    return profiles
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    path = profile_path(profile_id)
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def to_collapsed(profile: Dict[str, Any]) -> str:
+    """Render the stack samples in collapsed format (``frame;frame count``)."""
+    return "".join(f"{stack} {count}\n" for stack, count in profile.get("stacks", {}).items())
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------------
+
+
+def _new_id() -> str:
+    # Time-ordered (to the millisecond), so pruning by name drops the oldest.
+    now = time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+
+
+class ProfilingMiddleware:
+    """Profiles selected HTTP requests until their last response byte is sent."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.paths = tuple(p.strip() for p in os.getenv("PROFILE_PATHS", "/agent,/chat").split(",") if p.strip())
+        self.interval_s = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.enabled = bool(profile_token()) or self.sample_rate > 0
+
+    def _trigger(self, scope: Dict[str, Any]) -> Optional[str]:
+        if not scope["path"].startswith(self.paths):
+            return None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-profile":
+                return "header" if token_matches(value.decode("latin-1")) else None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(
+            id=_new_id(),
+            trigger=trigger,
+            interval_s=self.interval_s,
+        )
+        status = {"code": 500}
+
+        async def _send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        PROFILES.inc(trigger=trigger)
+        token = _PROFILE.set(session)
+        session.start()
+        try:
+            with span(session, f"{scope['method']} {scope['path']}"):
+                await self.app(scope, receive, _send)
+        finally:
+            duration_s = time.perf_counter() - session.started
+            await asyncio.to_thread(session.stop)  # waits out an in-progress sample
+            _PROFILE.reset(token)
+            request = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "duration_ms": round(duration_s * 1000, 2),
+            }
+            try:
+                await asyncio.to_thread(_write, session, request)
+                logger.info("Profiled %s %s -> %s (%s)", scope["method"], scope["path"], session.id, trigger)
+            except OSError as exc:
+                logger.error("Could not store profile %s: %s", session.id, exc)
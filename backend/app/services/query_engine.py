@@ -1,20 +1,49 @@
-from app.config import logger, get_settings
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from app.config import logger
 from app.vector.chroma_client import get_vectorstore
-from app.models.schemas import ChatResponse
+from app.models.schemas import ChatResponse, SourceRef
+from app.services.llm import get_chat_model
+from app.services.usage import UsageTracker, track_usage
+from app.utils.deadline import (
+    DeadlineExceeded,
+    RequestBudget,
+    budget_context,
+    current_budget,
+    iter_with_deadline,
+    record_timeout,
+)
+from app.utils.timing import StageTimings
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
 
 # Shared history store
-from app.history_store import DEFAULT_HISTORY_STORE
+from app.history_store import get_history_store, session_history
+
+# Worker pool for the independent pre-LLM stages (history load, retrieval).
+# Sized for a couple of stages per in-flight request on the default threadpool.
+_STAGE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RAG_STAGE_WORKERS", "16")),
+    thread_name_prefix="rag-stage",
+)
+
+_TIMEOUT_ANSWER = "Sorry, the request timed out before an answer could be generated."
+_TRUNCATED_NOTE = "\n\n[Answer truncated: the request deadline was reached.]"
+_SNIPPET_CHARS = 200
 
 
 def _build_prompt_template() -> ChatPromptTemplate:
-    """Return a chat prompt template compatible with create_stuff_documents_chain."""
+    """Return the chat prompt used to answer questions over retrieved context."""
     # Reuse same wording as earlier PromptTemplate but as ChatPrompt with roles
     return ChatPromptTemplate.from_messages(
         [
@@ -28,27 +57,48 @@ def _build_prompt_template() -> ChatPromptTemplate:
     )
 
 
-def answer_query(user_question: str, session_id: str = "default") -> ChatResponse:
+def answer_query(
+    user_question: str,
+    session_id: str = "default",
+    budget: Optional[RequestBudget] = None,
+    source_mode: str = "ref",
+) -> ChatResponse:
     """
     Retrieve relevant document chunks from ChromaDB Cloud and answer the user's question
     using Gemini via LangChain.
+
+    The whole call is bounded by *budget* (default: the caller's budget, or the
+    configured ``/chat`` budget). If the deadline passes while the answer is
+    being generated, the text produced so far is returned with a note. Token
+    usage is reported to the budget's `UsageTracker`. *source_mode* selects
+    how much of each source chunk is returned (see `_sources`).
     """
+    budget = _resolve_budget(budget)
     try:
-        # RAG chain with conversational memory
-        rag_chain = _build_rag_with_memory()
+        turn = _prepare_turn(user_question, session_id, budget)
 
-        result = rag_chain.invoke(
-            {"input": user_question},
-            config={"configurable": {"session_id": session_id}},
-        )
+        parts: List[str] = []
+        try:
+            with turn.timings.stage("llm"):
+                for chunk in _stream_llm(turn, user_question, budget):
+                    parts.append(chunk)
+        except DeadlineExceeded as exc:
+            _on_timeout(session_id, budget, exc, turn.timings)
+            partial = "".join(parts)
+            answer = partial + _TRUNCATED_NOTE if partial else _TIMEOUT_ANSWER
+            return ChatResponse(answer=answer, sources=_sources(turn.docs, source_mode))
 
-        answer_text: str = result["answer"]
-        context_docs = result.get("context", [])  # list of Documents
-        sources = [doc.page_content for doc in context_docs] if context_docs else None
+        answer_text = "".join(parts)
+        with turn.timings.stage("history_append"):
+            _record_turn(turn.history, user_question, answer_text)
 
         logger.info("Query answered. Length of answer: %d", len(answer_text))
-        return ChatResponse(answer=answer_text, sources=sources)
+        _log_timings(session_id, turn.timings)
+        return ChatResponse(answer=answer_text, sources=_sources(turn.docs, source_mode))
 
+    except DeadlineExceeded as exc:
+        _on_timeout(session_id, budget, exc)
+        return ChatResponse(answer=_TIMEOUT_ANSWER, sources=None)
     except Exception as e:
         logger.error("Failed to answer query: %s", e)
         return ChatResponse(
@@ -58,31 +108,180 @@ def answer_query(user_question: str, session_id: str = "default") -> ChatRespons
 
 
 # ---------------------------------------------------------------------------
-# RAG chain builder (Runnable graph)
+# RAG pipeline building blocks
 # ---------------------------------------------------------------------------
+#
+# Only the LLM call depends on *both* the conversation history and the
+# retrieved context, so those two lookups are fanned out concurrently and
+# joined right before the prompt is rendered:
+#
+#     history load ──┐
+#                    ├──► prompt ► LLM ► history append
+#     embed+search ──┘
+
+
+class _RagTurn(NamedTuple):
+    """Inputs gathered for a single question before the LLM call."""
+
+    history: BaseChatMessageHistory
+    docs: List[Document]
+    timings: StageTimings
+    usage: UsageTracker
+
+
+@lru_cache()
+def _get_qa_chain():
+    """Return the prompt → LLM → string chain (built once per process)."""
+    return _build_prompt_template() | get_chat_model() | StrOutputParser()
+
+
+def _run_concurrently(
+    stages: Dict[str, Callable[[], Any]], timings: StageTimings, budget: RequestBudget
+) -> Dict[str, Any]:
+    """Run independent *stages* in parallel and return their results by name.
+
+    Context variables are copied into the workers (with *budget* published)
+    so request-scoped state follows along. Waiting stops at the request
+    deadline (`DeadlineExceeded` names the first stage that had not finished).
+    """
+
+    def _timed(name: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+        def _run() -> Any:
+            with timings.stage(name):
+                return fn()
+
+        return _run
+
+    futures = {
+        name: _STAGE_POOL.submit(budget_context(budget).run, _timed(name, fn)) for name, fn in stages.items()
+    }
+    results: Dict[str, Any] = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=budget.remaining())
+        except FutureTimeoutError:
+            raise DeadlineExceeded(name) from None
+    return results
+
+
+def _prepare_turn(user_question: str, session_id: str, budget: RequestBudget) -> _RagTurn:
+    """Load history and retrieve context for *user_question* concurrently."""
+    timings = StageTimings()
+    usage = track_usage(budget, session_id)
+    results = _run_concurrently(
+        {
+            # Query embedding + vector search (usually the slowest stage).
+            "retrieval": lambda: _get_retriever().invoke(user_question, config=_run_config(usage, "retrieval")),
+            "history_load": lambda: _get_session_history(session_id),
+        },
+        timings,
+        budget,
+    )
+    return _RagTurn(results["history_load"], results["retrieval"], timings, usage)
+
+
+async def _aprepare_turn(user_question: str, session_id: str, usage: UsageTracker) -> _RagTurn:
+    """Async counterpart of `_prepare_turn` built on `asyncio.gather`."""
+    timings = StageTimings()
+
+    async def _retrieve() -> List[Document]:
+        with timings.stage("retrieval"):
+            return await _get_retriever().ainvoke(user_question, config=_run_config(usage, "retrieval"))
+
+    async def _load_history() -> BaseChatMessageHistory:
+        with timings.stage("history_load"):
+            # Native async read (Motor for Mongo) – no worker thread needed.
+            return await get_history_store().aget(session_id)
+
+    docs, history = await asyncio.gather(_retrieve(), _load_history())
+    return _RagTurn(history, docs, timings, usage)
+
+
+def _get_retriever():
+    return get_vectorstore().as_retriever()
 
 
-def _build_base_rag_chain():
-    """Return a configured RunnableSequence for RAG QA."""
-    settings = get_settings()
+def _run_config(usage: UsageTracker, run_name: str) -> Dict[str, Any]:
+    # The run name becomes the usage component of calls made outside tools.
+    return {"run_name": run_name, **usage.config()}
 
-    retriever = get_vectorstore().as_retriever()
-    qa_prompt = _build_prompt_template()
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=settings.gemini_api_key)
 
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    return create_retrieval_chain(retriever, question_answer_chain)
+def _format_docs(docs: List[Document]) -> str:
+    """Join retrieved chunks the same way `create_stuff_documents_chain` does."""
+    return "\n\n".join(doc.page_content for doc in docs)
 
 
-def _build_rag_with_memory() -> RunnableWithMessageHistory:
-    """Return a RAG chain wrapped with conversational memory."""
-    base_chain = _build_base_rag_chain()
-    return RunnableWithMessageHistory(
-        base_chain,
-        _get_session_history,
-        input_messages_key="input",
-        history_messages_key="chat_history",
-        output_messages_key="answer",
+def _chain_inputs(turn: _RagTurn, user_question: str) -> Dict[str, Any]:
+    with turn.timings.stage("prompt_build"):
+        return {
+            "input": user_question,
+            "chat_history": turn.history.messages,
+            "context": _format_docs(turn.docs),
+        }
+
+
+def _sources(docs: List[Document], mode: str = "ref") -> Optional[List[SourceRef]]:
+    """Describe the retrieved chunks: references (``ref``), plus a snippet or the full text."""
+    if not docs:
+        return None
+    refs = []
+    for doc in docs:
+        meta, text = doc.metadata or {}, doc.page_content
+        start = meta.get("start_index")  # absent for chunks ingested before offsets were stored
+        refs.append(
+            SourceRef(
+                id=doc.id or hashlib.sha1(text.encode("utf-8")).hexdigest()[:16],
+                source=meta.get("source"),
+                url=meta.get("url"),
+                chunk_id=meta.get("chunk_id"),
+                start=start,
+                end=start + len(text) if start is not None else None,
+                snippet=text[:_SNIPPET_CHARS] if mode == "snippet" else None,
+                text=text if mode == "full" else None,
+            )
+        )
+    return refs
+
+
+def _record_turn(history: BaseChatMessageHistory, user_question: str, answer_text: str) -> None:
+    """Persist the question/answer pair once the answer is complete."""
+    history.add_messages([HumanMessage(content=user_question), AIMessage(content=answer_text)])
+
+
+def _log_timings(session_id: str, timings: StageTimings) -> None:
+    logger.info("RAG timings (session=%s): %s", session_id, timings.summary())
+
+
+def _resolve_budget(budget: Optional[RequestBudget]) -> RequestBudget:
+    # Nested calls (e.g. from an agent tool) inherit the caller's deadline.
+    return budget or current_budget() or RequestBudget.for_route("chat")
+
+
+def _stream_llm(turn: _RagTurn, user_question: str, budget: RequestBudget):
+    """Stream answer chunks from the QA chain, bounded by the request deadline."""
+    inputs = _chain_inputs(turn, user_question)
+    first = True
+    config = _run_config(turn.usage, "rag")
+    for chunk in iter_with_deadline(lambda: _get_qa_chain().stream(inputs, config=config), budget, "llm"):
+        if first:
+            turn.timings.first_token(budget.route)
+            first = False
+        yield chunk
+
+
+def _on_timeout(
+    session_id: str,
+    budget: RequestBudget,
+    exc: DeadlineExceeded,
+    timings: Optional[StageTimings] = None,
+) -> None:
+    record_timeout(budget, exc.stage)
+    logger.warning(
+        "RAG request timed out after %.1fs during %s (session=%s)%s",
+        budget.timeout_s,
+        exc.stage,
+        session_id,
+        f": {timings.summary()}" if timings else "",
     )
 
 
@@ -91,33 +290,75 @@ def _build_rag_with_memory() -> RunnableWithMessageHistory:
 # ---------------------------------------------------------------------------
 
 
-def stream_answer(user_question: str, session_id: str = "default"):
-    """Yield answer chunks as they stream from the model."""
-    rag_chain = _build_rag_with_memory()
-    for chunk in rag_chain.stream(
-        {"input": user_question},
-        config={"configurable": {"session_id": session_id}},
-    ):
-        yield chunk
+def stream_answer(
+    user_question: str,
+    session_id: str = "default",
+    budget: Optional[RequestBudget] = None,
+):
+    """Yield answer chunks as they stream from the model.
+
+    Streaming stops at the request deadline with a short truncation note.
+    """
+    budget = _resolve_budget(budget)
+    try:
+        turn = _prepare_turn(user_question, session_id, budget)
+    except DeadlineExceeded as exc:
+        _on_timeout(session_id, budget, exc)
+        yield _TIMEOUT_ANSWER
+        return
+
+    parts: List[str] = []
+    try:
+        with turn.timings.stage("llm"):
+            for chunk in _stream_llm(turn, user_question, budget):
+                parts.append(chunk)
+                yield chunk
+    except DeadlineExceeded as exc:
+        _on_timeout(session_id, budget, exc, turn.timings)
+        yield _TRUNCATED_NOTE if parts else _TIMEOUT_ANSWER
+        return
+
+    with turn.timings.stage("history_append"):
+        _record_turn(turn.history, user_question, "".join(parts))
+    _log_timings(session_id, turn.timings)
 
 
-async def answer_query_async(user_question: str, session_id: str = "default") -> ChatResponse:
+async def answer_query_async(
+    user_question: str,
+    session_id: str = "default",
+    budget: Optional[RequestBudget] = None,
+    source_mode: str = "ref",
+) -> ChatResponse:
     """Async version of answer_query using `.ainvoke()`."""
-    rag_chain = _build_rag_with_memory()
+    budget = _resolve_budget(budget)
+    usage = track_usage(budget, session_id)
+
+    async def _answer() -> ChatResponse:
+        turn = await _aprepare_turn(user_question, session_id, usage)
+
+        with turn.timings.stage("llm"):
+            answer_text: str = await _get_qa_chain().ainvoke(
+                _chain_inputs(turn, user_question), config=_run_config(usage, "rag")
+            )
+
+        with turn.timings.stage("history_append"):
+            await turn.history.aadd_messages(
+                [HumanMessage(content=user_question), AIMessage(content=answer_text)]
+            )
+
+        _log_timings(session_id, turn.timings)
+        return ChatResponse(answer=answer_text, sources=_sources(turn.docs, source_mode))
+
     try:
-        result = await rag_chain.ainvoke(
-            {"input": user_question},
-            config={"configurable": {"session_id": session_id}},
-        )
-        answer_text: str = result["answer"]
-        context_docs = result.get("context", [])
-        sources = [doc.page_content for doc in context_docs] if context_docs else None
-        return ChatResponse(answer=answer_text, sources=sources)
+        return await asyncio.wait_for(_answer(), timeout=budget.remaining())
+    except asyncio.TimeoutError:
+        _on_timeout(session_id, budget, DeadlineExceeded("async_answer"))
+        return ChatResponse(answer=_TIMEOUT_ANSWER, sources=None)
     except Exception as e:
         logger.error("Async query failed: %s", e)
         return ChatResponse(answer="Error", sources=None)
 
 
 def _get_session_history(session_id: str) -> BaseChatMessageHistory:
-    """Return a ChatMessageHistory for *session_id* using the shared store."""
-    return DEFAULT_HISTORY_STORE.get(session_id) 
\ No newline at end of file
+    """Return the history of *session_id*: the connection's resident one, else the shared store's."""
+    return session_history(session_id)
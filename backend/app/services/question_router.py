@@ -0,0 +1,135 @@
+"""Cheap rule-based router in front of the developer agent.
+
+Most `/agent` traffic is plain documentation Q&A, which the RAG pipeline can
+answer with a single LLM call. The ReAct agent costs at least three (choose a
+tool, the nested RAG answer, the final answer), so it is reserved for requests
+that actually need its tools: code snippets, endpoint suggestions and Postman
+collections.
+
+A follow-up that refers back to the previous turn ("the same for orders",
+"do it again") stays with the agent when that turn ran the agent, because the
+RAG chain has no tools to redo it with. The previous route is remembered per
+process, so on another replica such a follow-up falls back to RAG.
+
+The classifier is pure regex – no model call – and every decision is logged on
+the ``documentor.backend.router`` logger so the rules can be tuned from
+production traffic. Set ``AGENT_FAST_PATH_ENABLED=false`` to send everything
+to the agent.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Pattern, Tuple
+
+from app.config import logger
+
+__all__ = ["Route", "RouteDecision", "route_question", "fast_path_enabled"]
+
+_router_logger = logger.getChild("router")
+
+_FEATURE_FLAG = "AGENT_FAST_PATH_ENABLED"
+
+
+class Route(str, Enum):
+    """Where a question should be answered."""
+
+    RAG = "rag"
+    AGENT = "agent"
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: Route
+    reason: str
+    matched: Tuple[str, ...] = ()
+
+
+# Signals that a question needs one of the agent's tools. Each key is logged
+# with the decision so false positives/negatives can be traced to a rule.
+_AGENT_SIGNALS: Dict[str, Pattern[str]] = {
+    "code": re.compile(
+        r"\b(snippets?|scripts?|curl|python|javascript|js|typescript|ts|node(?:\.?js)?|httpx|axios|"
+        r"golang|java|kotlin|ruby|php|rust|swift|csharp|"
+        r"sdk|requests library|example request|sample request)\b"
+        r"|\b(?:in|using|with|for) go\b|(?<!\w)(?:c#|\.net)(?!\w)"
+        # "code" on its own, but not "status code" / "error code" / "404 code" lookups
+        r"|(?<!status )(?<!error )(?<!response )(?<!http )(?<!\d\d\d )\bcode\b",
+        re.IGNORECASE,
+    ),
+    "postman": re.compile(r"\bpostman\b", re.IGNORECASE),
+    "endpoint_suggestion": re.compile(
+        r"\b(which|what|suggest|recommend|best|right|correct)\b[^?.!]{0,40}\b(endpoint|route|api call)s?\b"
+        r"[^?.!]{0,40}\b(should|to use|for|can i use)\b",
+        re.IGNORECASE,
+    ),
+    "generation": re.compile(
+        r"\b(generate|write|create|build|give me|show me how to (?:call|use))\b[^?.!]{0,40}"
+        r"\b(request|call|client|example|function|integration)\b",
+        re.IGNORECASE,
+    ),
+}
+
+# Words that refer back to the previous answer ("the same for orders", "do it
+# again", "and for POST?").
+_FOLLOW_UP = re.compile(
+    r"\b(same|that|those|this|it|again|instead|also)\b|^(and|now|then|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+# Sessions whose last turn ran the agent, most recent last (bounded).
+_MAX_TRACKED_SESSIONS = 10_000
+_agent_sessions: "OrderedDict[str, None]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def _remember(session_id: str, route: Route) -> None:
+    """Record *route* as the session's latest."""
+    with _sessions_lock:
+        if route is Route.AGENT:
+            _agent_sessions[session_id] = None
+            _agent_sessions.move_to_end(session_id)
+            if len(_agent_sessions) > _MAX_TRACKED_SESSIONS:
+                _agent_sessions.popitem(last=False)
+        else:
+            _agent_sessions.pop(session_id, None)
+
+
+def _after_agent_turn(session_id: str) -> bool:
+    with _sessions_lock:
+        return session_id in _agent_sessions
+
+
+def fast_path_enabled() -> bool:
+    return os.getenv(_FEATURE_FLAG, "true").lower() in {"1", "true", "yes"}
+
+
+def route_question(user_question: str, session_id: str = "default") -> RouteDecision:
+    """Classify *user_question* as a plain doc lookup (RAG) or an agent task."""
+    question = user_question.strip()
+
+    if not fast_path_enabled():
+        decision = RouteDecision(Route.AGENT, "fast_path_disabled")
+    else:
+        matched = tuple(name for name, pattern in _AGENT_SIGNALS.items() if pattern.search(question))
+        if matched:
+            decision = RouteDecision(Route.AGENT, "tool_signal", matched)
+        elif _FOLLOW_UP.search(question) and _after_agent_turn(session_id):
+            decision = RouteDecision(Route.AGENT, "follow_up")
+        else:
+            decision = RouteDecision(Route.RAG, "plain_lookup")
+    _remember(session_id, decision.route)
+
+    _router_logger.info(
+        "route=%s reason=%s matched=%s session=%s words=%d",
+        decision.route.value,
+        decision.reason,
+        ",".join(decision.matched) or "-",
+        session_id,
+        len(question.split()),
+    )
+    return decision
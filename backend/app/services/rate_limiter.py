@@ -0,0 +1,459 @@
+"""Shared, adaptive rate limiting and retries for Gemini calls.
+
+The RAG chain, the agent and its tools (code snippets, endpoint suggestions)
+and the embedder all share one Gemini quota. Every call goes through the
+process-wide `AdaptiveLimiter` for its upstream (``chat`` or ``embedding``).
+The limiter combines three mechanisms:
+
+* a token bucket of ``GEMINI_<KIND>_RPM`` requests per minute (0 = no rate
+  cap). With ``RATE_LIMIT_SHARED_PATH`` set, the bucket lives in a SQLite
+  file, so all workers on the host share it;
+* an AIMD concurrency window, between 1 and ``GEMINI_<KIND>_CONCURRENCY``. It
+  grows by one slot per window of successful calls, is halved when Gemini
+  answers 429, and shrinks by 10 % when calls take longer than
+  ``GEMINI_LATENCY_TARGET_S`` (time to the first chunk for streams);
+* priorities. Calls made for a request being served (one with a
+  `RequestBudget`) are *interactive*, calls marked with ``priority("ingest")``
+  are *ingest*, and all other calls are *batch*. A waiting caller of a higher
+  priority goes first, and batch and ingest calls may fill only
+  ``GEMINI_BACKGROUND_SHARE`` (0.5) of the window.
+
+429s and transient errors (500/503/504) are retried up to
+``GEMINI_MAX_RETRIES`` (3) times with full-jitter exponential backoff. A
+retry is never slept past the request deadline, and a stream is never retried
+once it has produced a chunk. The SDK's own retries are turned off (see
+`app.services.llm`) so they do not multiply.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from app.config import logger
+from app.services.metrics import counter, gauge, histogram
+from app.utils.deadline import DeadlineExceeded, current_budget
+
+__all__ = [
+    "AdaptiveLimiter",
+    "RateLimitTimeout",
+    "current_priority",
+    "get_limiter",
+    "priority",
+]
+
+T = TypeVar("T")
+
+PRIORITIES = ("interactive", "batch", "ingest")  # highest first
+
+WINDOW = gauge("documentor_upstream_concurrency_limit", "Current adaptive concurrency window, by upstream.")
+IN_FLIGHT = gauge("documentor_upstream_in_flight", "Upstream calls in progress, by upstream.")
+WAIT_SECONDS = histogram(
+    "documentor_upstream_wait_seconds", "Time calls waited for the rate limiter, by upstream and priority."
+)
+CALLS = counter(
+    "documentor_upstream_calls_total",
+    "Upstream call attempts by outcome (ok, throttled, transient, error, cancelled).",
+)
+RETRIES = counter("documentor_upstream_retries_total", "Upstream calls retried, by upstream and reason.")
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a background call waits longer than ``RATE_LIMIT_MAX_WAIT_S`` for a slot."""
+
+
+# ---------------------------------------------------------------------------
+# Priorities
+# ---------------------------------------------------------------------------
+
+_PRIORITY: ContextVar[Optional[str]] = ContextVar("documentor_upstream_priority", default=None)
+
+
+@contextmanager
+def priority(level: str) -> Iterator[None]:
+    """Run the enclosed calls (or decorated function) at *level*."""
+    if level not in PRIORITIES:
+        raise ValueError(f"unknown priority {level!r}")
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_priority() -> str:
+    explicit = _PRIORITY.get()
+    if explicit is not None:
+        return explicit
+    return "interactive" if current_budget() is not None else "batch"
+
+
+# ---------------------------------------------------------------------------
+# Token buckets
+# ---------------------------------------------------------------------------
+
+
+class _LocalBucket:
+    """Token bucket of this process."""
+
+    def __init__(self, rate_per_s: float, burst: float) -> None:
+        self.rate, self.burst = rate_per_s, burst
+        self._tokens, self._updated = burst, time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, else the seconds until one is due."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class _SharedBucket:
+    """Token bucket in a SQLite file, shared by the workers on one host."""
+
+    def __init__(self, path: str, name: str, rate_per_s: float, burst: float) -> None:
+        self.rate, self.burst = rate_per_s, burst
+        self._path, self._name = path, name
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets"
+            " (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (self._name,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (self._name, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+# ---------------------------------------------------------------------------
+# Limiter
+# ---------------------------------------------------------------------------
+
+
+def _classify(exc: BaseException) -> Optional[str]:
+    """``throttled`` (429), ``transient`` (5xx, upstream timeout) or None (not retryable)."""
+    try:
+        from google.api_core import exceptions as api
+    except ImportError:  # pragma: no cover – installed with the Gemini SDK
+        api = None
+    for candidate in (exc, exc.__cause__):  # the embeddings client wraps the API error
+        if candidate is None:
+            continue
+        if api is not None:
+            if isinstance(candidate, (api.ResourceExhausted, api.TooManyRequests)):
+                return "throttled"
+            if isinstance(
+                candidate,
+                (api.ServiceUnavailable, api.InternalServerError, api.GatewayTimeout, api.DeadlineExceeded),
+            ):
+                return "transient"
+        code = getattr(candidate, "code", None) or getattr(candidate, "status_code", None)
+        if code == 429:
+            return "throttled"
+        if code in (500, 502, 503, 504):
+            return "transient"
+    return None
+
+
+class AdaptiveLimiter:
+    """Rate, concurrency and priority gate plus retry policy for one upstream."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        rpm: float = 0.0,
+        latency_target_s: float = 10.0,
+        max_retries: int = 3,
+        background_share: float = 0.5,
+        shared_path: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.max_window = max(1, max_concurrency)
+        self.window = float(self.max_window)
+        self.latency_target_s = latency_target_s
+        self.max_retries = max_retries
+        self.background_share = background_share
+        self.active = 0
+        self._waiting = [0] * len(PRIORITIES)
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+        self._bucket: Any = None
+        if rpm > 0:
+            rate, burst = rpm / 60.0, max(1.0, rpm / 60.0)
+            self._bucket = _SharedBucket(shared_path, name, rate, burst) if shared_path else _LocalBucket(rate, burst)
+        WINDOW.set(self.window, upstream=name)
+
+    @classmethod
+    def from_env(cls, name: str, env: str, default_concurrency: int) -> "AdaptiveLimiter":
+        return cls(
+            name,
+            max_concurrency=int(os.getenv(f"GEMINI_{env}_CONCURRENCY", default_concurrency)),
+            rpm=float(os.getenv(f"GEMINI_{env}_RPM", "0")),
+            latency_target_s=float(os.getenv("GEMINI_LATENCY_TARGET_S", "10")),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+            background_share=float(os.getenv("GEMINI_BACKGROUND_SHARE", "0.5")),
+            shared_path=os.getenv("RATE_LIMIT_SHARED_PATH") or None,
+        )
+
+    # -- slots -------------------------------------------------------------------
+
+    def _may_start(self, rank: int) -> bool:
+        if any(self._waiting[:rank]):
+            return False  # someone more important is waiting
+        window = self.window if rank == 0 else self.window * self.background_share
+        return self.active < max(1, int(window))
+
+    def _try_start(self, rank: int) -> bool:
+        """Reserve a slot if allowed (call with `_cond` held)."""
+        if not self._may_start(rank):
+            return False
+        self.active += 1
+        IN_FLIGHT.set(self.active, upstream=self.name)
+        return True
+
+    def _take_token(self) -> float:
+        """Take a rate token for a reserved slot: 0, or the seconds until one is due.
+
+        Runs without `_cond`: the shared bucket is a SQLite transaction that
+        may wait up to five seconds for another worker.
+        """
+        wait = self._bucket.take() if self._bucket is not None else 0.0
+        if wait:
+            self._unreserve()
+        return wait
+
+    def _unreserve(self) -> None:
+        with self._cond:
+            self.active -= 1
+            IN_FLIGHT.set(self.active, upstream=self.name)
+            self._cond.notify_all()
+
+    def acquire(self, level: str, timeout: Optional[float]) -> None:
+        """Block until a slot and a rate token are available, or *timeout* passes."""
+        rank = PRIORITIES.index(level)
+        start = time.monotonic()
+
+        def left() -> Optional[float]:
+            remaining = None if timeout is None else timeout - (time.monotonic() - start)
+            if remaining is not None and remaining <= 0:
+                raise RateLimitTimeout(f"no {self.name} slot within {timeout:.1f}s")
+            return remaining
+
+        with self._cond:
+            self._waiting[rank] += 1
+        try:
+            while True:
+                with self._cond:
+                    while not self._try_start(rank):
+                        self._cond.wait(min(x for x in (left(), 1.0) if x is not None))
+                wait = self._take_token()
+                if not wait:
+                    break
+                # Still counted as waiting, so lower priorities cannot take the token first.
+                remaining = left()
+                time.sleep(wait if remaining is None else min(wait, remaining))
+        finally:
+            with self._cond:
+                self._waiting[rank] -= 1
+                self._cond.notify_all()
+        WAIT_SECONDS.observe(time.monotonic() - start, upstream=self.name, priority=level)
+
+    def release(self, outcome: str, latency_s: float) -> None:
+        """Free a slot and adapt the window to how the call went."""
+        CALLS.inc(upstream=self.name, outcome=outcome)
+        with self._cond:
+            self.active -= 1
+            now = time.monotonic()
+            if outcome == "throttled":
+                # One cut per second: a burst of 429s is one congestion signal.
+                if now - self._last_cut > 1.0:
+                    self.window, self._last_cut = max(1.0, self.window / 2), now
+            elif outcome == "ok":
+                if latency_s > self.latency_target_s and now - self._last_cut > self.latency_target_s:
+                    self.window, self._last_cut = max(1.0, self.window * 0.9), now
+                elif latency_s <= self.latency_target_s:
+                    self.window = min(float(self.max_window), self.window + 1 / self.window)
+            IN_FLIGHT.set(self.active, upstream=self.name)
+            WINDOW.set(self.window, upstream=self.name)
+            self._cond.notify_all()
+
+    # -- retry policy -------------------------------------------------------------
+
+    def _wait_timeout(self) -> Optional[float]:
+        budget = current_budget()
+        if budget is not None:
+            return budget.remaining()
+        limit = float(os.getenv("RATE_LIMIT_MAX_WAIT_S", "120"))
+        return limit if limit > 0 else None
+
+    def _acquire(self, level: str) -> None:
+        try:
+            self.acquire(level, self._wait_timeout())
+        except RateLimitTimeout:
+            if current_budget() is not None:
+                raise DeadlineExceeded("rate_limit")
+            raise
+
+    def _retry_delay(self, outcome: str, attempt: int) -> Optional[float]:
+        """Seconds to back off before the next attempt, or None to give up."""
+        if outcome not in ("throttled", "transient") or attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))  # full jitter
+        budget = current_budget()
+        if budget is not None and delay >= budget.remaining():
+            return None
+        RETRIES.inc(upstream=self.name, reason=outcome)
+        logger.info("Gemini %s call %s, retry %d in %.2fs", self.name, outcome, attempt + 1, delay)
+        return delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run *fn* under the limiter, retrying throttled and transient failures."""
+        level = current_priority()
+        attempt = 0
+        while True:
+            self._acquire(level)
+            start, outcome = time.perf_counter(), "cancelled"
+            try:
+                result = fn()
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                outcome = _classify(exc) or "error"
+                delay = self._retry_delay(outcome, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(outcome, time.perf_counter() - start)
+            time.sleep(delay)
+            attempt += 1
+
+    def stream(self, make_iter: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """Yield from a stream under the limiter; the slot is held until it ends."""
+        level = current_priority()
+        attempt = 0
+        while True:
+            self._acquire(level)
+            start, outcome = time.perf_counter(), "cancelled"
+            first: Optional[float] = None
+            try:
+                for chunk in make_iter():
+                    if first is None:
+                        first = time.perf_counter() - start
+                    yield chunk
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome = _classify(exc) or "error"
+                delay = None if first is not None else self._retry_delay(outcome, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(outcome, first if first is not None else time.perf_counter() - start)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _aacquire(self, level: str) -> None:
+        if not isinstance(self._bucket, _SharedBucket):  # disk I/O stays off the event loop
+            with self._cond:
+                reserved = self._try_start(PRIORITIES.index(level))
+            if reserved and not self._take_token():
+                WAIT_SECONDS.observe(0.0, upstream=self.name, priority=level)
+                return
+        # Waiting blocks, so it happens off the event loop (with this request's budget).
+        future = asyncio.get_running_loop().run_in_executor(None, copy_context().run, self._acquire, level)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(lambda f: f.exception() is None and self.release("cancelled", 0.0))
+            raise
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Async `call`."""
+        level = current_priority()
+        attempt = 0
+        while True:
+            await self._aacquire(level)
+            start, outcome = time.perf_counter(), "cancelled"
+            try:
+                result = await fn()
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                outcome = _classify(exc) or "error"
+                delay = self._retry_delay(outcome, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(outcome, time.perf_counter() - start)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def astream(self, make_iter: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Async `stream`."""
+        level = current_priority()
+        attempt = 0
+        while True:
+            await self._aacquire(level)
+            start, outcome = time.perf_counter(), "cancelled"
+            first: Optional[float] = None
+            try:
+                async for chunk in make_iter():
+                    if first is None:
+                        first = time.perf_counter() - start
+                    yield chunk
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome = _classify(exc) or "error"
+                delay = None if first is not None else self._retry_delay(outcome, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(outcome, first if first is not None else time.perf_counter() - start)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+@lru_cache()
+def get_limiter(upstream: str) -> AdaptiveLimiter:
+    """Process-wide limiter for ``chat`` or ``embedding`` calls."""
+    if upstream == "chat":
+        return AdaptiveLimiter.from_env("chat", "CHAT", 16)
+    if upstream == "embedding":
+        return AdaptiveLimiter.from_env("embedding", "EMBED", 8)
+    raise ValueError(f"unknown upstream {upstream!r}")
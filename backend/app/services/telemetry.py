@@ -0,0 +1,133 @@
+"""Stage instrumentation: latency histograms and optional OpenTelemetry spans.
+
+Every hot-path stage (parse, chunk, embed, retrieval, history, LLM, tools …)
+is wrapped in `stage`, which always records ``documentor_stage_seconds``
+with ``pipeline`` and ``stage`` labels. When ``OTEL_ENABLED=true`` it also
+opens a span. Spans nest through contextvars, so stages that run on the
+worker pool (submitted with ``copy_context``) keep their parent.
+
+Spans are exported over OTLP/gRPC to ``OTEL_EXPORTER_OTLP_ENDPOINT`` (the
+exporter's own default is ``localhost:4317``). ``OTEL_SERVICE_NAME`` names the
+service (default ``documentor-backend``). The SDK is imported only when
+tracing is enabled. Stages of a profiled request (`app.services.profiling`)
+are also added to its span tree.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.config import logger
+from app.services import profiling
+from app.services.metrics import histogram
+
+__all__ = [
+    "STAGE_SECONDS",
+    "TIME_TO_FIRST_TOKEN",
+    "StageCallbackHandler",
+    "stage",
+    "tracing_enabled",
+    "get_tracer",
+]
+
+STAGE_SECONDS = histogram(
+    "documentor_stage_seconds", "Duration of one pipeline stage (labelled by pipeline and stage)."
+)
+TIME_TO_FIRST_TOKEN = histogram(
+    "documentor_time_to_first_token_seconds", "Time from request start to the first streamed answer chunk."
+)
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("OTEL_ENABLED", "false").lower() in {"1", "true", "yes"}
+
+
+@lru_cache()
+def get_tracer() -> Optional[Any]:
+    """Return the OpenTelemetry tracer, or None when tracing is off or unavailable."""
+    if not tracing_enabled():
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as exc:  # pragma: no cover – optional dependency
+        logger.error("OTEL_ENABLED is set but OpenTelemetry is not installed (%s).", exc)
+        return None
+
+    resource = Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "documentor-backend")})
+    provider = TracerProvider(resource=resource)
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    logger.info("OpenTelemetry tracing enabled.")
+    return trace.get_tracer("documentor")
+
+
+@contextmanager
+def stage(pipeline: str, name: str, **attributes: Any) -> Iterator[None]:
+    """Time the enclosed block as *pipeline*/*name* (and trace or profile it if enabled)."""
+    tracer = get_tracer()
+    session = profiling.current_profile()
+    start = time.perf_counter()
+    try:
+        if tracer is None and session is None:
+            yield
+            return
+        with ExitStack() as scopes:
+            if session is not None:
+                scopes.enter_context(profiling.span(session, f"{pipeline}.{name}"))
+            if tracer is not None:
+                scopes.enter_context(tracer.start_as_current_span(f"{pipeline}.{name}", attributes=attributes or None))
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, pipeline=pipeline, stage=name)
+
+
+class StageCallbackHandler(BaseCallbackHandler):
+    """Times model and tool calls inside a LangChain/LangGraph run.
+
+    Used where the calls happen inside the framework (the ReAct agent), so
+    they cannot be wrapped in `stage` directly. Tool calls are recorded as
+    ``tool:<name>``.
+    """
+
+    def __init__(self, pipeline: str) -> None:
+        self.pipeline = pipeline
+        self._started: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, name: str) -> None:
+        self._started[run_id] = (name, time.perf_counter())
+
+    def _end(self, run_id: UUID) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            name, start = started
+            end = time.perf_counter()
+            STAGE_SECONDS.observe(end - start, pipeline=self.pipeline, stage=name)
+            profiling.record_span(f"{self.pipeline}.{name}", start, end)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_start(self, serialized: Any, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, f"tool:{(serialized or {}).get('name') or kwargs.get('name', 'unknown')}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
@@ -0,0 +1,299 @@
+"""Token accounting per request, session, route and tool.
+
+Each `/chat` and `/agent` request gets a `UsageTracker`, stored on its
+`RequestBudget`. The tracker is a LangChain callback handler passed in the
+run config of the RAG chain, the retriever and the agent graph. Nested runs
+(tools, the tie-break and snippet fallbacks, a RAG answer inside
+``knowledge_search``) inherit it, so every model call reports its token usage
+to the tracker. Calls are attributed to a *component*: ``tool:<name>`` when
+they happen inside a tool, otherwise the top-level run (``rag``, ``agent``).
+
+Embedding calls go through `app.services.embedding_service`. The Gemini
+embedding API does not return token counts, so they are estimated at four
+characters per token.
+
+Every call updates ``documentor_tokens_total{route,component,kind}`` and is
+persisted as one row by `app.services.usage_store`. The request totals are
+returned in the ``X-Token-Usage`` header, or in the response body when the
+request sets ``include_usage``.
+
+Configuration:
+
+* ``SESSION_TOKEN_BUDGET`` – model tokens (input + output) a session may use;
+  ``0`` (default) means unlimited. Checked when a request starts.
+* ``TOKEN_USAGE_HEADER`` – send ``X-Token-Usage`` (default ``true``).
+* ``TOKEN_PRICE_INPUT_PER_M``, ``TOKEN_PRICE_OUTPUT_PER_M``,
+  ``TOKEN_PRICE_EMBEDDING_PER_M`` – USD per million tokens, used for
+  ``cost_usd`` (default 0).
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+
+from app.services.metrics import counter
+from app.services.usage_store import get_usage_store
+from app.utils.deadline import RequestBudget, current_budget
+
+__all__ = [
+    "TOKENS",
+    "TokenBudgetExceeded",
+    "UsageTotals",
+    "UsageTracker",
+    "check_session_budget",
+    "estimate_tokens",
+    "record_embedding",
+    "session_budget",
+    "session_usage",
+    "track_usage",
+    "usage_header_enabled",
+]
+
+TOKENS = counter(
+    "documentor_tokens_total", "Tokens used, by route, component and kind (input, output, embedding)."
+)
+
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(texts: Iterable[str]) -> int:
+    return sum(math.ceil(len(text) / _CHARS_PER_TOKEN) for text in texts)
+
+
+def session_budget() -> int:
+    return int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
+
+
+def usage_header_enabled() -> bool:
+    return os.getenv("TOKEN_USAGE_HEADER", "true").lower() in {"1", "true", "yes"}
+
+
+def _price(kind: str) -> float:
+    return float(os.getenv(f"TOKEN_PRICE_{kind}_PER_M", "0")) / 1_000_000
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a session has used up its ``SESSION_TOKEN_BUDGET``."""
+
+    def __init__(self, session_id: str, used: int, limit: int) -> None:
+        super().__init__(f"session {session_id!r} used {used} of {limit} tokens")
+        self.session_id = session_id
+        self.used = used
+        self.limit = limit
+
+
+@dataclass
+class UsageTotals:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    embedding_tokens: int = 0
+    llm_calls: int = 0
+
+    @property
+    def total(self) -> int:
+        """Model tokens (what the session budget counts)."""
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        return round(
+            self.input_tokens * _price("INPUT")
+            + self.output_tokens * _price("OUTPUT")
+            + self.embedding_tokens * _price("EMBEDDING"),
+            6,
+        )
+
+    def add(self, other: "UsageTotals") -> None:
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.embedding_tokens += other.embedding_tokens
+        self.llm_calls += other.llm_calls
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total, "cost_usd": self.cost_usd}
+
+
+def _llm_usage(response: Any) -> UsageTotals:
+    """Token counts of one model call (`LLMResult`)."""
+    usage = UsageTotals(llm_calls=1)
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            meta = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if meta:
+                usage.input_tokens += int(meta.get("input_tokens", 0))
+                usage.output_tokens += int(meta.get("output_tokens", 0))
+    if not usage.total:
+        # Providers that report usage only in llm_output.
+        output = getattr(response, "llm_output", None) or {}
+        meta = output.get("usage_metadata") or output.get("token_usage") or {}
+        usage.input_tokens = int(meta.get("input_tokens", meta.get("prompt_tokens", 0)))
+        usage.output_tokens = int(meta.get("output_tokens", meta.get("completion_tokens", 0)))
+    return usage
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Collects the token usage of one request."""
+
+    def __init__(self, route: str, session_id: str, request_id: Optional[str] = None) -> None:
+        self.route = route
+        self.session_id = session_id
+        self.request_id = request_id or uuid.uuid4().hex
+        self.totals = UsageTotals()
+        self.by_component: Dict[str, UsageTotals] = {}
+        self._lock = threading.Lock()
+        # run id -> (parent run id, run name, tool name or None)
+        self._runs: Dict[UUID, tuple] = {}
+        self._models: Dict[UUID, str] = {}
+
+    # -- run tree ---------------------------------------------------------------
+
+    def _start(
+        self, run_id: UUID, parent_run_id: Optional[UUID], name: Optional[str], tool: Optional[str] = None
+    ) -> None:
+        self._runs[run_id] = (parent_run_id, name, tool)
+
+    def component(self, run_id: Optional[UUID], default: Optional[str] = None) -> str:
+        """``tool:<name>`` of the innermost enclosing tool, else the root run's name."""
+        root_name = None
+        while run_id is not None and run_id in self._runs:
+            parent, name, tool = self._runs[run_id]
+            if tool:
+                return f"tool:{tool}"
+            root_name, run_id = name, parent
+        return root_name or default or self.route
+
+    def on_chain_start(
+        self, serialized: Any, inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_retriever_start(
+        self, serialized: Any, query: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_tool_start(
+        self, serialized: Any, input_str: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, None, (serialized or {}).get("name") or kwargs.get("name", "unknown"))
+
+    def on_chat_model_start(
+        self, serialized: Any, messages: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+        model = (kwargs.get("metadata") or {}).get("ls_model_name")
+        if model:
+            self._models[run_id] = model
+
+    def on_llm_start(
+        self, serialized: Any, prompts: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.record(self.component(run_id), _llm_usage(response), model=self._models.pop(run_id, None))
+
+    # -- recording --------------------------------------------------------------
+
+    def config(self) -> Dict[str, Any]:
+        """Run config that reports to this tracker.
+
+        Empty inside a run that already reports to it (a tool of the same
+        request), so the nested run inherits the parent's callbacks and stays
+        attributed to the tool.
+        """
+        parent = var_child_runnable_config.get() or {}
+        callbacks = parent.get("callbacks")
+        handlers = getattr(callbacks, "handlers", callbacks) or []
+        return {} if self in handlers else {"callbacks": [self]}
+
+    def context_component(self, default: str) -> str:
+        """Component of the run the calling code executes in (if any)."""
+        callbacks = (var_child_runnable_config.get() or {}).get("callbacks")
+        return self.component(getattr(callbacks, "parent_run_id", None), default)
+
+    def record(self, component: str, usage: UsageTotals, model: Optional[str] = None) -> None:
+        with self._lock:
+            self.totals.add(usage)
+            self.by_component.setdefault(component, UsageTotals()).add(usage)
+        for kind in ("input", "output", "embedding"):
+            tokens = getattr(usage, f"{kind}_tokens")
+            if tokens:
+                TOKENS.inc(tokens, route=self.route, component=component, kind=kind)
+        store = get_usage_store()
+        if store is not None:
+            store.record(
+                {
+                    "ts": time.time(),
+                    "request_id": self.request_id,
+                    "session_id": self.session_id,
+                    "route": self.route,
+                    "component": component,
+                    "model": model,
+                    **asdict(usage),
+                }
+            )
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.totals.as_dict(),
+                "by_component": {name: totals.as_dict() for name, totals in self.by_component.items()},
+            }
+
+    def header(self) -> str:
+        """Value of the ``X-Token-Usage`` response header."""
+        t = self.totals
+        return (
+            f"input={t.input_tokens}, output={t.output_tokens}, embedding={t.embedding_tokens}, "
+            f"calls={t.llm_calls}, cost_usd={t.cost_usd}"
+        )
+
+
+def track_usage(budget: RequestBudget, session_id: str) -> UsageTracker:
+    """Attach a tracker to *budget* unless it already has one; return it."""
+    if budget.usage is None:
+        budget.usage = UsageTracker(budget.route, session_id)
+    return budget.usage
+
+
+def record_embedding(operation: str, texts: Iterable[str]) -> None:
+    """Account an embedding call to the current request (estimated tokens)."""
+    tokens = estimate_tokens(texts)
+    budget = current_budget()
+    tracker = budget.usage if budget is not None else None
+    if tracker is None:
+        # Ingestion and other work outside a request.
+        TOKENS.inc(tokens, route="background", component=operation, kind="embedding")
+        return
+    tracker.record(tracker.context_component("retrieval"), UsageTotals(embedding_tokens=tokens))
+
+
+def session_usage(session_id: str) -> Optional[Dict[str, UsageTotals]]:
+    """Stored usage of *session_id* per component; None when usage is not persisted."""
+    store = get_usage_store()
+    if store is None:
+        return None
+    return {name: UsageTotals(**counts) for name, counts in store.session_usage(session_id).items()}
+
+
+def check_session_budget(session_id: str) -> None:
+    """Raise `TokenBudgetExceeded` if *session_id* has no tokens left."""
+    limit = session_budget()
+    if not limit:
+        return
+    usage = session_usage(session_id)
+    if usage is None:  # TOKEN_USAGE_BACKEND=off (warned once at start-up)
+        return
+    used = sum(totals.total for totals in usage.values())
+    if used >= limit:
+        raise TokenBudgetExceeded(session_id, used, limit)
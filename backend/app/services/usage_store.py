@@ -0,0 +1,168 @@
+"""Persistence for token-usage records.
+
+Every LLM or embedding call made on behalf of a request is stored as one row
+(time, request, session, route, component, model and token counts). Rows are
+queued in a `WriteBehindBuffer` and written in batches, so accounting never
+adds a database round trip to the request path.
+
+Backends (``TOKEN_USAGE_BACKEND``):
+
+* ``sqlite`` – a local file (``TOKEN_USAGE_SQLITE_PATH``, default
+  ``.cache/usage.sqlite3``) in WAL mode, shared by the workers on the host.
+* ``mongo`` – the ``token_usage`` collection next to the chat history, for
+  multi-replica deployments.
+* ``off`` – nothing is stored (per-session budgets cannot be enforced).
+
+Without ``TOKEN_USAGE_BACKEND`` nothing is stored unless a
+``SESSION_TOKEN_BUDGET`` is set; then the default is ``mongo`` when
+``HISTORY_BACKEND=mongo`` and ``sqlite`` otherwise.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.config import logger
+from app.history_write_behind import WriteBehindBuffer
+
+__all__ = ["UsageStore", "SQLiteUsageStore", "MongoUsageStore", "get_usage_store"]
+
+# Columns of a usage row, in storage order.
+FIELDS = (
+    "ts",
+    "request_id",
+    "session_id",
+    "route",
+    "component",
+    "model",
+    "input_tokens",
+    "output_tokens",
+    "embedding_tokens",
+    "llm_calls",
+)
+_COUNTS = ("input_tokens", "output_tokens", "embedding_tokens", "llm_calls")
+
+
+class UsageStore(ABC):
+    """Buffered writer plus per-session aggregation."""
+
+    def __init__(self) -> None:
+        self._buffer = WriteBehindBuffer(self._insert, name="usage")
+
+    @abstractmethod
+    def _insert(self, rows: List[dict]) -> None:
+        """Write a batch of rows (called from the write-behind buffer)."""
+
+    @abstractmethod
+    def _aggregate(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        """Summed counts of *session_id* per component."""
+
+    def record(self, row: dict) -> None:
+        """Queue one usage row (non-blocking)."""
+        self._buffer.append(row["session_id"], [row])
+
+    def session_usage(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        """Token counts of *session_id* per component, including queued rows."""
+        if self._buffer.needs_flush(session_id):
+            self._buffer.flush_session(session_id)
+        return self._aggregate(session_id)
+
+    def close(self) -> None:
+        self._buffer.close()
+
+
+class SQLiteUsageStore(UsageStore):
+    _TABLE = (
+        "CREATE TABLE IF NOT EXISTS token_usage ("
+        " ts REAL NOT NULL, request_id TEXT NOT NULL, session_id TEXT NOT NULL,"
+        " route TEXT NOT NULL, component TEXT NOT NULL, model TEXT,"
+        " input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL,"
+        " embedding_tokens INTEGER NOT NULL, llm_calls INTEGER NOT NULL)"
+    )
+    _INSERT = f"INSERT INTO token_usage ({', '.join(FIELDS)}) VALUES ({', '.join(':' + f for f in FIELDS)})"
+    _AGGREGATE = (
+        "SELECT component, SUM(input_tokens), SUM(output_tokens), SUM(embedding_tokens), SUM(llm_calls)"
+        " FROM token_usage WHERE session_id = ? GROUP BY component"
+    )
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path or os.getenv("TOKEN_USAGE_SQLITE_PATH", os.path.join(".cache", "usage.sqlite3"))
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(self._TABLE)
+        conn.execute("CREATE INDEX IF NOT EXISTS token_usage_session ON token_usage (session_id)")
+        conn.commit()
+        super().__init__()
+        logger.info("Token usage is recorded in %s.", self._path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, rows: List[dict]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(self._INSERT, rows)
+
+    def _aggregate(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        rows = self._conn().execute(self._AGGREGATE, (session_id,)).fetchall()
+        return {row[0]: dict(zip(_COUNTS, map(int, row[1:]))) for row in rows}
+
+
+class MongoUsageStore(UsageStore):
+    def __init__(self, collection: str = "token_usage") -> None:
+        from app.history_store_mongo import DB_NAME
+        from app.mongo import get_sync_mongo_client
+
+        self._coll = get_sync_mongo_client()[DB_NAME][collection]
+        super().__init__()
+
+    def _insert(self, rows: List[dict]) -> None:
+        from pymongo.errors import BulkWriteError
+
+        # insert_many adds _id to the dicts and retried rows keep theirs. When
+        # a batch is retried after a lost reply, the rows that made it are
+        # rejected as duplicates and the rest are still inserted (unordered),
+        # so nothing is counted twice or left out.
+        try:
+            self._coll.insert_many(rows, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if not errors or not all(err.get("code") == 11000 for err in errors):
+                raise RuntimeError(f"insert_many failed: {errors[:1] or exc}") from exc
+
+    def _aggregate(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        pipeline = [
+            {"$match": {"session_id": session_id}},
+            {"$group": {"_id": "$component", **{f: {"$sum": f"${f}"} for f in _COUNTS}}},
+        ]
+        return {
+            doc["_id"]: {f: int(doc.get(f, 0)) for f in _COUNTS} for doc in self._coll.aggregate(pipeline)
+        }
+
+
+@lru_cache()
+def get_usage_store() -> Optional[UsageStore]:
+    """Return the configured usage store (None when usage is not stored)."""
+    backend = os.getenv("TOKEN_USAGE_BACKEND", "").lower()
+    if not backend:
+        if not int(os.getenv("SESSION_TOKEN_BUDGET", "0")):
+            return None
+        backend = "mongo" if os.getenv("HISTORY_BACKEND", "memory").lower() == "mongo" else "sqlite"
+    if backend == "off":
+        if int(os.getenv("SESSION_TOKEN_BUDGET", "0")):
+            logger.warning("SESSION_TOKEN_BUDGET is ignored: TOKEN_USAGE_BACKEND=off stores no usage.")
+        return None
+    if backend == "mongo":
+        return MongoUsageStore()
+    return SQLiteUsageStore()
@@ -0,0 +1,252 @@
+"""Start-up warm-up of the lazily created clients, and readiness state.
+
+Clients are built on first use to keep imports fast (see
+``benchmarks/startup.py``). Left alone, that makes the first user request
+after a deploy pay for the Gemini, Chroma and Mongo connections. `start`
+runs in a background thread when the app starts. It builds every client
+and chain, makes one cheap call through each to open connections, and
+records how long each took. ``/ready`` reports the result, so a rollout
+sends traffic only to warm pods. ``/health`` stays a plain liveness check.
+
+Dependencies marked critical must warm up for the pod to be ready. The
+endpoint index, tool cache and usage store degrade gracefully, so their
+failures only mark the pod ``degraded``. Failed steps, critical or not, are
+retried when ``/ready`` is polled, at most every ``WARMUP_RETRY_S`` seconds
+(30).
+
+Configuration: ``WARMUP_ENABLED`` (default ``true``), ``WARMUP_TIMEOUT_S``
+(per step, 30), ``WARMUP_LLM_CALL`` (also send a one-token prompt to Gemini,
+default ``false`` because it is billed).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import logger
+from app.services.metrics import gauge
+
+__all__ = ["Dependency", "readiness", "start", "warmup_enabled"]
+
+DEPENDENCY_READY = gauge(
+    "documentor_dependency_ready", "1 when the dependency warmed up successfully, else 0."
+)
+WARMUP_SECONDS = gauge("documentor_warmup_seconds", "Time the last warm-up of a dependency took.")
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+# ---------------------------------------------------------------------------
+# Steps
+# ---------------------------------------------------------------------------
+#
+# Singletons are looked up through their modules at call time, so whatever
+# is installed there (e.g. the benchmark stand-ins) is what gets warmed.
+
+
+def _embedder() -> None:
+    from app.services import embedding_service
+
+    embedding_service.get_embedder().embed_query("warm-up")
+
+
+def _vector_store() -> None:
+    from app.vector import chroma_client
+
+    chroma_client.get_vectorstore().similarity_search("warm-up", k=1)
+
+
+def _endpoint_index() -> None:
+    from app.services.endpoint_index import get_endpoint_index
+
+    get_endpoint_index().snapshot()
+
+
+def _history_store() -> None:
+    from app.history_store import get_history_store
+
+    # A read-only page of a session that does not exist: opens the pool
+    # (Mongo) or the file (SQLite) without writing anything.
+    get_history_store().get_page("__warmup__", limit=1)
+
+
+def _llm() -> None:
+    from app.services import llm, query_engine
+
+    query_engine._get_qa_chain()
+    model = llm.get_chat_model(temperature=0)
+    if os.getenv("WARMUP_LLM_CALL", "false").lower() in {"1", "true", "yes"}:
+        model.invoke("Reply with OK.", generation_config={"max_output_tokens": 1})
+
+
+def _agent() -> None:
+    from app.services import agent_engine
+
+    agent_engine._build_agent_executor()
+
+
+def _tool_cache() -> None:
+    from app.tools.cache import get_tool_cache
+
+    get_tool_cache()
+
+
+def _usage_store() -> None:
+    from app.services.usage_store import get_usage_store
+
+    get_usage_store()
+
+
+@dataclass
+class Dependency:
+    name: str
+    critical: bool
+    warm: Callable[[], None]
+    status: str = "pending"  # pending | warming | ok | error | timeout
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    running: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "critical": self.critical,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attempts": self.attempts,
+        }
+
+
+def _dependencies() -> List[Dependency]:
+    return [
+        Dependency("embedder", True, _embedder),
+        Dependency("vector_store", True, _vector_store),
+        Dependency("history_store", True, _history_store),
+        Dependency("llm", True, _llm),
+        Dependency("agent", True, _agent),
+        Dependency("endpoint_index", False, _endpoint_index),
+        Dependency("tool_cache", False, _tool_cache),
+        Dependency("usage_store", False, _usage_store),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+class _WarmUp:
+    def __init__(self) -> None:
+        self.dependencies = {d.name: d for d in _dependencies()}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def _warm(self, dep: Dependency) -> None:
+        dep.running, dep.attempts = True, dep.attempts + 1
+        if dep.status != "timeout":  # a retry keeps showing why it is retried
+            dep.status = "warming"
+        start = time.perf_counter()
+        try:
+            dep.warm()
+        except Exception as exc:
+            dep.status, dep.error = "error", f"{type(exc).__name__}: {exc}"
+            logger.warning("Warm-up of %s failed: %s", dep.name, dep.error)
+        else:
+            dep.status, dep.error = "ok", None
+        finally:
+            dep.running = False
+            elapsed = time.perf_counter() - start
+            dep.duration_ms = round(elapsed * 1000, 1)
+            WARMUP_SECONDS.set(elapsed, dependency=dep.name)
+            DEPENDENCY_READY.set(1 if dep.status == "ok" else 0, dependency=dep.name)
+
+    def run(self, names: Optional[List[str]] = None) -> None:
+        """Warm *names* (default: all); the embedder first, the rest in parallel."""
+        todo = [self.dependencies[n] for n in names] if names else list(self.dependencies.values())
+        timeout = float(os.getenv("WARMUP_TIMEOUT_S", "30"))
+        self.started = self.started or time.time()
+        pool = ThreadPoolExecutor(max_workers=len(todo), thread_name_prefix="warmup")
+        try:
+            # Everything else goes through the embedder; build it once, first.
+            futures = {pool.submit(self._warm, d): d for d in todo if d.name == "embedder"}
+            wait(futures, timeout=timeout)
+            futures.update({pool.submit(self._warm, d): d for d in todo if d.name != "embedder"})
+            _, pending = wait(futures, timeout=timeout)
+            for future in pending:
+                # Still running (e.g. an unreachable host); it keeps going and
+                # its result replaces this status if it finishes.
+                dep = futures[future]
+                dep.status, dep.error = "timeout", f"not warm after {timeout:g}s"
+        finally:
+            pool.shutdown(wait=False)
+            self.finished = time.time()
+            with self._lock:
+                self._running = False
+            summary = " ".join(f"{d.name}={d.status}/{d.duration_ms}ms" for d in self.dependencies.values())
+            logger.info("Warm-up finished: %s", summary)
+
+    def start(self, names: Optional[List[str]] = None) -> bool:
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self.run, args=(names,), name="warmup", daemon=True).start()
+        return True
+
+    def retry_failed(self) -> None:
+        if self.finished is None or time.time() - self.finished < float(os.getenv("WARMUP_RETRY_S", "30")):
+            return
+        # A step that timed out may still be running; it is not started twice.
+        failed = [
+            d.name for d in self.dependencies.values() if d.status in {"error", "timeout"} and not d.running
+        ]
+        if failed and self.start(failed):
+            logger.info("Retrying warm-up of %s", ", ".join(failed))
+
+    def status(self) -> str:
+        deps = list(self.dependencies.values())
+        if not warmup_enabled():
+            return "ready"
+        if any(d.critical and d.status != "ok" for d in deps):
+            if any(d.status in {"pending", "warming"} for d in deps if d.critical):
+                return "warming"
+            return "failed"
+        return "ready" if all(d.status == "ok" for d in deps) else "degraded"
+
+
+_STATE = _WarmUp()
+
+
+def start() -> None:
+    """Begin warming every dependency in the background (app start-up)."""
+    if not warmup_enabled():
+        logger.info("Warm-up disabled (WARMUP_ENABLED=false).")
+        return
+    _STATE.start()
+
+
+def readiness() -> Dict[str, Any]:
+    """Readiness report for ``/ready``; ``ready`` is False while a critical dependency is not warm."""
+    # A failed optional dependency leaves the pod "degraded" but still
+    # deserves another attempt, so retry on any failed step, not only when
+    # the pod as a whole is "failed".
+    _STATE.retry_failed()
+    status = _STATE.status()
+    return {
+        "ready": status in {"ready", "degraded"},
+        "status": status,
+        "warmup_enabled": warmup_enabled(),
+        "warmup_ms": round((_STATE.finished - _STATE.started) * 1000, 1)
+        if _STATE.started and _STATE.finished
+        else None,
+        "dependencies": {name: dep.as_dict() for name, dep in _STATE.dependencies.items()},
+    }
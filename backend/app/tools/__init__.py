@@ -1,10 +1,33 @@
-# Initialize tools package 
+# Initialize tools package
+#
+# Tool implementations pull in LangChain, Gemini and vector-store clients, so
+# they are imported lazily: `from app.tools import code_snippet` (or TOOLS)
+# only loads the modules on first access instead of at API start-up.
 
-from .code_snippet_tool import code_snippet  # noqa: F401
-from .endpoint_suggester_tool import endpoint_suggester  # noqa: F401
-from .postman_generator_tool import postman_generator  # noqa: F401
-from .retrieval_tool import knowledge_search  # noqa: F401
+from importlib import import_module
+from typing import Any, List
 
-# Convenient aggregator
+_TOOL_MODULES = {
+    "code_snippet": ".code_snippet_tool",
+    "endpoint_suggester": ".endpoint_suggester_tool",
+    "postman_generator": ".postman_generator_tool",
+    "knowledge_search": ".retrieval_tool",
+}
 
-TOOLS = [code_snippet, endpoint_suggester, postman_generator, knowledge_search] 
\ No newline at end of file
+__all__ = [*_TOOL_MODULES, "TOOLS", "get_tools"]
+
+
+def get_tools() -> List[Any]:
+    """Return every agent tool, importing the implementations on demand."""
+    return [__getattr__(name) for name in _TOOL_MODULES]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _TOOL_MODULES:
+        tool = getattr(import_module(_TOOL_MODULES[name], __name__), name)
+        globals()[name] = tool  # cache so later lookups bypass __getattr__
+        return tool
+    if name == "TOOLS":
+        # Convenient aggregator
+        return get_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
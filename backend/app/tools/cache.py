@@ -0,0 +1,409 @@
+"""Shared, persistent result cache for the developer-agent tools.
+
+Every tool result is stored under a normalised key derived from the tool name
+and its arguments, so cosmetically different calls (extra whitespace, upper-
+vs lower-case HTTP verbs, …) hit the same entry. The default backend is a
+local SQLite file which survives restarts and is shared by all workers on the
+host; an in-memory backend is available for development.
+
+Configuration (environment variables):
+
+* ``TOOL_CACHE_BACKEND`` – ``sqlite`` (default), ``memory`` or ``off``.
+* ``TOOL_CACHE_PATH`` – SQLite file location (default ``.cache/tool_cache.sqlite3``).
+* ``TOOL_CACHE_TTL_<TOOL>`` – per-tool TTL override in seconds,
+  e.g. ``TOOL_CACHE_TTL_KNOWLEDGE_SEARCH=600``.
+
+Tools whose answers depend on the vector store are flagged
+``depends_on_corpus`` and are purged whenever new documents are ingested.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Protocol, Tuple
+
+from app.config import logger
+from app.utils.deadline import current_budget
+
+__all__ = [
+    "ToolCachePolicy",
+    "ToolResultCache",
+    "InMemoryToolCacheBackend",
+    "SQLiteToolCacheBackend",
+    "Uncached",
+    "cached_tool",
+    "get_tool_cache",
+]
+
+
+# ---------------------------------------------------------------------------
+# Policies
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class ToolCachePolicy:
+    """Caching rules for a single tool."""
+
+    ttl_seconds: float
+    depends_on_corpus: bool = False
+    # Arguments compared case-insensitively (e.g. HTTP verbs, languages).
+    casefold_args: FrozenSet[str] = frozenset()
+    # Arguments that do not influence the result and are left out of the key.
+    ignore_args: FrozenSet[str] = frozenset()
+
+
+_DAY = 24 * 60 * 60
+
+_POLICIES: Dict[str, ToolCachePolicy] = {
+    "code_snippet": ToolCachePolicy(
+        ttl_seconds=7 * _DAY,
+        casefold_args=frozenset({"method", "language", "client_lib"}),
+    ),
+    "endpoint_suggester": ToolCachePolicy(
+        ttl_seconds=_DAY,
+        depends_on_corpus=True,
+        casefold_args=frozenset({"question"}),
+    ),
+    "knowledge_search": ToolCachePolicy(
+        ttl_seconds=60 * 60,
+        depends_on_corpus=True,
+        casefold_args=frozenset({"question"}),
+    ),
+}
+
+_DEFAULT_POLICY = ToolCachePolicy(ttl_seconds=60 * 60)
+
+
+def get_policy(tool_name: str) -> ToolCachePolicy:
+    """Return the policy for *tool_name*, applying any TTL override from env."""
+    policy = _POLICIES.get(tool_name, _DEFAULT_POLICY)
+    override = os.getenv(f"TOOL_CACHE_TTL_{tool_name.upper()}")
+    if override:
+        try:
+            return ToolCachePolicy(
+                ttl_seconds=float(override),
+                depends_on_corpus=policy.depends_on_corpus,
+                casefold_args=policy.casefold_args,
+                ignore_args=policy.ignore_args,
+            )
+        except ValueError:
+            logger.warning("Ignoring invalid TOOL_CACHE_TTL_%s=%r", tool_name.upper(), override)
+    return policy
+
+
+# ---------------------------------------------------------------------------
+# Key normalisation
+# ---------------------------------------------------------------------------
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalise_value(value: Any, casefold: bool) -> Any:
+    if isinstance(value, str):
+        value = _WS_RE.sub(" ", value).strip()
+        return value.casefold() if casefold else value
+    if isinstance(value, (list, tuple)):
+        return [_normalise_value(v, casefold) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalise_value(v, casefold) for k, v in sorted(value.items())}
+    return value
+
+
+def make_cache_key(tool_name: str, args: Dict[str, Any], policy: ToolCachePolicy) -> str:
+    """Return a stable hash for *tool_name* called with *args*."""
+    normalised = {
+        name: _normalise_value(value, name in policy.casefold_args)
+        for name, value in sorted(args.items())
+        if name not in policy.ignore_args and value is not None
+    }
+    payload = json.dumps([tool_name, normalised], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+
+class ToolCacheBackend(Protocol):
+    """Storage contract for cached tool results."""
+
+    def get(self, key: str) -> Optional[str]:  # pragma: no cover
+        ...
+
+    def set(self, key: str, tool_name: str, value: str, ttl_seconds: float) -> None:  # pragma: no cover
+        ...
+
+    def delete_tools(self, tool_names: Iterable[str]) -> int:  # pragma: no cover
+        ...
+
+    def clear(self) -> None:  # pragma: no cover
+        ...
+
+
+class InMemoryToolCacheBackend:
+    """Process-local LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 2048) -> None:
+        self._max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            _, value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, tool_name: str, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._data[key] = (tool_name, value, time.time() + ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete_tools(self, tool_names: Iterable[str]) -> int:
+        names = set(tool_names)
+        with self._lock:
+            stale = [k for k, (tool, _, _) in self._data.items() if tool in names]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteToolCacheBackend:
+    """Durable cache stored in a local SQLite file (WAL mode).
+
+    One connection is kept per thread; WAL lets readers in other workers
+    proceed while a writer commits.
+    """
+
+    _PURGE_EVERY = 500  # writes between opportunistic purges of expired rows
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            " key TEXT PRIMARY KEY,"
+            " tool TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tool_cache_tool ON tool_cache (tool)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, tool_name: str, value: str, ttl_seconds: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires_at) VALUES (?, ?, ?, ?)",
+            (key, tool_name, value, time.time() + ttl_seconds),
+        )
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            conn.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+        conn.commit()
+
+    def delete_tools(self, tool_names: Iterable[str]) -> int:
+        names = list(tool_names)
+        if not names:
+            return 0
+        conn = self._conn()
+        placeholders = ",".join("?" for _ in names)
+        cur = conn.execute(f"DELETE FROM tool_cache WHERE tool IN ({placeholders})", names)
+        conn.commit()
+        return cur.rowcount
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM tool_cache")
+        conn.commit()
+
+
+# ---------------------------------------------------------------------------
+# Cache facade
+# ---------------------------------------------------------------------------
+
+
+class Uncached(str):
+    """A computed tool result that is returned but never stored.
+
+    Return it from ``compute`` for answers that must not be served again
+    (failures, "nothing found" messages).
+    """
+
+
+def _check_deadline(tool_name: str) -> None:
+    budget = current_budget()
+    if budget is not None:
+        budget.check(f"tool:{tool_name}")
+
+
+class ToolResultCache:
+    """Tool-aware cache front-end: policies, key building and hit/miss stats."""
+
+    def __init__(self, backend: Optional[ToolCacheBackend]) -> None:
+        self._backend = backend
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    def _count(self, tool_name: str, field: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "errors": 0})
+            counters[field] += 1
+
+    def get_or_compute(self, tool_name: str, args: Dict[str, Any], compute: Callable[[], str]) -> str:
+        """Return the cached result for (*tool_name*, *args*) or compute and store it.
+
+        Cache hits are always served; a miss is not computed once the calling
+        request's deadline has passed (`DeadlineExceeded` is raised instead).
+        Results wrapped in `Uncached` are returned (as plain strings) but not stored.
+        """
+        if self._backend is None:
+            _check_deadline(tool_name)
+            return str(compute())
+
+        policy = get_policy(tool_name)
+        key = make_cache_key(tool_name, args, policy)
+        try:
+            cached = self._backend.get(key)
+        except Exception as exc:  # cache trouble must never fail the tool
+            logger.warning("Tool cache read failed for %s: %s", tool_name, exc)
+            self._count(tool_name, "errors")
+            cached = None
+
+        if cached is not None:
+            self._count(tool_name, "hits")
+            logger.debug("Tool cache hit: %s", tool_name)
+            return cached
+
+        self._count(tool_name, "misses")
+        logger.debug("Tool cache miss: %s", tool_name)
+        _check_deadline(tool_name)
+        result = compute()
+        if isinstance(result, Uncached):
+            return str(result)
+        try:
+            self._backend.set(key, tool_name, result, policy.ttl_seconds)
+        except Exception as exc:
+            logger.warning("Tool cache write failed for %s: %s", tool_name, exc)
+            self._count(tool_name, "errors")
+        return result
+
+    def put(self, tool_name: str, args: Dict[str, Any], value: str) -> None:
+        """Store (or replace) the result for (*tool_name*, *args*)."""
+        if self._backend is None:
+            return
+        policy = get_policy(tool_name)
+        try:
+            self._backend.set(make_cache_key(tool_name, args, policy), tool_name, value, policy.ttl_seconds)
+        except Exception as exc:
+            logger.warning("Tool cache write failed for %s: %s", tool_name, exc)
+            self._count(tool_name, "errors")
+
+    def invalidate_corpus_dependent(self) -> int:
+        """Drop cached results of every tool that reads the vector store."""
+        if self._backend is None:
+            return 0
+        names = [name for name, policy in _POLICIES.items() if policy.depends_on_corpus]
+        removed = self._backend.delete_tools(names)
+        logger.info("Tool cache invalidated for %s (%d entries).", ", ".join(names), removed)
+        return removed
+
+    def clear(self) -> None:
+        if self._backend is not None:
+            self._backend.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-tool ``hits``/``misses``/``errors`` and the hit ratio."""
+        with self._lock:
+            snapshot = {tool: dict(counters) for tool, counters in self._stats.items()}
+        for counters in snapshot.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_ratio"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+        return snapshot
+
+
+@functools.lru_cache()
+def get_tool_cache() -> ToolResultCache:
+    """Return the process-wide tool cache configured from the environment."""
+    backend_choice = os.getenv("TOOL_CACHE_BACKEND", "sqlite").lower()
+    if backend_choice in {"off", "none", "disabled"}:
+        return ToolResultCache(None)
+    if backend_choice == "memory":
+        return ToolResultCache(InMemoryToolCacheBackend())
+
+    path = os.getenv("TOOL_CACHE_PATH", os.path.join(".cache", "tool_cache.sqlite3"))
+    try:
+        return ToolResultCache(SQLiteToolCacheBackend(path))
+    except Exception as exc:
+        logger.warning("SQLite tool cache unavailable (%s); using in-memory cache.", exc)
+        return ToolResultCache(InMemoryToolCacheBackend())
+
+
+def cached_tool(tool_name: str) -> Callable[[Callable[..., str]], Callable[..., str]]:
+    """Decorator routing a tool function through the shared result cache.
+
+    Apply it *below* ``@tool`` so LangChain still sees the original signature
+    and docstring.
+    """
+
+    def decorator(func: Callable[..., str]) -> Callable[..., str]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return get_tool_cache().get_or_compute(
+                tool_name, dict(bound.arguments), lambda: func(*args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,15 +1,19 @@
 # Built-ins
-from functools import lru_cache
-from typing import Literal, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Literal, Optional
 
 # Third-party
 from langchain_core.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 # Local
-from app.config import get_settings
+from app.config import logger
+from app.services.llm import get_chat_model
+from app.services.metrics import counter
+from app.tools.cache import get_tool_cache
+from app.tools.snippet_templates import render_snippet
 
 # ---------------------------------------------------------------------------
 # Prompt template (chat-style for clarity & determinism)
@@ -35,13 +39,24 @@ _CODE_SNIPPET_TEMPLATE = ChatPromptTemplate.from_messages(
 # Helpers
 # ---------------------------------------------------------------------------
 
-# Small in-memory cache for generated snippets (reduces repeated LLM calls in prod)
-# Cache key is determined by the "public" function arguments so we simply rely on
-# the default hashing of the parameter tuple. The result size is tiny so we keep
-# a modest upper bound.
+# Snippets are cached through the shared tool cache (`app.tools.cache`) so
+# repeated calls are answered without regeneration, across restarts and
+# workers. The key is built from the normalised public tool arguments.
+_TOOL_NAME = "code_snippet"
 
-# NOTE: `lru_cache` is preferable to a manual dict so we get built-in tooling like
-# `.cache_info()` & easy clearing in tests.
+# Common client libraries are rendered from templates; the model is only used
+# for combinations the templates do not cover.
+SNIPPETS_GENERATED = counter(
+    "documentor_code_snippets_total",
+    "Code snippets generated on a cache miss, by source (template or llm).",
+)
+
+# `black` takes tens of milliseconds per snippet (plus ~0.3 s to import), so
+# LLM output is returned as-is and formatted here; the formatted version then
+# replaces the cache entry for subsequent calls.
+_FORMAT_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snippet-format")
+
+_FENCE_RE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n?```\s*$", re.DOTALL)
 
 
 def _format_snippet(snippet: str, language: str) -> str:
@@ -58,8 +73,9 @@ def _format_snippet(snippet: str, language: str) -> str:
             import black  # type: ignore
 
             # Black expects a valid top-level module string without backticks.
-            # Users may request fenced code blocks – we strip them just in case.
-            cleaned = snippet.strip().lstrip("```python").rstrip("``` ")
+            # Models usually wrap the code in a fenced block – unwrap it.
+            fenced = _FENCE_RE.match(snippet)
+            cleaned = fenced.group(1) if fenced else snippet.strip()
             formatted = black.format_str(cleaned, mode=black.FileMode())
             return formatted.rstrip()  # Trim the trailing newline Black adds
         except Exception:
@@ -69,6 +85,18 @@ def _format_snippet(snippet: str, language: str) -> str:
     return snippet
 
 
+def _format_in_background(args: Dict[str, Any], raw: str, language: str) -> None:
+    def _run() -> None:
+        formatted = _format_snippet(raw, language)
+        if formatted != raw:
+            get_tool_cache().put(_TOOL_NAME, args, formatted)
+
+    try:
+        _FORMAT_POOL.submit(_run)
+    except RuntimeError:  # interpreter shutting down
+        logger.debug("Snippet formatting skipped: executor unavailable")
+
+
 def _raw_snippet_from_llm(
     *,
     endpoint: str,
@@ -79,11 +107,7 @@ def _raw_snippet_from_llm(
 ) -> str:
     """Single LLM invocation that returns an *unformatted* snippet string."""
 
-    settings = get_settings()
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash", google_api_key=settings.gemini_api_key, temperature=0,
-        convert_system_message_to_human=True,
-    )
+    llm = get_chat_model(temperature=0, system_as_human=True)
 
     chain = _CODE_SNIPPET_TEMPLATE | llm | StrOutputParser()
 
@@ -97,29 +121,6 @@ def _raw_snippet_from_llm(
         }
     )
 
-
-@lru_cache(maxsize=128)
-def _generate_snippet(
-    endpoint: str,
-    method: str,
-    language: str,
-    params: Optional[str],
-    client_lib: str,
-) -> str:
-    """Generate (or retrieve from cache) a formatted snippet for given inputs."""
-
-    # Step 1 – raw generation (may be slow & costly)
-    raw = _raw_snippet_from_llm(
-        endpoint=endpoint,
-        method=method,
-        language=language,
-        params=params,
-        client_lib=client_lib,
-    )
-
-    # Step 2 – post-process / format
-    return _format_snippet(raw, language)
-
 # ---------------------------------------------------------------------------
 # Tool definition
 # ---------------------------------------------------------------------------
@@ -139,18 +140,40 @@ def code_snippet(
         endpoint: The REST path, e.g. /users/{id}
         method: HTTP verb.
         language: Target language (python or javascript).
-        params: Optional parameters description (query/body) as a string.
-        client_lib: Preferred client library (default 'requests').
+        params: Optional parameters, ideally as JSON (flat, or split into
+            path/query/body/headers) or ``key=value`` pairs.
+        client_lib: Preferred client library (default 'requests'; python:
+            requests/httpx, javascript: fetch/axios are built in).
 
     Returns:
         A code snippet string.
     """
 
-    # Use cached generator to ensure repeated identical calls don't hit the LLM.
-    return _generate_snippet(
-        endpoint=endpoint,
-        method=method,
-        language=language,
-        params=params,
-        client_lib=client_lib,
-    )
+    args = {
+        "endpoint": endpoint,
+        "method": method,
+        "language": language,
+        "params": params,
+        "client_lib": client_lib,
+    }
+    needs_formatting = False
+
+    def _generate() -> str:
+        nonlocal needs_formatting
+        # Step 1 – deterministic templates (instant, already formatted)
+        snippet = render_snippet(endpoint, method, language, params, client_lib)
+        if snippet is not None:
+            SNIPPETS_GENERATED.inc(source="template")
+            return snippet
+
+        # Step 2 – unusual request: ask the model (slow & costly)
+        SNIPPETS_GENERATED.inc(source="llm")
+        needs_formatting = True
+        return _raw_snippet_from_llm(**args)
+
+    snippet = get_tool_cache().get_or_compute(_TOOL_NAME, args, _generate)
+    if needs_formatting:
+        # Scheduled after the raw result is stored, so the formatted version
+        # always wins.
+        _format_in_background(args, snippet, language)
+    return snippet
@@ -1,15 +1,34 @@
-from typing import List
+import os
+import re
+from typing import List, Sequence
 
 from langchain_core.tools import tool
-from app.vector.chroma_client import get_vectorstore
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
-from app.config import get_settings
 
+from app.config import logger
+from app.services.endpoint_index import (
+    EndpointMatch,
+    extract_endpoints,
+    get_endpoint_index,
+    is_ambiguous,
+    rank_lexically,
+)
+from app.services.llm import get_chat_model
+from app.services.metrics import counter
+from app.tools.cache import cached_tool
+from app.vector.chroma_client import search_similar_documents
+
+# Candidates are ranked locally by `app.services.endpoint_index`; the model is
+# only asked to break near-ties.
 _SYSTEM_PROMPT = (
-    "You are an API expert. Given a developer question and list of endpoints, "
-    "return the single most relevant endpoint path. If none match, return 'NONE'."
+    "You are an API expert. Given a developer question and a numbered list of candidate "
+    "endpoints, reply with the number of the single most relevant endpoint, or 0 if none match."
+)
+
+SUGGESTIONS = counter(
+    "documentor_endpoint_suggestions_total",
+    "Endpoint suggestions by how they were decided (index, chunks, tie_break, none).",
 )
 
 # ---------------------------------------------------------------------------
@@ -26,20 +45,69 @@ _ENDPOINT_SUGGESTER_TEMPLATE = ChatPromptTemplate.from_messages(
     ]
 )
 
+_TIE_BREAK_CANDIDATES = 3
+
+
+def _min_score() -> float:
+    return float(os.getenv("ENDPOINT_MIN_SCORE", "0.35"))
+
+
+def _candidates_from_chunks(question: str, top_k: int) -> List[EndpointMatch]:
+    """Fallback for corpora ingested before the endpoint index existed."""
+    records = []
+    for doc in search_similar_documents(question, k=top_k):
+        records.extend(extract_endpoints(doc.page_content, doc.metadata.get("url") or doc.metadata.get("source", "")))
+    return rank_lexically(question, records, k=top_k)
+
+
+def _tie_break(question: str, matches: Sequence[EndpointMatch]) -> EndpointMatch:
+    listing = "\n".join(
+        f"{i}. {m.record.key} – {m.record.description or 'no description'}" for i, m in enumerate(matches, start=1)
+    )
+    llm = get_chat_model(temperature=0, system_as_human=True)
+    chain = _ENDPOINT_SUGGESTER_TEMPLATE | llm | StrOutputParser()
+    try:
+        reply = chain.invoke({"question": question, "endpoints": listing})
+        choice = re.search(r"\d+", reply)
+        if choice and 1 <= int(choice.group()) <= len(matches):
+            return matches[int(choice.group()) - 1]
+    except Exception as exc:  # the local ranking is a fine answer too
+        logger.warning("Endpoint tie-break failed: %s", exc)
+    return matches[0]
+
+
+def _format(best: EndpointMatch, matches: Sequence[EndpointMatch]) -> str:
+    lines = [best.record.key, f"confidence: {best.score:.2f}"]
+    if best.record.description:
+        lines.append(f"description: {best.record.description}")
+    others = [m for m in matches if m is not best]
+    if others:
+        lines.append("alternatives: " + ", ".join(f"{m.record.key} ({m.score:.2f})" for m in others))
+    return "\n".join(lines)
+
 
 @tool(description="Suggest the best API endpoint for the given developer question.")
+@cached_tool("endpoint_suggester")
 def endpoint_suggester(question: str, top_k: int = 5) -> str:
-    """Suggest the best API endpoint for the given developer question."""
-    # Retrieve candidate endpoint descriptions from vectorstore
-    retriever = get_vectorstore().as_retriever(search_kwargs={"k": top_k})
-    docs = retriever.invoke(question)
-    endpoints: List[str] = [d.metadata.get("source", d.page_content) for d in docs]
-
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash", google_api_key=get_settings().gemini_api_key, temperature=0,
-        convert_system_message_to_human=True,
-    )
+    """Suggest the best API endpoint for the given developer question.
 
-    chain = _ENDPOINT_SUGGESTER_TEMPLATE | llm | StrOutputParser()
+    Returns ``METHOD /path`` on the first line followed by a confidence score,
+    the endpoint description and close alternatives – or ``NONE``.
+    """
+    top_k = max(top_k, 2)
+    matches = get_endpoint_index().rank(question, k=top_k)
+    outcome = "index"
+    if not matches:
+        matches = _candidates_from_chunks(question, top_k)
+        outcome = "chunks"
+
+    if not matches or matches[0].score < _min_score():
+        SUGGESTIONS.inc(outcome="none")
+        return "NONE"
 
-    return chain.invoke({"question": question, "endpoints": "\n".join(endpoints)}).strip() 
\ No newline at end of file
+    best = matches[0]
+    if is_ambiguous(matches):
+        best = _tie_break(question, matches[:_TIE_BREAK_CANDIDATES])
+        outcome = "tie_break"
+    SUGGESTIONS.inc(outcome=outcome)
+    return _format(best, matches[:3])
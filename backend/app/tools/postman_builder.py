@@ -0,0 +1,241 @@
+"""Deterministic Postman v2.1 collection builder.
+
+Collections are assembled in code from endpoint descriptors instead of being
+written by the model, so the output is always valid JSON and building
+hundreds of requests takes milliseconds.
+
+A descriptor is either an `EndpointDescriptor` / dict with the same fields
+or a string::
+
+    "GET /users/{id}"
+    "POST /users {\"name\": \"Ann\"} - Create a user"
+    "https://api.shop.io/v2/orders/:orderId"   # method defaults to GET
+
+Parameters use the formats understood by `app.tools.snippet_templates`
+(flat JSON, or split into path/query/body/headers). Requests are grouped into
+folders by tag – explicit, or the first meaningful path segment – and every
+URL is expressed relative to the ``{{baseUrl}}`` collection variable.
+
+`iter_collection_json` yields the serialised collection piece by piece so
+large collections can be streamed to the client.
+"""
+from __future__ import annotations
+
+import json
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import orjson
+
+from app.config import logger
+from app.tools.snippet_templates import DEFAULT_BASE_URL, RequestSpec, build_request_spec
+
+__all__ = [
+    "EndpointDescriptor",
+    "parse_descriptor",
+    "build_collection",
+    "iter_collection_json",
+    "collection_json",
+]
+
+SCHEMA_URL = "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
+
+_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+_BODY_METHODS = {"POST", "PUT", "PATCH"}
+_DESCRIPTOR_RE = re.compile(r"^\s*(?:([A-Za-z]+)\s+)?(\S+)\s*(.*?)\s*$", re.DOTALL)
+# Path segments that make poor folder names ("/api/v2/users" → "users").
+_SKIP_SEGMENT_RE = re.compile(r"^(api|rest|v\d+(\.\d+)*)$", re.IGNORECASE)
+
+Descriptor = Union["EndpointDescriptor", Dict[str, Any], str]
+
+
+@dataclass
+class EndpointDescriptor:
+    """One request to include in a collection."""
+
+    method: str
+    path: str
+    name: Optional[str] = None
+    tag: Optional[str] = None
+    description: Optional[str] = None
+    params: Optional[str] = None  # see app.tools.snippet_templates
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_descriptor(raw: Descriptor) -> Optional[EndpointDescriptor]:
+    """Normalise *raw* into an `EndpointDescriptor` (``None`` if unusable)."""
+    if isinstance(raw, EndpointDescriptor):
+        return raw
+    if isinstance(raw, dict):
+        data = dict(raw)
+        params = data.get("params")
+        if params is not None and not isinstance(params, str):
+            data["params"] = json.dumps(params)
+        if not data.get("path"):
+            return None
+        data["method"] = str(data.get("method") or "GET").upper()
+        known = EndpointDescriptor.__dataclass_fields__
+        return EndpointDescriptor(**{k: v for k, v in data.items() if k in known})
+
+    match = _DESCRIPTOR_RE.match(str(raw))
+    if not match:
+        return None
+    method, path, rest = match.groups()
+    if method and method.upper() not in _METHODS:
+        return None
+    if not (path.startswith("/") or path.startswith(("http://", "https://"))):
+        return None
+
+    params: Optional[str] = None
+    if rest.startswith("{"):
+        try:
+            _, end = json.JSONDecoder().raw_decode(rest)
+        except ValueError:
+            return None
+        params, rest = rest[:end], rest[end:].strip()
+    description = rest.lstrip("-–—: ").strip() or None
+    return EndpointDescriptor(
+        method=(method or "GET").upper(), path=path, params=params, description=description
+    )
+
+
+# ---------------------------------------------------------------------------
+# Item construction
+# ---------------------------------------------------------------------------
+
+
+def _tag_for(descriptor: EndpointDescriptor, spec: RequestSpec) -> str:
+    if descriptor.tag:
+        return descriptor.tag
+    for segment in spec.path.strip("/").split("/"):
+        if segment and not segment.startswith("{") and not _SKIP_SEGMENT_RE.match(segment):
+            return segment
+    return "root"
+
+
+def _as_text(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _url(spec: RequestSpec) -> Dict[str, Any]:
+    # Postman marks path variables as ":name".
+    segments = [
+        f":{seg[1:-1]}" if seg.startswith("{") and seg.endswith("}") else seg
+        for seg in spec.path.strip("/").split("/")
+        if seg
+    ]
+    raw = "{{baseUrl}}/" + "/".join(segments)
+    url: Dict[str, Any] = {"raw": raw, "host": ["{{baseUrl}}"], "path": segments}
+    if spec.query:
+        url["query"] = [{"key": k, "value": _as_text(v)} for k, v in spec.query.items()]
+        url["raw"] += "?" + "&".join(f"{q['key']}={q['value']}" for q in url["query"])
+    if spec.path_params:
+        url["variable"] = [{"key": k, "value": _as_text(v)} for k, v in spec.path_params.items()]
+    return url
+
+
+def _item(descriptor: EndpointDescriptor, spec: RequestSpec) -> Dict[str, Any]:
+    headers = {**spec.headers, **descriptor.headers}
+    body = spec.body
+    if body is None and spec.method in _BODY_METHODS:
+        body = {}  # example body placeholder the user fills in
+    if body is not None:
+        headers.setdefault("Content-Type", "application/json")
+
+    request: Dict[str, Any] = {
+        "method": spec.method,
+        "header": [{"key": k, "value": _as_text(v)} for k, v in headers.items()],
+        "url": _url(spec),
+    }
+    if body is not None:
+        request["body"] = {
+            "mode": "raw",
+            "raw": json.dumps(body, indent=2),
+            "options": {"raw": {"language": "json"}},
+        }
+    if descriptor.description:
+        request["description"] = descriptor.description
+    return {
+        "name": descriptor.name or f"{spec.method} {spec.path}",
+        "request": request,
+        "response": [],
+    }
+
+
+def _group(endpoints: Iterable[Descriptor]) -> Dict[str, List[Dict[str, Any]]]:
+    """Build items and group them by folder, keeping first-seen order."""
+    folders: Dict[str, List[Dict[str, Any]]] = {}
+    for raw in endpoints:
+        descriptor = parse_descriptor(raw)
+        spec = (
+            build_request_spec(descriptor.path, descriptor.method, descriptor.params)
+            if descriptor
+            else None
+        )
+        if descriptor is None or spec is None:
+            logger.warning("Skipping unusable endpoint descriptor: %r", raw)
+            continue
+        folders.setdefault(_tag_for(descriptor, spec), []).append(_item(descriptor, spec))
+    return folders
+
+
+def _base_url(endpoints: Sequence[Descriptor], base_url: Optional[str]) -> str:
+    if base_url:
+        return base_url.rstrip("/")
+    for raw in endpoints:
+        path = raw.path if isinstance(raw, EndpointDescriptor) else (
+            raw.get("path", "") if isinstance(raw, dict) else str(raw)
+        )
+        match = re.search(r"https?://[^/\s]+", str(path))
+        if match:
+            return match.group(0)
+    return DEFAULT_BASE_URL
+
+
+def _header(name: str, base_url: str) -> Dict[str, Any]:
+    return {
+        "info": {
+            # Stable id so regenerating a collection updates it on import.
+            "_postman_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"documentor:{name}")),
+            "name": name,
+            "schema": SCHEMA_URL,
+        },
+        "variable": [{"key": "baseUrl", "value": base_url, "type": "string"}],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+
+def build_collection(
+    name: str, endpoints: Sequence[Descriptor], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Return the collection as a dict."""
+    collection = _header(name, _base_url(endpoints, base_url))
+    collection["item"] = [
+        {"name": tag, "item": items} for tag, items in _group(endpoints).items()
+    ]
+    return collection
+
+
+def iter_collection_json(
+    name: str, endpoints: Sequence[Descriptor], base_url: Optional[str] = None
+) -> Iterator[bytes]:
+    """Yield the collection as JSON, one request at a time."""
+    header = orjson.dumps(_header(name, _base_url(endpoints, base_url)))
+    yield header[:-1] + b',"item":['
+    for f_idx, (tag, items) in enumerate(_group(endpoints).items()):
+        yield (b"," if f_idx else b"") + b'{"name":' + orjson.dumps(tag) + b',"item":['
+        for i_idx, item in enumerate(items):
+            yield (b"," if i_idx else b"") + orjson.dumps(item)
+        yield b"]}"
+    yield b"]}"
+
+
+def collection_json(name: str, endpoints: Sequence[Descriptor], base_url: Optional[str] = None) -> str:
+    """Return the whole collection serialised as a JSON string."""
+    return b"".join(iter_collection_json(name, endpoints, base_url)).decode("utf-8")
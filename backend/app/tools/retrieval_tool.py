@@ -2,57 +2,164 @@ from __future__ import annotations
 
 """Knowledge search retrieval tool for the developer agent.
 
-Exposes the RAG-powered `answer_query` helper as a LangChain tool so the
-agent can directly fetch answers from the vector store instead of relying
-solely on the LLM. This makes the agent documentation-aware.
+Gives the agent direct access to the vector store so it grounds its answers
+in the user's documentation instead of relying solely on the LLM.
+
+Two modes are available via the ``KNOWLEDGE_TOOL_MODE`` env-var:
+
+* ``retrieval`` (default) – return compact, de-duplicated passages with
+  source references. No LLM call and no chat-history writes; the agent's own
+  model composes the final answer from the passages.
+* ``answer`` – legacy behaviour: run the full RAG chain (`answer_query`) and
+  return its generated answer.
 """
 
 import os
+import re
+from typing import List
 
+from langchain_core.documents import Document
 from langchain_core.tools import tool
 
 from app.config import logger
 from app.services.query_engine import answer_query
+from app.tools.cache import Uncached, get_tool_cache
+from app.vector.chroma_client import search_similar_documents
 
 __all__ = ["knowledge_search"]
 
 # Sentinel env-var name that toggles the tool at runtime
 _FEATURE_FLAG = "KNOWLEDGE_TOOL_ENABLED"
+_MODE_ENV = "KNOWLEDGE_TOOL_MODE"
+
+# Retrieval-mode limits: enough context to answer, small enough to keep the
+# agent prompt (and its token bill) compact.
+_TOP_K = int(os.getenv("KNOWLEDGE_TOOL_TOP_K", "6"))
+_MAX_PASSAGE_CHARS = 700
+_MAX_TOTAL_CHARS = 4000
+
+_WS_RE = re.compile(r"\s+")
 
 
 class ToolExecutionError(Exception):
     """Raised when the knowledge_search tool fails internally."""
 
 
+# ---------------------------------------------------------------------------
+# Retrieval-only mode
+# ---------------------------------------------------------------------------
+
+
+def _clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0]
+    return cut + " …"
+
+
+def _reference(doc: Document) -> str:
+    meta = doc.metadata or {}
+    origin = meta.get("url") or meta.get("source") or "docs"
+    chunk_id = meta.get("chunk_id")
+    return f"{origin}, chunk {chunk_id}" if chunk_id is not None else str(origin)
+
+
+def _dedupe(docs: List[Document]) -> List[Document]:
+    """Drop repeated chunks and chunks fully contained in a kept passage.
+
+    Overlapping chunk windows and re-ingested documents often surface the same
+    text several times in the top-k.
+    """
+    kept: List[Document] = []
+    kept_texts: List[str] = []
+    seen_ids = set()
+    for doc in docs:
+        meta = doc.metadata or {}
+        identity = (meta.get("url") or meta.get("source"), meta.get("chunk_id"))
+        normalised = _WS_RE.sub(" ", doc.page_content).strip().casefold()
+        if not normalised:
+            continue
+        if identity[1] is not None and identity in seen_ids:
+            continue
+        if any(normalised in other for other in kept_texts):
+            continue
+        seen_ids.add(identity)
+        kept.append(doc)
+        kept_texts.append(normalised)
+    return kept
+
+
+def format_passages(docs: List[Document]) -> str:
+    """Render retrieved chunks as numbered passages with source references."""
+    lines: List[str] = []
+    total = 0
+    for idx, doc in enumerate(_dedupe(docs), start=1):
+        passage = _clip(_WS_RE.sub(" ", doc.page_content).strip(), _MAX_PASSAGE_CHARS)
+        entry = f"[{idx}] ({_reference(doc)}) {passage}"
+        if lines and total + len(entry) > _MAX_TOTAL_CHARS:
+            break
+        lines.append(entry)
+        total += len(entry)
+    return "\n\n".join(lines)
+
+
+def _retrieve_passages(question: str) -> str:
+    passages = format_passages(search_similar_documents(question, k=_TOP_K))
+    if not passages:
+        return Uncached("No relevant documentation passages were found.")
+    return passages
+
+
+# ---------------------------------------------------------------------------
+# Full-answer mode (legacy)
+# ---------------------------------------------------------------------------
+
+
+def _search(question: str, session_id: str) -> str:
+    return answer_query(question, session_id=session_id).answer
+
+
 @tool # type: ignore[call-arg]
 def knowledge_search(question: str, session_id: str = "default") -> str:  # noqa: D401
-    """Search the knowledge base and *return the answer directly*.
+    """Search the API documentation knowledge base.
 
     Parameters
     ----------
     question : str
         The natural-language question to search for.
     session_id : str, optional
-        Conversation/session identifier used for chat memory (default "default").
+        Conversation/session identifier (default "default"); only used when
+        the tool runs in full-answer mode.
 
     Returns
     -------
     str
-        The answer text generated by the RAG pipeline. If the tool is
-        disabled via the ``KNOWLEDGE_TOOL_ENABLED`` env-var, a short message
-        is returned instead so the agent can gracefully handle it.
+        Numbered documentation passages, each tagged with its source and
+        chunk reference – cite them when answering. If the tool is disabled
+        via the ``KNOWLEDGE_TOOL_ENABLED`` env-var, a short message is
+        returned instead so the agent can gracefully handle it.
     """
     enabled = os.getenv(_FEATURE_FLAG, "true").lower() in {"1", "true", "yes"}
     if not enabled:
         logger.info("knowledge_search skipped because %s is disabled", _FEATURE_FLAG)
         return "The knowledge search feature is currently disabled."
 
+    mode = os.getenv(_MODE_ENV, "retrieval").lower()
     try:
-        logger.debug("knowledge_search invoked (len(question)=%d)", len(question))
-        response = answer_query(question, session_id=session_id)
-        return response.answer
+        logger.debug("knowledge_search invoked (mode=%s, len(question)=%d)", mode, len(question))
+        if mode == "answer":
+            # Not cached: the answer depends on the session's history, and
+            # `answer_query` records the turn in it.
+            return _search(question, session_id)
+        # Retrieval results do not depend on the conversation, so the cache
+        # entry is shared across sessions.
+        return get_tool_cache().get_or_compute(
+            "knowledge_search",
+            {"question": question, "mode": mode},
+            lambda: _retrieve_passages(question),
+        )
     except Exception as exc:  # pragma: no cover – generic safety net
         logger.exception("knowledge_search failed: %s", exc)
         # Re-raise with a specific error type so Gemini (or other agents)
         # can decide to handle / retry / ignore the failure.
-        raise ToolExecutionError(str(exc)) from exc 
\ No newline at end of file
+        raise ToolExecutionError(str(exc)) from exc
@@ -0,0 +1,392 @@
+"""Deterministic code-snippet templates for common HTTP client libraries.
+
+Most `code_snippet` requests are plain REST calls whose code follows directly
+from the endpoint, the HTTP verb and the parameter structure – no model needed.
+`render_snippet` covers python (``requests``, ``httpx``) and JavaScript
+(``fetch``, ``axios``) and returns ``None`` for anything it cannot render
+faithfully (other libraries, free-form parameter descriptions), in which case
+the caller falls back to the LLM.
+
+Accepted ``params`` formats:
+
+* a JSON object, either flat (query string for GET/DELETE, JSON body
+  otherwise) or split into ``path`` / ``query`` / ``body`` / ``headers``;
+* ``key=value`` pairs separated by ``&``, ``,``, ``;`` or newlines;
+* bare parameter names (``limit, offset``), rendered as placeholders.
+
+Python output follows black's style (exploded literals with magic trailing
+commas), so it does not need a formatting pass.
+"""
+from __future__ import annotations
+
+import json
+import keyword
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+__all__ = ["RequestSpec", "build_request_spec", "render_snippet", "supports"]
+
+DEFAULT_BASE_URL = "https://api.example.com"
+
+_SECTION_ALIASES = {
+    "path": "path",
+    "path_params": "path",
+    "query": "query",
+    "params": "query",
+    "query_params": "query",
+    "body": "body",
+    "json": "body",
+    "data": "body",
+    "headers": "headers",
+}
+
+# "<type>" values in "limit: int" style descriptions become placeholders.
+_TYPE_WORDS = {"int", "integer", "str", "string", "bool", "boolean", "number", "float", "double", "uuid"}
+
+_PATH_PARAM_RE = re.compile(r"\{([^{}/]+)\}|(?<=/):([A-Za-z_][\w-]*)")
+_PAIR_RE = re.compile(r"^\s*([A-Za-z_][\w.-]*)\s*(?:[=:]\s*(.*?))?\s*$")
+_PAIR_SPLIT_RE = re.compile(r"[&,;\n]")
+_LEADING_VERB_RE = re.compile(r"^(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS)\s+", re.IGNORECASE)
+_BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+
+@dataclass
+class RequestSpec:
+    """Structured description of a single HTTP call."""
+
+    method: str
+    base_url: str
+    path: str  # with ``{name}`` placeholders for path parameters
+    path_params: Dict[str, Any] = field(default_factory=dict)
+    query: Dict[str, Any] = field(default_factory=dict)
+    body: Any = None
+    headers: Dict[str, Any] = field(default_factory=dict)
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+
+def _scalar(raw: str, name: str) -> Any:
+    value = raw.strip()
+    if not value or value.lower() in _TYPE_WORDS:
+        return f"<{name}>"
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _parse_params(params: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse *params* into a dict; ``None`` means "not structured enough"."""
+    text = (params or "").strip()
+    if not text or text.lower() in {"none", "n/a", "-", "{}"}:
+        return {}
+    if text[0] in "{[":
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    result: Dict[str, Any] = {}
+    for piece in filter(str.strip, _PAIR_SPLIT_RE.split(text)):
+        match = _PAIR_RE.match(piece)
+        if not match:
+            return None  # prose – let the model interpret it
+        name, raw = match.group(1), match.group(2)
+        result[name] = _scalar(raw or "", name)
+    return result
+
+
+def _split_endpoint(endpoint: str) -> Tuple[str, str, Dict[str, str]]:
+    """Return (base_url, path, query) for a bare path or an absolute URL."""
+    endpoint = _LEADING_VERB_RE.sub("", endpoint.strip())
+    if endpoint.startswith(("http://", "https://")):
+        parts = urlsplit(endpoint)
+        base_url = f"{parts.scheme}://{parts.netloc}"
+        path, query = parts.path or "/", parts.query
+    else:
+        base_url = DEFAULT_BASE_URL
+        path, _, query = endpoint.partition("?")
+    if not path.startswith("/"):
+        path = "/" + path
+    return base_url, path, dict(parse_qsl(query))
+
+
+def build_request_spec(endpoint: str, method: str, params: Optional[str]) -> Optional[RequestSpec]:
+    """Build a `RequestSpec`, or ``None`` when *params* cannot be interpreted."""
+    parsed = _parse_params(params)
+    if parsed is None:
+        return None
+
+    base_url, path, query = _split_endpoint(endpoint)
+    method = method.upper()
+    # Normalise ":id" (Express style) to "{id}".
+    names: List[str] = []
+
+    def _placeholder(match: "re.Match[str]") -> str:
+        name = match.group(1) or match.group(2)
+        names.append(name)
+        return "{" + name + "}"
+
+    path = _PATH_PARAM_RE.sub(_placeholder, path)
+    spec = RequestSpec(method=method, base_url=base_url, path=path, query=query)
+
+    sections = {_SECTION_ALIASES.get(key) for key in parsed}
+    if parsed and None not in sections:
+        for key, value in parsed.items():
+            section = _SECTION_ALIASES[key]
+            if section == "body":
+                spec.body = value
+            elif isinstance(value, dict):
+                getattr(spec, section if section != "path" else "path_params").update(value)
+            else:
+                return None
+    else:
+        flat = dict(parsed)
+        for name in names:
+            if name in flat:
+                spec.path_params[name] = flat.pop(name)
+        if flat:
+            if method in _BODY_METHODS:
+                spec.body = flat
+            else:
+                spec.query.update(flat)
+
+    for name in names:
+        spec.path_params.setdefault(name, f"<{name}>")
+    return spec
+
+
+# ---------------------------------------------------------------------------
+# Literal rendering
+# ---------------------------------------------------------------------------
+
+
+def _py_literal(value: Any, indent: int = 0) -> str:
+    pad = " " * (indent + 4)
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        items = "".join(
+            f"{pad}{json.dumps(str(k))}: {_py_literal(v, indent + 4)},\n" for k, v in value.items()
+        )
+        return "{\n" + items + " " * indent + "}"
+    if isinstance(value, list):
+        if not value:
+            return "[]"
+        items = "".join(f"{pad}{_py_literal(v, indent + 4)},\n" for v in value)
+        return "[\n" + items + " " * indent + "]"
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if value is None:
+        return "None"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(str(value))
+
+
+def _js_literal(value: Any, indent: int = 0) -> str:
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    return text.replace("\n", "\n" + " " * indent)
+
+
+# Names the rendered snippets bind themselves; a path parameter must not shadow them.
+_PY_TAKEN = frozenset({"requests", "httpx", "response"})
+_JS_RESERVED = frozenset(
+    "await break case catch class const continue debugger default delete do else enum export extends "
+    "false finally for function if implements import in instanceof interface let new null package "
+    "private protected public return static super switch this throw true try typeof var void while "
+    "with yield arguments eval undefined NaN Infinity".split()
+)
+_JS_TAKEN = frozenset({"axios", "fetch", "params", "response", "data"})
+
+
+def _snake_case(name: str) -> str:
+    ident = re.sub(r"\W+", "_", re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name)).strip("_").lower()
+    return ident if ident and not ident[0].isdigit() else f"param_{ident}"
+
+
+def _py_identifier(name: str) -> str:
+    ident = _snake_case(name)
+    return ident + "_" if keyword.iskeyword(ident) or ident in _PY_TAKEN else ident
+
+
+def _js_identifier(name: str) -> str:
+    head, *rest = _snake_case(name).split("_")
+    ident = head + "".join(part.capitalize() for part in rest)
+    return ident + "_" if ident in _JS_RESERVED or ident in _JS_TAKEN else ident
+
+
+def _identifiers(spec: RequestSpec, ident: Callable[[str], str], sep: str) -> Dict[str, str]:
+    """Distinct identifier per path parameter; ``orgId`` and ``org_id`` get ``org_id`` and ``org_id_2``."""
+    names: Dict[str, str] = {}
+    used = set()
+    for name in spec.path_params:
+        base = candidate = ident(name)
+        n = 2
+        while candidate in used:
+            candidate, n = f"{base.rstrip('_')}{sep}{n}", n + 1
+        used.add(candidate)
+        names[name] = candidate
+    return names
+
+
+def _path_template(spec: RequestSpec, names: Dict[str, str], prefix: str) -> str:
+    return _PATH_PARAM_RE.sub(lambda m: prefix + "{" + names[m.group(1)] + "}", spec.path)
+
+
+# ---------------------------------------------------------------------------
+# Renderers
+# ---------------------------------------------------------------------------
+
+
+def _render_python(spec: RequestSpec, lib: str) -> str:
+    names = _identifiers(spec, _py_identifier, "_")
+    lines = [f"import {lib}", "", f"BASE_URL = {json.dumps(spec.base_url)}"]
+    for name, value in spec.path_params.items():
+        lines.append(f"{names[name]} = {_py_literal(value)}")
+    lines.append("")
+
+    verb = spec.method.lower()
+    # httpx.get/delete do not take a body; requests accepts it everywhere.
+    if lib == "httpx" and spec.body is not None and spec.method not in _BODY_METHODS:
+        call, args = f"{lib}.request(", [json.dumps(spec.method)]
+    else:
+        call, args = f"{lib}.{verb}(", []
+
+    args.append('f"{BASE_URL}' + _path_template(spec, names, "") + '"')
+    if spec.query:
+        args.append(f"params={_py_literal(spec.query, 4)}")
+    if spec.body is not None:
+        args.append(f"json={_py_literal(spec.body, 4)}")
+    if spec.headers:
+        args.append(f"headers={_py_literal(spec.headers, 4)}")
+    args.append("timeout=30")
+
+    lines.append(f"response = {call}")
+    lines.extend(f"    {arg}," for arg in args)
+    lines.append(")")
+    lines.append("response.raise_for_status()")
+    lines.append("print(response.status_code)" if spec.method == "DELETE" else "print(response.json())")
+    return "\n".join(lines)
+
+
+def _js_prelude(spec: RequestSpec, imports: List[str]) -> List[str]:
+    lines = list(imports)
+    if imports:
+        lines.append("")
+    lines.append(f"const BASE_URL = {json.dumps(spec.base_url)};")
+    names = _identifiers(spec, _js_identifier, "")
+    for name, value in spec.path_params.items():
+        lines.append(f"const {names[name]} = {_js_literal(value)};")
+    lines.append("")
+    return lines
+
+
+def _js_url(spec: RequestSpec) -> str:
+    return "`${BASE_URL}" + _path_template(spec, _identifiers(spec, _js_identifier, ""), "$") + "`"
+
+
+def _render_fetch(spec: RequestSpec) -> str:
+    lines = ["// Runs as an ES module (Node 18+ or a modern browser)."]
+    lines += _js_prelude(spec, [])
+    url = _js_url(spec)
+    if spec.query:
+        as_strings = {k: v if isinstance(v, str) else json.dumps(v) for k, v in spec.query.items()}
+        lines.append(f"const params = new URLSearchParams({_js_literal(as_strings)});")
+        url = url[:-1] + "?${params}`"
+
+    headers = dict(spec.headers)
+    if spec.body is not None:
+        headers.setdefault("Content-Type", "application/json")
+
+    lines.append(f"const response = await fetch({url}, {{")
+    lines.append(f"  method: {json.dumps(spec.method)},")
+    if headers:
+        lines.append(f"  headers: {_js_literal(headers, 2)},")
+    if spec.body is not None:
+        lines.append(f"  body: JSON.stringify({_js_literal(spec.body, 2)}),")
+    lines.append("});")
+    lines.append("if (!response.ok) {")
+    lines.append("  throw new Error(`Request failed with status ${response.status}`);")
+    lines.append("}")
+    if spec.method == "DELETE":
+        lines.append("console.log(response.status);")
+    else:
+        lines.append("const data = await response.json();")
+        lines.append("console.log(data);")
+    return "\n".join(lines)
+
+
+def _render_axios(spec: RequestSpec) -> str:
+    lines = _js_prelude(spec, ['import axios from "axios";'])
+    lines.append("const response = await axios.request({")
+    lines.append(f"  method: {json.dumps(spec.method.lower())},")
+    lines.append(f"  url: {_js_url(spec)},")
+    if spec.query:
+        lines.append(f"  params: {_js_literal(spec.query, 2)},")
+    if spec.body is not None:
+        lines.append(f"  data: {_js_literal(spec.body, 2)},")
+    if spec.headers:
+        lines.append(f"  headers: {_js_literal(spec.headers, 2)},")
+    lines.append("});")
+    lines.append("console.log(response.status);" if spec.method == "DELETE" else "console.log(response.data);")
+    return "\n".join(lines)
+
+
+_RENDERERS: Dict[Tuple[str, str], Callable[[RequestSpec], str]] = {
+    ("python", "requests"): lambda spec: _render_python(spec, "requests"),
+    ("python", "httpx"): lambda spec: _render_python(spec, "httpx"),
+    ("javascript", "fetch"): _render_fetch,
+    ("javascript", "axios"): _render_axios,
+}
+
+# Client names as users (and the model) tend to spell them. The tool's
+# default client_lib is "requests", which for JavaScript means "no preference".
+_CLIENT_ALIASES: Dict[str, Dict[str, str]] = {
+    "python": {"": "requests", "requests": "requests", "httpx": "httpx"},
+    "javascript": {
+        "": "fetch",
+        "requests": "fetch",
+        "fetch": "fetch",
+        "node-fetch": "fetch",
+        "native": "fetch",
+        "axios": "axios",
+    },
+}
+
+
+def _resolve(language: str, client_lib: Optional[str]) -> Optional[Tuple[str, str]]:
+    lang = language.strip().lower()
+    lang = {"js": "javascript", "node": "javascript", "py": "python"}.get(lang, lang)
+    lib = _CLIENT_ALIASES.get(lang, {}).get((client_lib or "").strip().lower())
+    return (lang, lib) if lib else None
+
+
+def supports(language: str, client_lib: Optional[str]) -> bool:
+    """Whether a template exists for *language* / *client_lib*."""
+    return _resolve(language, client_lib) is not None
+
+
+def render_snippet(
+    endpoint: str,
+    method: str,
+    language: str,
+    params: Optional[str] = None,
+    client_lib: Optional[str] = None,
+) -> Optional[str]:
+    """Render a snippet from templates, or return ``None`` if unsupported."""
+    target = _resolve(language, client_lib)
+    if target is None:
+        return None
+    spec = build_request_spec(endpoint, method, params)
+    if spec is None:
+        return None
+    return _RENDERERS[target](spec)
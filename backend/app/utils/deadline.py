@@ -0,0 +1,221 @@
+"""Request deadlines and step budgets.
+
+Every `/chat` and `/agent` request gets a `RequestBudget`: an absolute
+deadline plus (for the agent) a maximum number of reasoning steps. The budget
+is passed explicitly to the service entry points and is published in a
+context variable for the worker threads it spawns, so tools and nested
+helpers can check it without extra parameters. The budget also carries the
+request's token `UsageTracker` (see `app.services.usage`).
+
+Blocking upstream calls (Gemini, Chroma, Mongo) cannot be interrupted from
+Python, so work is run on a worker thread and the request thread waits at
+most until the deadline. On expiry the caller gets `DeadlineExceeded`
+(carrying whatever partial output was produced), the worker is told to stop
+at its next chunk, and the request worker is released.
+
+Configuration (seconds / counts): ``CHAT_TIMEOUT_S`` (30), ``AGENT_TIMEOUT_S``
+(60), ``AGENT_MAX_STEPS`` (8).
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import Context, ContextVar, copy_context
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from app.services.metrics import counter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.usage import UsageTracker
+
+__all__ = [
+    "DeadlineExceeded",
+    "RequestBudget",
+    "current_budget",
+    "budget_context",
+    "call_with_deadline",
+    "iter_with_deadline",
+    "record_timeout",
+]
+
+T = TypeVar("T")
+
+_DEFAULT_TIMEOUTS = {"chat": 30.0, "agent": 60.0}
+_DEFAULT_MAX_STEPS = 8
+
+# Threads that run upstream calls on behalf of a waiting request. A request
+# that times out abandons its task; the thread is reclaimed once the upstream
+# call returns (bounded by the client-side LLM timeout).
+_DEADLINE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DEADLINE_WORKERS", "32")),
+    thread_name_prefix="deadline",
+)
+
+# Set in the context of work submitted to the pool (and inherited by threads
+# it starts, such as agent tools). Nested deadline-bounded work runs inline
+# there: the outer caller already waits with the deadline, and a nested
+# submission could queue behind its own parent once the pool is busy.
+_ON_WORKER: ContextVar[bool] = ContextVar("documentor_on_deadline_worker", default=False)
+
+REQUEST_TIMEOUTS = counter(
+    "documentor_request_timeouts_total",
+    "Requests that hit their deadline, by route and the stage that was running.",
+)
+STEP_BUDGET_EXHAUSTED = counter(
+    "documentor_agent_step_budget_exhausted_total",
+    "Agent runs stopped because they used up their reasoning-step budget.",
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's deadline passes before *stage* completes."""
+
+    def __init__(self, stage: str, partial: Optional[List[Any]] = None) -> None:
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+        # Chunks/events produced before the deadline (for best-effort answers).
+        self.partial: List[Any] = partial or []
+
+
+@dataclass
+class RequestBudget:
+    """Deadline and step allowance for a single request."""
+
+    route: str
+    timeout_s: float
+    max_steps: int = 0  # 0 = unlimited (non-agent routes)
+    started: float = field(default_factory=time.monotonic)
+    # Token accounting for the request; attached by the service entry points.
+    usage: Optional["UsageTracker"] = None
+
+    @classmethod
+    def for_route(cls, route: str) -> "RequestBudget":
+        """Build the configured budget for *route* (``chat`` or ``agent``)."""
+        timeout = float(os.getenv(f"{route.upper()}_TIMEOUT_S", _DEFAULT_TIMEOUTS.get(route, 30.0)))
+        steps = int(os.getenv("AGENT_MAX_STEPS", _DEFAULT_MAX_STEPS)) if route == "agent" else 0
+        return cls(route=route, timeout_s=timeout, max_steps=steps)
+
+    @property
+    def deadline(self) -> float:
+        return self.started + self.timeout_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def check(self, stage: str) -> None:
+        """Raise `DeadlineExceeded` if the deadline has already passed."""
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+
+_CURRENT_BUDGET: ContextVar[Optional[RequestBudget]] = ContextVar("documentor_request_budget", default=None)
+
+
+def current_budget() -> Optional[RequestBudget]:
+    """Return the budget of the request being served on this context, if any."""
+    return _CURRENT_BUDGET.get()
+
+
+def budget_context(budget: RequestBudget) -> Context:
+    """Copy the caller's context and publish *budget* in it.
+
+    Work started from the worker (agent tools, nested RAG calls) inherits the
+    copy, so `current_budget()` sees the request's deadline there.
+    """
+    ctx = copy_context()
+    ctx.run(_CURRENT_BUDGET.set, budget)
+    return ctx
+
+
+def _worker_context(budget: RequestBudget) -> Context:
+    ctx = budget_context(budget)
+    ctx.run(_ON_WORKER.set, True)
+    return ctx
+
+
+def record_timeout(budget: RequestBudget, stage: str) -> None:
+    REQUEST_TIMEOUTS.inc(route=budget.route, stage=stage)
+
+
+# ---------------------------------------------------------------------------
+# Deadline-bounded execution
+# ---------------------------------------------------------------------------
+
+
+def call_with_deadline(fn: Callable[[], T], budget: RequestBudget, stage: str) -> T:
+    """Run *fn* on a worker thread and wait for it at most until the deadline."""
+    budget.check(stage)
+    if _ON_WORKER.get():
+        return fn()
+    future = _DEADLINE_POOL.submit(_worker_context(budget).run, fn)
+    try:
+        return future.result(timeout=budget.remaining())
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(stage) from None
+
+
+_DONE = object()
+
+
+def _iter_inline(make_iter: Callable[[], Iterable[T]], budget: RequestBudget, stage: str) -> Iterator[T]:
+    produced: List[T] = []
+    for item in make_iter():
+        if budget.expired():
+            raise DeadlineExceeded(stage, produced)
+        produced.append(item)
+        yield item
+
+
+def iter_with_deadline(
+    make_iter: Callable[[], Iterable[T]], budget: RequestBudget, stage: str
+) -> Iterator[T]:
+    """Yield items from ``make_iter()`` until it ends or the deadline passes.
+
+    The iterator is driven on a worker thread; items are handed over through a
+    queue so the consumer can stop waiting the moment the deadline expires.
+    Exceptions raised by the producer are re-raised in the consumer. Nested
+    inside deadline-bounded work, the iterator is driven inline and the
+    deadline is checked between items.
+    """
+    budget.check(stage)
+    if _ON_WORKER.get():
+        yield from _iter_inline(make_iter, budget, stage)
+        return
+    handoff: "queue.Queue[Any]" = queue.Queue()
+    stop = threading.Event()
+
+    def _produce() -> None:
+        try:
+            for item in make_iter():
+                if stop.is_set():
+                    return
+                handoff.put(item)
+            handoff.put(_DONE)
+        except BaseException as exc:  # forwarded to the consumer
+            handoff.put(exc)
+
+    _DEADLINE_POOL.submit(_worker_context(budget).run, _produce)
+
+    produced: List[T] = []
+    try:
+        while True:
+            try:
+                item = handoff.get(timeout=budget.remaining())
+            except queue.Empty:
+                raise DeadlineExceeded(stage, produced) from None
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            produced.append(item)
+            yield item
+    finally:
+        stop.set()
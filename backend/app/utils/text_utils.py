@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Tuple
 import re
 import logging
 
@@ -7,8 +7,6 @@ try:
 except ImportError:
     logger = logging.getLogger(__name__)
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
 
 def clean_text(text: str) -> str:
     """
@@ -38,15 +36,30 @@ def chunk_text(text: str) -> List[str]:
     Returns:
         List[str]: List of text chunks.
     """
+    return [chunk for chunk, _ in chunk_text_with_offsets(text)]
+
+
+def chunk_text_with_offsets(text: str) -> List[Tuple[str, int]]:
+    """
+    Like `chunk_text`, but each chunk comes with its start offset in *text*.
+    Args:
+        text (str): The text to split.
+    Returns:
+        List[Tuple[str, int]]: (chunk, start offset) pairs.
+    """
+    # Deferred import: the splitter package is only needed during ingestion.
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     try:
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
-            separators=["\n\n", "\n", ".", "!", "?", " "]
+            separators=["\n\n", "\n", ".", "!", "?", " "],
+            add_start_index=True,
         )
-        chunks = splitter.split_text(text)
-        logger.info("Text split into %d chunks.", len(chunks))
-        return chunks
+        docs = splitter.create_documents([text])
+        logger.info("Text split into %d chunks.", len(docs))
+        return [(doc.page_content, doc.metadata["start_index"]) for doc in docs]
     except Exception as e:
         logger.error(f"Failed to chunk text: {e}")
-        raise 
\ No newline at end of file
+        raise
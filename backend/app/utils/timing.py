@@ -0,0 +1,67 @@
+"""Lightweight per-stage timing helpers for hot request paths.
+
+A `StageTimings` instance is created per request and records how long each
+named stage took. Because independent stages may run concurrently, the sum of
+all stages can exceed the wall-clock total – the gap between the two is the
+time saved by overlapping work off the critical path.
+
+Each stage is also reported to `app.services.telemetry` (the
+``documentor_stage_seconds`` histogram and, if enabled, an OpenTelemetry
+span) under the collector's *pipeline* label.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from app.services import telemetry
+
+__all__ = ["StageTimings"]
+
+
+class StageTimings:
+    """Thread-safe collector of stage durations (milliseconds)."""
+
+    def __init__(self, pipeline: str = "chat") -> None:
+        self.pipeline = pipeline
+        self._started = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block and record it under *name*."""
+        start = time.perf_counter()
+        try:
+            with telemetry.stage(self.pipeline, name):
+                yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + elapsed_ms
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def first_token(self, route: str) -> None:
+        """Record time-to-first-token for a streamed answer."""
+        telemetry.TIME_TO_FIRST_TOKEN.observe(self.total_ms() / 1000, route=route)
+
+    def total_ms(self) -> float:
+        """Wall-clock time since the collector was created."""
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            stages = {k: round(v, 1) for k, v in self._stages.items()}
+        stages["sum_of_stages"] = round(sum(stages.values()), 1)
+        stages["total"] = round(self.total_ms(), 1)
+        return stages
+
+    def summary(self) -> str:
+        """Human-readable one-liner, e.g. ``history=12.0ms retrieval=310.4ms``."""
+        return " ".join(f"{k}={v}ms" for k, v in self.as_dict().items())
@@ -10,15 +10,16 @@ from __future__ import annotations
 
 import os
 from functools import lru_cache
-from typing import List, Dict, Union, Any
+from typing import TYPE_CHECKING, List, Dict, Union, Any
 
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
-import chromadb  # type: ignore  # noqa: F401
 
 from app.services.embedding_service import get_embedder
 from app.config import logger
 
+if TYPE_CHECKING:  # pragma: no cover
+    from langchain_community.vectorstores import Chroma
+
 
 # ---------------------------------------------------------------------------
 # Singleton helpers
@@ -34,23 +35,39 @@ def _get_chroma_client() -> Any:  # pragma: no cover
     if not api_key or not tenant or not database:
         logger.error("Missing Chroma Cloud environment variables.")
         raise ValueError("Missing Chroma Cloud environment variables.")
+    import chromadb  # type: ignore  # deferred: heavy import, only needed on first use
+
     return chromadb.CloudClient(api_key=api_key, tenant=tenant, database=database)
 
 
-@lru_cache()
-def get_vectorstore() -> Chroma:
-    """Return a singleton LangChain `Chroma` vector store instance."""
-    client = _get_chroma_client()
-    embedder = get_embedder()
+def _make_vectorstore(collection_name: str) -> "Chroma":
+    from langchain_community.vectorstores import Chroma
+
     vs = Chroma(
-        client=client,
-        collection_name="documentor",
-        embedding_function=embedder,
+        client=_get_chroma_client(),
+        collection_name=collection_name,
+        embedding_function=get_embedder(),
     )
-    logger.info("LangChain Chroma vector store initialised.")
+    logger.info("LangChain Chroma vector store initialised (%s).", collection_name)
     return vs
 
 
+@lru_cache()
+def get_vectorstore() -> "Chroma":
+    """Return a singleton LangChain `Chroma` vector store instance."""
+    return _make_vectorstore("documentor")
+
+
+@lru_cache()
+def get_endpoint_vectorstore() -> "Chroma":
+    """Return the collection holding one embedding per API endpoint.
+
+    Kept separate from the chunk collection so endpoint lookups never compete
+    with (or pollute) document retrieval.
+    """
+    return _make_vectorstore("documentor_endpoints")
+
+
 # ---------------------------------------------------------------------------
 # Public API (compatible with previous implementation)
 # ---------------------------------------------------------------------------
@@ -71,14 +88,24 @@ def store_embeddings(
         raise
 
 
-def query_similar_docs(query: str, k: int = 5) -> List[str]:
-    """Return the `k` most similar document chunks for the given query."""
+def search_similar_documents(query: str, k: int = 5) -> List[Document]:
+    """Return the `k` most similar chunks for *query* as LangChain Documents.
+
+    Unlike `query_similar_docs` the chunk metadata (source, url, chunk_id) is
+    preserved so callers can cite where a passage came from.
+    """
 
     retriever = get_vectorstore().as_retriever(search_kwargs={"k": k})
     try:
         docs = retriever.invoke(query)
         logger.info("Found %d similar chunks for query.", len(docs))
-        return [doc.page_content for doc in docs]
+        return docs
     except Exception as e:
         logger.error("Failed to query similar docs: %s", e)
-        raise 
\ No newline at end of file
+        raise
+
+
+def query_similar_docs(query: str, k: int = 5) -> List[str]:
+    """Return the `k` most similar document chunks for the given query."""
+
+    return [doc.page_content for doc in search_similar_documents(query, k)] 
\ No newline at end of file
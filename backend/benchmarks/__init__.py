@@ -0,0 +1,4 @@
+"""Offline benchmarks for the DocuMentor backend.
+
+Run from the ``backend`` directory, e.g. ``python -m benchmarks.startup``.
+"""
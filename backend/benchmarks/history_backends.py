@@ -0,0 +1,99 @@
+"""Compare the history backends: in-memory, SQLite and MongoDB.
+
+For each backend a number of sessions is filled turn by turn (human + AI
+message), the way `/chat` does: load the history, then append the turn.
+The benchmark reports per-turn append and per-load latency (mean/p50/p99).
+
+SQLite writes to a temporary file. Mongo is included when ``MONGODB_URI`` points at
+a reachable server; it writes to a throw-away collection that is dropped
+afterwards. Each backend uses its default write mode (write-behind unless
+``HISTORY_WRITE_BEHIND=false``).
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.history_backends --sessions 20 --turns 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.history_store import BENCH_COLLECTION, _summary, _turn
+
+
+def _run(store, sessions: int, turns: int) -> Dict[str, object]:
+    prefix = uuid.uuid4().hex[:8]
+    appends: List[float] = []
+    loads: List[float] = []
+    for t in range(turns):
+        for s in range(sessions):
+            sid = f"{prefix}-{s}"
+            start = time.perf_counter()
+            history = store.get(sid)
+            loads.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            history.add_messages(_turn(t))
+            appends.append(time.perf_counter() - start)
+    close: Optional[Callable[[], None]] = getattr(store, "close", None)
+    start = time.perf_counter()
+    if close is not None:
+        close()
+    return {
+        "append_turn": _summary(appends, 1),
+        "load": _summary(loads, 1),
+        "final_flush_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def _mongo_store():
+    if not os.getenv("MONGODB_URI"):
+        return None, "MONGODB_URI is not set"
+    from app.history_store_mongo import MongoHistoryStore
+    from app.mongo import get_sync_mongo_client
+
+    try:
+        get_sync_mongo_client().admin.command("ping")
+    except Exception as exc:
+        return None, f"not reachable ({exc})"
+    return MongoHistoryStore(collection=BENCH_COLLECTION), None
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=50, help="turns (2 messages each) per session")
+    args = parser.parse_args(argv)
+
+    from app.history_store import InMemoryHistoryStore
+    from app.history_store_sqlite import SQLiteHistoryStore
+
+    results: Dict[str, object] = {"sessions": args.sessions, "turns": args.turns}
+    results["memory"] = _run(InMemoryHistoryStore(), args.sessions, args.turns)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteHistoryStore(os.path.join(tmp, "history.sqlite3"))
+        results["sqlite"] = _run(store, args.sessions, args.turns)
+
+    mongo, reason = _mongo_store()
+    if mongo is None:
+        results["mongo"] = f"SKIP: {reason}"
+    else:
+        try:
+            results["mongo"] = _run(mongo, args.sessions, args.turns)
+        finally:
+            from app.mongo import get_sync_mongo_client
+
+            get_sync_mongo_client()[mongo._db_name].drop_collection(BENCH_COLLECTION)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
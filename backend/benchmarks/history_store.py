@@ -0,0 +1,146 @@
+"""Per-message persistence overhead of the MongoDB history store.
+
+Compares three ways of appending a chat turn (human + AI message):
+
+* ``legacy``  – the previous implementation: ``asyncio.run`` around a Motor
+  ``insert_one`` per message (new event loop per operation);
+* ``sync``    – `MongoHistoryStore.append_many` on the pooled pymongo client;
+* ``async``   – `MongoHistoryStore.aappend_many` on one long-lived loop.
+
+Each variant also times a full history read (``get`` / ``aget``) of the
+session it wrote. The store runs with ``HISTORY_WRITE_BEHIND=false`` and
+``HISTORY_CACHE_SESSIONS=0``, so every append is a real insert and every read
+a real query. Needs a reachable MongoDB (``MONGODB_URI``); writes go to a
+throw-away collection (and its archive) that is dropped afterwards.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.history_store --turns 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+BENCH_COLLECTION = "messages_benchmark"
+
+
+def _turn(i: int) -> List:
+    return [HumanMessage(content=f"question {i} " * 8), AIMessage(content=f"answer {i} " * 40)]
+
+
+def _summary(samples_s: List[float], messages_per_sample: int) -> Dict[str, float]:
+    per_message_ms = sorted(s * 1000 / messages_per_sample for s in samples_s)
+    return {
+        "mean_ms": round(statistics.fmean(per_message_ms), 3),
+        "p50_ms": round(per_message_ms[len(per_message_ms) // 2], 3),
+        "p99_ms": round(per_message_ms[min(len(per_message_ms) - 1, int(len(per_message_ms) * 0.99))], 3),
+    }
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_legacy(store, turns: int) -> Dict[str, object]:
+    """Reproduces the pre-refactor code path: one event loop per insert."""
+    from motor.motor_asyncio import AsyncIOMotorClient  # type: ignore
+
+    from app.history_store_mongo import _serialise_message
+
+    coll = AsyncIOMotorClient(os.environ["MONGODB_URI"])[store._db_name][BENCH_COLLECTION]
+    session = f"legacy-{uuid.uuid4()}"
+
+    async def _insert(message):
+        doc = _serialise_message(message)
+        doc["session_id"] = session
+        await coll.insert_one(doc)
+
+    async def _fetch():
+        return await coll.find({"session_id": session}).sort("created_at", 1).to_list(length=None)
+
+    samples = []
+    for i in range(turns):
+        messages = _turn(i)
+        samples.append(_timed(lambda: [asyncio.run(_insert(m)) for m in messages]))
+    read = _timed(lambda: asyncio.run(_fetch()))
+    return {"append": _summary(samples, 2), "read_ms": round(read * 1000, 2)}
+
+
+def bench_sync(store, turns: int) -> Dict[str, object]:
+    session = f"sync-{uuid.uuid4()}"
+    samples = [_timed(lambda i=i: store.append_many(session, _turn(i))) for i in range(turns)]
+    read = _timed(lambda: store.get(session))
+    return {"append": _summary(samples, 2), "read_ms": round(read * 1000, 2)}
+
+
+def bench_async(store, turns: int) -> Dict[str, object]:
+    session = f"async-{uuid.uuid4()}"
+
+    async def _run():
+        samples = []
+        for i in range(turns):
+            start = time.perf_counter()
+            await store.aappend_many(session, _turn(i))
+            samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await store.aget(session)
+        return samples, time.perf_counter() - start
+
+    samples, read = asyncio.run(_run())
+    return {"append": _summary(samples, 2), "read_ms": round(read * 1000, 2)}
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100, help="chat turns (2 messages each) per variant")
+    args = parser.parse_args(argv)
+
+    if not os.getenv("MONGODB_URI"):
+        print("SKIP: MONGODB_URI is not set")
+        return 0
+
+    from app.history_store_mongo import ARCHIVE_SUFFIX, MongoHistoryStore
+    from app.mongo import get_sync_mongo_client, pool_options
+
+    # Time the database round trips, not the write-behind queue or the session cache.
+    os.environ["HISTORY_WRITE_BEHIND"] = "false"
+    os.environ["HISTORY_CACHE_SESSIONS"] = "0"
+    store = MongoHistoryStore(collection=BENCH_COLLECTION)
+    try:
+        get_sync_mongo_client().admin.command("ping")
+    except Exception as exc:
+        print(f"SKIP: MongoDB not reachable ({exc})")
+        return 0
+
+    try:
+        results = {
+            "turns": args.turns,
+            "pool": pool_options(),
+            "legacy": bench_legacy(store, args.turns),
+            "sync": bench_sync(store, args.turns),
+            "async": bench_async(store, args.turns),
+        }
+    finally:
+        store.close()
+        db = get_sync_mongo_client()[store._db_name]
+        db.drop_collection(BENCH_COLLECTION)
+        db.drop_collection(BENCH_COLLECTION + ARCHIVE_SUFFIX)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
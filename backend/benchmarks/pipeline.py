@@ -0,0 +1,291 @@
+"""Offline end-to-end benchmark of ingest, /chat, /chat/stream and /agent.
+
+Serves the real FastAPI app with uvicorn on a local port, in a thread of
+this process, against the stand-ins from `benchmarks.standins`. It needs no
+Gemini, Chroma or Mongo and can run in CI. Requests go over real HTTP (httpx),
+so streamed responses are measured chunk by chunk. For every scenario it reports throughput and latency
+percentiles. Streaming scenarios also report time to first chunk.
+
+Results are written as JSON tagged with the git commit. With ``--compare``,
+a previous result file is diffed against this run, and the exit code is 1 when a
+p50 or p99 latency regressed by more than ``--max-regression`` (fraction).
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.pipeline --requests 50 --concurrency 4 --out bench.json
+    python -m benchmarks.pipeline --compare bench.json --max-regression 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Questions the rule-based router sends down each path.
+RAG_QUESTIONS = [
+    "What parameters does GET /users/{id} accept?",
+    "How do I authenticate against the orders API?",
+    "Which fields does the invoice object return?",
+    "What does DELETE /sessions/{id} do?",
+]
+AGENT_QUESTIONS = [
+    "Write a python requests snippet that fetches a user by id.",
+    "Generate JavaScript fetch code to create an order.",
+    "Which endpoint should I use to refund a payment? Give me curl code.",
+]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def _stats(latencies: List[float], wall_s: float, errors: int, extra: Optional[List[float]] = None) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    result: Dict[str, Any] = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+    }
+    if extra:
+        first = sorted(extra)
+        result["ttfb_p50_ms"] = round(_percentile(first, 0.50) * 1000, 2)
+        result["ttfb_p99_ms"] = round(_percentile(first, 0.99) * 1000, 2)
+    return result
+
+
+def _wait_ready(base_url: str, timeout_s: float = 30.0) -> None:
+    """Wait until start-up warm-up is done, as a rollout would."""
+    import httpx
+
+    deadline = time.monotonic() + timeout_s
+    while True:
+        response = httpx.get(f"{base_url}/ready", timeout=5)
+        if response.status_code == 200:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"API not ready: {response.text}")
+        time.sleep(0.05)
+
+
+@contextlib.contextmanager
+def serve_app() -> Iterator[str]:
+    """Run the API with uvicorn in a background thread; yields its base URL."""
+    import uvicorn
+
+    from app.main import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    base_url = f"http://127.0.0.1:{port}"
+    _wait_ready(base_url)
+    try:
+        yield base_url
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+
+def _run(
+    base_url: str,
+    call: Callable[[Any, int], Tuple[bool, Optional[float]]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Issue *requests* calls over *concurrency* threads (one HTTP client per thread)."""
+    import httpx
+
+    local = threading.local()
+    clients: List[Any] = []
+    latencies: List[float] = []
+    first_chunk: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=base_url, timeout=120)
+            with lock:
+                clients.append(client)
+        start = time.perf_counter()
+        try:
+            ok, ttfb = call(client, i)
+        except Exception:
+            ok, ttfb = False, None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if ttfb is not None:
+                first_chunk.append(ttfb)
+            errors += 0 if ok else 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+    for client in clients:
+        client.close()
+    return _stats(latencies, wall, errors, first_chunk)
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+
+def ingest(client: Any, i: int) -> Tuple[bool, None]:
+    r = client.post("/ingest/url", json={"url": f"https://docs.example.com/api/{i}"})
+    return r.status_code == 200 and r.json().get("status") == "success", None
+
+
+def chat(client: Any, i: int) -> Tuple[bool, None]:
+    r = client.post("/chat/", json={"user_question": RAG_QUESTIONS[i % len(RAG_QUESTIONS)], "session_id": f"chat-{i % 8}"})
+    return r.status_code == 200 and bool(r.json().get("answer")), None
+
+
+def chat_stream(client: Any, i: int) -> Tuple[bool, Optional[float]]:
+    start = time.perf_counter()
+    ttfb: Optional[float] = None
+    body = []
+    payload = {"user_question": RAG_QUESTIONS[i % len(RAG_QUESTIONS)], "session_id": f"stream-{i % 8}"}
+    with client.stream("POST", "/chat/stream", json=payload) as r:
+        for chunk in r.iter_text():
+            if chunk and ttfb is None:
+                ttfb = time.perf_counter() - start
+            body.append(chunk)
+        ok = r.status_code == 200
+    return ok and bool("".join(body)), ttfb
+
+
+def agent(client: Any, i: int) -> Tuple[bool, None]:
+    payload = {"user_question": AGENT_QUESTIONS[i % len(AGENT_QUESTIONS)], "session_id": f"agent-{i % 8}"}
+    r = client.post("/agent/", json=payload)
+    return r.status_code == 200 and bool(r.json().get("answer")), None
+
+
+SCENARIOS: Dict[str, Callable[[Any, int], Tuple[bool, Optional[float]]]] = {
+    "ingest": ingest,
+    "chat": chat,
+    "chat_stream": chat_stream,
+    "agent": agent,
+}
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], max_regression: float) -> List[str]:
+    """Return one line per latency metric that regressed beyond *max_regression*."""
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            old, new = before.get(metric), now.get(metric)
+            if old and new is not None:
+                change = (new - old) / old
+                line = f"{name}.{metric}: {old} -> {new} ms ({change:+.0%})"
+                print(line)
+                if change > max_regression:
+                    regressions.append(line)
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset")
+    parser.add_argument("--ttft-ms", type=float, default=50.0, help="stand-in model time to first token")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="stand-in model delay per token")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--history", choices=["memory", "mongomock"], default="memory")
+    parser.add_argument("--tool-cache", action="store_true", help="keep the tool-result cache on")
+    parser.add_argument("--out", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    from benchmarks.standins import install
+
+    install(
+        ttft_s=args.ttft_ms / 1000,
+        token_s=args.token_ms / 1000,
+        answer_tokens=args.answer_tokens,
+        history=args.history,
+        tool_cache=args.tool_cache,
+    )
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    with serve_app() as base_url:
+        if "ingest" not in names:
+            # Queries need a corpus; seed it without measuring.
+            _run(base_url, ingest, 4, 1)
+        scenarios = {name: _run(base_url, SCENARIOS[name], args.requests, args.concurrency) for name in names}
+
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in {"out", "compare"}},
+        "scenarios": scenarios,
+    }
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print(f"FAIL: {len(regressions)} latency regression(s) above {args.max_regression:.0%}")
+            return 1
+    return 0 if all(s["errors"] == 0 for s in results["scenarios"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Local stand-ins for Gemini, Chroma Cloud and MongoDB Atlas.
+
+`install` swaps them into the app so the real request paths (routers, RAG
+chain, ReAct agent, tools, history store) run offline and deterministically:
+
+* `LatencyChatModel` – a chat model with a configurable time-to-first-token
+  and per-token delay. Once tools are bound it makes ``tool_rounds`` tool
+  calls before answering, like a typical agent turn.
+* ``DeterministicFakeEmbedding`` – hash-based vectors (no model, no network).
+* `LocalVectorStore` – `InMemoryVectorStore` plus the Chroma ``get`` call
+  the endpoint index uses.
+* History – the in-memory store, or the Mongo store on ``mongomock``.
+
+Documents for ingestion come from `synthetic_document` instead of a URL.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import InMemoryVectorStore
+
+__all__ = ["LatencyChatModel", "LocalVectorStore", "StandIns", "install", "synthetic_document"]
+
+# Settings the app validates lazily; the stand-ins never use them.
+_DUMMY_ENV = {
+    "GEMINI_API_KEY": "offline",
+    "CHROMA_API_KEY": "offline",
+    "CHROMA_TENANT": "offline",
+    "CHROMA_DATABASE": "offline",
+    "MONGODB_URI": "mongodb://offline:27017",
+    "MONGODB_DB": "documentor_bench",
+}
+
+_WORDS = (
+    "the endpoint returns a paginated list of resources filtered by the given query "
+    "parameters and requires a bearer token in the authorization header"
+).split()
+
+
+def _text(n_tokens: int) -> List[str]:
+    return [_WORDS[i % len(_WORDS)] + " " for i in range(n_tokens)]
+
+
+class LatencyChatModel(BaseChatModel):
+    """Deterministic chat model with Gemini-like streaming latency."""
+
+    ttft_s: float = 0.05
+    token_s: float = 0.002
+    answer_tokens: int = 60
+    tool_rounds: int = 1
+    tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "LatencyChatModel":  # type: ignore[override]
+        names = [getattr(t, "name", None) or getattr(t, "__name__", str(t)) for t in tools]
+        return self.model_copy(update={"tools": names})
+
+    # -- behaviour ------------------------------------------------------------
+
+    def _tool_call(self, messages: List[BaseMessage]) -> Optional[AIMessage]:
+        if not self.tools:
+            return None
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        rounds = sum(isinstance(m, ToolMessage) for m in messages[last_human + 1:])
+        if rounds >= self.tool_rounds:
+            return None
+        tool = "knowledge_search" if "knowledge_search" in self.tools else self.tools[0]
+        question = str(messages[last_human].content) if last_human >= 0 else ""
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": tool, "args": {"question": question}, "id": f"call_{uuid.uuid4().hex[:8]}"}],
+        )
+
+    def _usage(self, messages: List[BaseMessage], output_tokens: int) -> Dict[str, int]:
+        input_tokens = sum(len(str(m.content).split()) for m in messages)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        call = self._tool_call(messages)
+        if call is not None:
+            time.sleep(self.ttft_s)
+            call.usage_metadata = self._usage(messages, 10)  # type: ignore[assignment]
+            return ChatResult(generations=[ChatGeneration(message=call)])
+        tokens = _text(self.answer_tokens)
+        time.sleep(self.ttft_s + self.token_s * len(tokens))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))  # type: ignore[arg-type]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        call = self._tool_call(messages)
+        if call is not None:
+            result = self._generate(messages, stop, run_manager, **kwargs)
+            message = result.generations[0].message
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="", tool_call_chunks=[
+                        {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": 0}
+                        for c in message.tool_calls  # type: ignore[attr-defined]
+                    ],
+                    usage_metadata=message.usage_metadata,  # type: ignore[attr-defined]
+                )
+            )
+            return
+        tokens = _text(self.answer_tokens)
+        time.sleep(self.ttft_s)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_s)
+            chunk = AIMessageChunk(content=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens)))  # type: ignore[arg-type]
+        )
+
+
+class LocalVectorStore(InMemoryVectorStore):
+    """`InMemoryVectorStore` with the subset of Chroma's ``get`` the app calls."""
+
+    def get(self, include: Optional[List[str]] = None, **_: Any) -> Dict[str, Any]:  # type: ignore[override]
+        records = list(self.store.values())
+        return {
+            "ids": [r["id"] for r in records],
+            "documents": [r["text"] for r in records],
+            "metadatas": [r["metadata"] for r in records],
+            "embeddings": [r["vector"] for r in records],
+        }
+
+
+def synthetic_document(seed: int, endpoints: int = 20, paragraphs: int = 30) -> str:
+    """Deterministic API-reference text with ``METHOD /path`` headings."""
+    verbs = ["GET", "POST", "PUT", "DELETE", "PATCH"]
+    resources = ["users", "orders", "invoices", "products", "payments", "sessions", "webhooks"]
+    sections = []
+    for i in range(endpoints):
+        verb = verbs[(seed + i) % len(verbs)]
+        resource = resources[(seed * 3 + i) % len(resources)]
+        path = f"/{resource}/{{id}}" if verb != "POST" else f"/{resource}"
+        body = " ".join(" ".join(_WORDS) for _ in range(max(1, paragraphs // endpoints)))
+        sections.append(f"{verb} {path}\n{resource.title()} operation {i} of document {seed}. {body}\n")
+    return "\n".join(sections)
+
+
+@dataclass
+class StandIns:
+    model: LatencyChatModel
+    embedder: Embeddings
+    chunks: LocalVectorStore
+    endpoints: LocalVectorStore
+
+
+def install(
+    *,
+    ttft_s: float = 0.05,
+    token_s: float = 0.002,
+    answer_tokens: int = 60,
+    tool_rounds: int = 1,
+    embedding_size: int = 256,
+    history: str = "memory",
+    tool_cache: bool = False,
+) -> StandIns:
+    """Patch the app to use local stand-ins; call before the first request."""
+    for key, value in _DUMMY_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["TOOL_CACHE_BACKEND"] = "memory" if tool_cache else "off"
+
+    import app.services.agent_engine as agent_engine
+    import app.services.embedding_service as embedding_service
+    import app.services.endpoint_index as endpoint_index
+    import app.services.ingestor as ingestor
+    import app.services.llm as llm
+    import app.services.query_engine as query_engine
+    import app.tools.cache as tool_cache_module
+    import app.tools.code_snippet_tool as code_snippet_tool
+    import app.tools.endpoint_suggester_tool as endpoint_suggester_tool
+    import app.vector.chroma_client as chroma_client
+    from app import history_store
+
+    model = LatencyChatModel(ttft_s=ttft_s, token_s=token_s, answer_tokens=answer_tokens, tool_rounds=tool_rounds)
+    # Wrapped like the Gemini embedder, so stage timings and token usage are recorded.
+    embedder = embedding_service._TimedEmbeddings(DeterministicFakeEmbedding(size=embedding_size))
+    chunks = LocalVectorStore(embedder)
+    endpoints = LocalVectorStore(embedder)
+
+    def get_chat_model(**_: Any) -> LatencyChatModel:
+        return model
+
+    for module in (llm, query_engine, agent_engine, code_snippet_tool, endpoint_suggester_tool):
+        module.get_chat_model = get_chat_model  # type: ignore[attr-defined]
+    for module in (embedding_service, endpoint_index, chroma_client):
+        module.get_embedder = lambda: embedder  # type: ignore[attr-defined]
+    chroma_client.get_vectorstore = lambda: chunks  # type: ignore[assignment]
+    chroma_client.get_endpoint_vectorstore = lambda: endpoints  # type: ignore[assignment]
+    query_engine.get_vectorstore = lambda: chunks  # type: ignore[attr-defined]
+    ingestor.parse_url = lambda url: synthetic_document(zlib.crc32(url.encode()) % 1000)  # type: ignore[assignment]
+
+    # Reset singletons that captured the real clients.
+    query_engine._get_qa_chain.cache_clear()
+    agent_engine._agent_executor = None
+    endpoint_index.get_endpoint_index().invalidate()
+    endpoint_index._embed_query.cache_clear()
+    tool_cache_module.get_tool_cache.cache_clear()
+
+    if history == "mongomock":
+        import mongomock  # type: ignore  # benchmark-only dependency
+
+        import app.mongo as mongo
+
+        mongo._sync_client = mongomock.MongoClient()
+        os.environ["HISTORY_BACKEND"] = "mongo"
+    else:
+        os.environ["HISTORY_BACKEND"] = "memory"
+    history_store.get_history_store.cache_clear()
+
+    return StandIns(model, embedder, chunks, endpoints)
@@ -0,0 +1,107 @@
+"""Start-up (import-time) budget check for the API.
+
+Imports ``app.main`` in fresh interpreters with all outbound network access
+disabled and fails when
+
+* any module tries to open a socket or resolve a host at import time, or
+* the median import time exceeds the budget.
+
+Usage (from the ``backend`` directory)::
+
+    python -m benchmarks.startup                 # default budget
+    python -m benchmarks.startup --budget-ms 800 --runs 7
+
+The budget can also be set with ``STARTUP_BUDGET_MS``. Exit code is 0 when the
+budget holds, 1 otherwise, so the script can gate CI.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_BUDGET_MS = 1500.0
+
+# Executed in the child interpreter: block the network, then time the import.
+_PROBE = """
+import json, socket, sys, time
+
+class NetworkAtImportError(RuntimeError):
+    pass
+
+def _blocked(*args, **kwargs):
+    raise NetworkAtImportError("network I/O attempted at import time: %r" % (args[:2],))
+
+socket.socket.connect = _blocked
+socket.socket.connect_ex = _blocked
+socket.create_connection = _blocked
+socket.getaddrinfo = _blocked
+
+start = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": elapsed_ms, "modules": len(sys.modules)}}))
+"""
+
+
+def _run_once(module: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main", help="module to import (default: app.main)")
+    parser.add_argument("--runs", type=int, default=5, help="number of cold imports to time")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+        help="maximum allowed median import time in milliseconds",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        samples = [_run_once(args.module) for _ in range(args.runs)]
+    except RuntimeError as exc:
+        print(f"FAIL: importing {args.module} failed: {exc}")
+        return 1
+
+    timings = sorted(s["import_ms"] for s in samples)
+    median = statistics.median(timings)
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(median, 1),
+        "min_ms": round(timings[0], 1),
+        "max_ms": round(timings[-1], 1),
+        "modules_loaded": samples[-1]["modules"],
+        "budget_ms": args.budget_ms,
+    }
+    print(json.dumps(result, indent=2))
+
+    if median > args.budget_ms:
+        print(f"FAIL: median import time {median:.0f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        return 1
+    print("OK: start-up budget respected and no network I/O at import time")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 """Initialise MongoDB indexes for the chat history store.
 
-Run once after provisioning a new environment:
+Run once after provisioning a new environment (and again after changing
+``HISTORY_TTL_DAYS``):
 
     python -m backend.scripts.init_indexes
 
@@ -22,11 +23,29 @@ load_dotenv(dotenv_path=env_path)
 
 MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = os.getenv("MONGODB_DB", "documentor")
+TTL_DAYS = float(os.getenv("HISTORY_TTL_DAYS", "0"))
+TTL_INDEX = "created_at_ttl"
 
 if not MONGODB_URI:
     raise RuntimeError("MONGODB_URI not set – cannot connect to Atlas")
 
 
+async def ensure_ttl(db, coll) -> None:
+    """Create, update or drop the TTL index to match ``HISTORY_TTL_DAYS``."""
+    existing = (await coll.index_information()).get(TTL_INDEX)
+    if TTL_DAYS <= 0:
+        if existing:
+            await coll.drop_index(TTL_INDEX)
+            print("• TTL index dropped (HISTORY_TTL_DAYS=0)")
+        return
+    seconds = int(TTL_DAYS * 86400)
+    if existing is None:
+        await coll.create_index("created_at", name=TTL_INDEX, expireAfterSeconds=seconds)
+    elif existing.get("expireAfterSeconds") != seconds:
+        await db.command("collMod", coll.name, index={"name": TTL_INDEX, "expireAfterSeconds": seconds})
+    print(f"• TTL index: messages expire after {TTL_DAYS:g} days")
+
+
 async def main():
     client = AsyncIOMotorClient(MONGODB_URI)
     db = client[DATABASE_NAME]
@@ -34,17 +53,23 @@ async def main():
     # Collection choice: flat `messages` collection (one doc per message).
     coll = db["messages"]
 
-    # 1) Compound index to optimise session look-ups and ordering by insertion.
-    # Order 1 = ASC, we also add created_at so queries can use sort.
-    await coll.create_index([("session_id", 1), ("created_at", 1)])
+    # 1) Compound index for session look-ups in insertion order. The trailing
+    #    _id makes it unique per message, so paginated reads (`get_page`) and
+    #    the overflow scan of the per-session cap are pure index walks.
+    await coll.create_index([("session_id", 1), ("created_at", 1), ("_id", 1)])
+
+    # 2) Retention: TTL index on created_at (HISTORY_TTL_DAYS, 0 = keep forever).
+    await ensure_ttl(db, coll)
+
+    # 3) Archive of messages beyond HISTORY_MAX_MESSAGES, read per session.
+    await db["messages_archive"].create_index([("session_id", 1), ("created_at", 1)])
 
-    # 2) Optional TTL index (disabled by default) – uncomment if you wish to
-    #    auto-purge old messages.
-    # await coll.create_index("created_at", expireAfterSeconds=60*60*24*30)
+    # 4) Token usage (TOKEN_USAGE_BACKEND=mongo), aggregated per session.
+    await db["token_usage"].create_index([("session_id", 1), ("component", 1)])
 
-    print("✅ MongoDB indexes ensured for collection 'messages'")
+    print("✅ MongoDB indexes ensured for collections 'messages', 'messages_archive' and 'token_usage'")
     client.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""Shared fixtures.
+
+Tests never reach Gemini, Chroma Cloud or Atlas: app-level tests run against
+the offline stand-ins from `benchmarks.standins`, and local caches are kept
+in a temporary directory.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+_CACHE_DIR = tempfile.mkdtemp(prefix="documentor-tests-")
+for key, value in {
+    "GEMINI_API_KEY": "offline",
+    "CHROMA_API_KEY": "offline",
+    "CHROMA_TENANT": "offline",
+    "CHROMA_DATABASE": "offline",
+    "MONGODB_URI": "mongodb://offline:27017",
+    "MONGODB_DB": "documentor_test",
+    "HISTORY_BACKEND": "memory",
+    "TOOL_CACHE_BACKEND": "off",
+    "TOOL_CACHE_PATH": os.path.join(_CACHE_DIR, "tool_cache.sqlite3"),
+    "TOKEN_USAGE_BACKEND": "sqlite",
+    "TOKEN_USAGE_SQLITE_PATH": os.path.join(_CACHE_DIR, "usage.sqlite3"),
+    "HISTORY_SQLITE_PATH": os.path.join(_CACHE_DIR, "history.sqlite3"),
+}.items():
+    os.environ.setdefault(key, value)
+
+
+@pytest.fixture(scope="session")
+def standins():
+    """Swap the offline model, embedder and vector store into the app."""
+    from benchmarks.standins import install
+
+    return install(ttft_s=0.0, token_s=0.0, answer_tokens=12)
+
+
+@pytest.fixture(scope="session")
+def client(standins):
+    """Test client over the stand-ins, with a small corpus ingested."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    test_client = TestClient(app)
+    response = test_client.post("/ingest/url", json={"url": "https://docs.example.com/api/users"})
+    assert response.status_code == 200, response.text
+    return test_client
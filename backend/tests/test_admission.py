@@ -0,0 +1,111 @@
+import asyncio
+
+from app.services.admission import Gate, route_class
+
+
+def test_route_classes():
+    assert route_class("/chat/") == "chat"
+    assert route_class("/chat/stream") == "chat"
+    assert route_class("/agent/") == "agent"
+    assert route_class("/agent/postman") is None
+    assert route_class("/ingest/url") == "ingest"
+    assert route_class("/history/s1") is None
+
+
+def test_gate_admits_queues_and_sheds():
+    async def scenario():
+        gate = Gate("test", limit=1, queue=1, queue_timeout_s=1.0)
+        assert await gate.acquire() is None
+        queued = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert await gate.acquire() == "queue_full"
+        gate.release(0.5)  # the slot moves to the queued request
+        assert await queued is None
+        assert gate.active == 1
+        gate.release(0.5)
+        assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_gate_queue_timeout_and_retry_after():
+    async def scenario():
+        gate = Gate("test", limit=1, queue=4, queue_timeout_s=0.05)
+        assert await gate.acquire() is None
+        assert await gate.acquire() == "queue_timeout"
+        assert not gate._waiters
+        assert gate.retry_after() >= 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        gate = Gate("test", limit=1, queue=4, queue_timeout_s=5)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert not gate._waiters
+        gate.release(None)
+        assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_app_sheds_ingest_overload_but_still_admits_chat(client, monkeypatch):
+    import threading
+
+    import httpx
+
+    from app.main import app
+    from app.routers import ingest_router
+    from app.services.admission import get_gate
+
+    gate = get_gate("ingest")
+    monkeypatch.setattr(gate, "limit", 1)
+    monkeypatch.setattr(gate, "max_queue", 1)
+    monkeypatch.setattr(gate, "queue_timeout_s", 5.0)
+    release = threading.Event()
+    monkeypatch.setattr(ingest_router, "ingest_url", lambda url: release.wait(5) and {"chunks": 0})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            def ingest():
+                return http.post("/ingest/url", json={"url": "https://docs.example.com/x"})
+
+            held = [asyncio.create_task(ingest()) for _ in range(gate.limit + gate.max_queue)]
+            for _ in range(500):  # until one request runs and one waits
+                if gate.active == gate.limit and len(gate._waiters) == gate.max_queue:
+                    break
+                await asyncio.sleep(0.01)
+            shed = await ingest()
+            chat = await http.post("/chat/", json={"user_question": "How do I list users?", "session_id": "adm"})
+            release.set()
+            return shed, chat, await asyncio.gather(*held)
+
+    shed, chat, held = asyncio.run(scenario())
+    assert shed.status_code == 503 and int(shed.headers["retry-after"]) >= 1
+    assert chat.status_code == 200
+    assert [r.status_code for r in held] == [200, 200]
+    assert gate.active == 0
+
+
+def test_preflight_is_not_gated_and_rejections_carry_cors_headers(client, monkeypatch):
+    from app.services.admission import get_gate
+
+    gate = get_gate("chat")
+    monkeypatch.setattr(gate, "active", gate.limit)  # every slot taken
+    monkeypatch.setattr(gate, "max_queue", 0)
+    origin = {"Origin": "https://app.example.com"}
+
+    preflight = client.options(
+        "/chat/", headers={**origin, "Access-Control-Request-Method": "POST"}
+    )
+    assert preflight.status_code == 200
+
+    shed = client.post("/chat/", json={"user_question": "hi", "session_id": "adm-cors"}, headers=origin)
+    assert shed.status_code == 503
+    assert "access-control-allow-origin" in shed.headers
@@ -0,0 +1,14 @@
+def test_source_refs_are_documented_in_openapi(client):
+    schema = client.get("/openapi.json").json()["components"]["schemas"]["SourceRef"]
+    assert schema["properties"]["start"]["description"].startswith("Offset of the chunk")
+    assert schema["required"] == ["id"]
+
+
+def test_chat_response_leaves_out_unset_fields(client):
+    response = client.post("/chat/", json={"user_question": "How do I list users?", "session_id": "refs"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert "usage" not in body
+    assert body["sources"]
+    for ref in body["sources"]:
+        assert "id" in ref and "text" not in ref and None not in ref.values()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.deadline import (
+    DeadlineExceeded,
+    RequestBudget,
+    budget_context,
+    call_with_deadline,
+    current_budget,
+    iter_with_deadline,
+)
+
+
+def test_budget_for_route_reads_env(monkeypatch):
+    monkeypatch.setenv("AGENT_TIMEOUT_S", "12")
+    monkeypatch.setenv("AGENT_MAX_STEPS", "3")
+    budget = RequestBudget.for_route("agent")
+    assert (budget.timeout_s, budget.max_steps) == (12.0, 3)
+    assert RequestBudget.for_route("chat").max_steps == 0
+
+
+def test_budget_is_visible_on_the_worker_thread():
+    budget = RequestBudget(route="chat", timeout_s=5)
+    assert current_budget() is None
+    assert call_with_deadline(current_budget, budget, "stage") is budget
+    assert budget_context(budget).run(current_budget) is budget
+    assert current_budget() is None
+
+
+def test_call_with_deadline_raises_when_the_worker_is_too_slow():
+    budget = RequestBudget(route="chat", timeout_s=0.05)
+    release = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as info:
+        call_with_deadline(lambda: release.wait(5), budget, "llm")
+    release.set()
+    assert info.value.stage == "llm"
+    assert time.monotonic() - start < 1
+
+
+def test_expired_budget_fails_before_starting_work():
+    budget = RequestBudget(route="chat", timeout_s=1, started=time.monotonic() - 2)
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline(lambda: pytest.fail("must not run"), budget, "retrieval")
+
+
+def test_iter_with_deadline_keeps_partial_output():
+    def slow():
+        yield "a"
+        yield "b"
+        time.sleep(1)
+        yield "c"
+
+    budget = RequestBudget(route="chat", timeout_s=0.2)
+    seen = []
+    with pytest.raises(DeadlineExceeded) as info:
+        for item in iter_with_deadline(slow, budget, "llm"):
+            seen.append(item)
+    assert seen == ["a", "b"]
+    assert info.value.partial == ["a", "b"]
+
+
+def test_iter_with_deadline_forwards_producer_errors():
+    def broken():
+        yield 1
+        raise ValueError("boom")
+
+    budget = RequestBudget(route="chat", timeout_s=5)
+    with pytest.raises(ValueError, match="boom"):
+        list(iter_with_deadline(broken, budget, "llm"))
+
+
+def test_nested_work_runs_inline_and_cannot_starve_the_pool(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from contextvars import copy_context
+
+    from app.utils import deadline
+
+    monkeypatch.setattr(deadline, "_DEADLINE_POOL", ThreadPoolExecutor(max_workers=1))
+    budget = RequestBudget(route="agent", timeout_s=2)
+
+    def tool():
+        # Like an agent tool: a thread started by the worker, running the RAG stream.
+        return list(iter_with_deadline(lambda: iter("abc"), budget, "llm")), threading.current_thread()
+
+    def agent():
+        with ThreadPoolExecutor(max_workers=1) as tools:
+            chunks, tool_thread = tools.submit(copy_context().run, tool).result()
+        return chunks, tool_thread, call_with_deadline(threading.current_thread, budget, "nested")
+
+    outer = list(iter_with_deadline(lambda: [call_with_deadline(agent, budget, "agent")], budget, "agent"))
+    chunks, tool_thread, nested_thread = outer[0]
+    assert chunks == ["a", "b", "c"]
+    assert tool_thread is not nested_thread  # the tool ran on its own thread, inline
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from app.services.endpoint_index import EndpointIndex, EndpointRecord, _Snapshot, extract_endpoints, rank_lexically
+
+
+class _Loader:
+    """Stand-in for `EndpointIndex._load` with scripted results."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.gate = None  # threading.Event the load waits on
+
+    def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ConnectionError("chroma down")
+        return _Snapshot([EndpointRecord("GET", f"/v{self.calls}")], None)
+
+
+def _index(loader, **kwargs):
+    index = EndpointIndex(**kwargs)
+    index._load = loader
+    return index
+
+
+def test_stale_snapshot_is_served_while_one_caller_reloads():
+    loader = _Loader()
+    index = _index(loader, ttl_seconds=0.01)
+    assert index.snapshot().records[0].path == "/v1"
+    time.sleep(0.02)
+
+    loader.gate = threading.Event()
+    reloading = threading.Thread(target=index.snapshot)
+    reloading.start()
+    while loader.calls < 2:
+        time.sleep(0.001)
+    start = time.monotonic()
+    assert index.snapshot().records[0].path == "/v1"  # not blocked by the reload
+    assert time.monotonic() - start < 0.5
+    loader.gate.set()
+    reloading.join(5)
+    assert index.snapshot().records[0].path == "/v2"
+    assert loader.calls == 2
+
+
+def test_failed_load_keeps_the_stale_snapshot_and_retries_soon():
+    loader = _Loader()
+    index = _index(loader, ttl_seconds=0.01, retry_seconds=0.05)
+    index.snapshot()
+    time.sleep(0.02)
+    loader.fail = True
+    assert index.snapshot().records[0].path == "/v1"
+    calls = loader.calls
+    assert index.snapshot().records[0].path == "/v1"
+    assert loader.calls == calls  # not retried on every request
+    loader.fail = False
+    time.sleep(0.06)
+    assert index.snapshot().records[0].path.startswith("/v")
+    assert loader.calls == calls + 1
+
+
+def test_first_load_failure_behaves_as_empty():
+    loader = _Loader()
+    loader.fail = True
+    index = _index(loader, retry_seconds=60)
+    assert index.snapshot().records == []
+    assert len(index) == 0 and loader.calls == 1
+
+
+def test_invalidate_during_a_load_forces_another_reload():
+    loader = _Loader()
+    index = _index(loader, ttl_seconds=60)
+    loader.gate = threading.Event()
+    first = threading.Thread(target=index.snapshot)
+    first.start()
+    while loader.calls < 1:
+        time.sleep(0.001)
+    index.invalidate()  # e.g. ingestion finished while the snapshot was loading
+    loader.gate.set()
+    first.join(5)
+    loader.gate = None
+    assert index.snapshot().records[0].path == "/v2"
+
+
+def test_extract_and_rank_lexically():
+    records = extract_endpoints("Use POST /users to create a user. GET /users/{id} returns one user.")
+    assert [r.key for r in records] == ["POST /users", "GET /users/{id}"]
+    assert rank_lexically("how do I create a new user", records)[0].record.key == "POST /users"
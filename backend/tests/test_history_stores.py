@@ -0,0 +1,176 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.history_store import InMemoryHistoryStore, InvalidCursor
+
+
+def _memory_store(tmp_path, monkeypatch):
+    return InMemoryHistoryStore()
+
+
+def _sqlite_store(tmp_path, monkeypatch):
+    from app.history_store_sqlite import SQLiteHistoryStore
+
+    return SQLiteHistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def _mongo_store(tmp_path, monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    import app.mongo as mongo
+    from app.history_store_mongo import MongoHistoryStore
+
+    monkeypatch.setattr(mongo, "_sync_client", mongomock.MongoClient())
+    return MongoHistoryStore(db_name="documentor_test")
+
+
+@pytest.fixture(params=[_memory_store, _sqlite_store, _mongo_store], ids=["memory", "sqlite", "mongo"])
+def make_store(request, tmp_path, monkeypatch):
+    stores = []
+
+    def make(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        store = request.param(tmp_path, monkeypatch)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        close = getattr(store, "close", None)
+        if close is not None:
+            close()
+
+
+def _conversation(n):
+    return [HumanMessage(content=f"q{i}") if i % 2 == 0 else AIMessage(content=f"a{i}") for i in range(n)]
+
+
+def test_appends_are_read_back_in_order(make_store):
+    store = make_store()
+    history = store.get("s1")
+    history.add_messages(_conversation(4))
+    history.add_messages([HumanMessage(content="q4")])
+    # A fresh handle must see the writes (read-your-writes through the buffer).
+    assert [m.content for m in store.get("s1").messages] == ["q0", "a1", "q2", "a3", "q4"]
+    assert store.get("other").messages == []
+
+
+def _archived(store, session_id):
+    """Archived messages of *session_id* (None for the memory store, which has no archive)."""
+    if hasattr(store, "_archive"):
+        return store._archive.count_documents({"session_id": session_id})
+    if hasattr(store, "_conn"):
+        return store._conn().execute(
+            "SELECT COUNT(*) FROM messages_archive WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+    return None
+
+
+def test_clear_removes_only_that_session(make_store):
+    store = make_store(HISTORY_MAX_MESSAGES=2)
+    for session_id in ("s1", "s2"):
+        history = store.get(session_id)
+        for message in _conversation(4):
+            history.add_messages([message])
+        store.get(session_id)  # flush, so the overflow is archived
+    assert _archived(store, "s1") in (None, 2)
+    store.clear("s1")
+    assert store.get("s1").messages == []
+    assert _archived(store, "s1") in (None, 0)
+    assert len(store.get("s2").messages) == 2
+    assert _archived(store, "s2") in (None, 2)
+
+
+def test_pages_walk_back_with_cursors(make_store):
+    store = make_store()
+    history = store.get("s1")
+    for message in _conversation(7):  # separate appends, like separate turns
+        history.add_messages([message])
+
+    contents, cursor, pages = [], None, 0
+    while True:
+        page = store.get_page("s1", limit=3, before=cursor)
+        contents[:0] = [m.content for m in page.messages]
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert pages == 3
+    assert contents == [m.content for m in _conversation(7)]
+
+
+def test_invalid_cursor_is_rejected(make_store):
+    store = make_store()
+    store.get("s1").add_messages(_conversation(2))
+    with pytest.raises(InvalidCursor):
+        store.get_page("s1", limit=1, before="not-a-cursor")
+
+
+def test_sessions_keep_their_newest_messages(make_store):
+    store = make_store(HISTORY_MAX_MESSAGES=4)
+    history = store.get("s1")
+    for message in _conversation(6):
+        history.add_messages([message])
+    assert [m.content for m in store.get("s1").messages] == ["q2", "a3", "q4", "a5"]
+
+
+def test_history_endpoint_pages(client):
+    from app.history_store import get_history_store
+
+    get_history_store().get("paged").add_messages(_conversation(5))
+    first = client.get("/history/paged", params={"limit": 2}).json()
+    assert [m["content"] for m in first["messages"]] == ["a3", "q4"]
+    second = client.get("/history/paged", params={"limit": 2, "before": first["next_cursor"]}).json()
+    assert [m["content"] for m in second["messages"]] == ["a1", "q2"]
+    assert client.get("/history/paged", params={"before": "x"}).status_code == 400
+
+
+def _mongo_replicas(monkeypatch, **env):
+    """Two Mongo stores sharing one (mock) database, like two API replicas."""
+    mongomock = pytest.importorskip("mongomock")
+    import app.mongo as mongo
+    from app.history_store_mongo import MongoHistoryStore
+
+    for key, value in env.items():
+        monkeypatch.setenv(key, str(value))
+    monkeypatch.setattr(mongo, "_sync_client", mongomock.MongoClient())
+    return MongoHistoryStore(db_name="documentor_test"), MongoHistoryStore(db_name="documentor_test")
+
+
+def test_mongo_cache_notices_a_clear_on_another_replica(monkeypatch):
+    a, b = _mongo_replicas(monkeypatch, HISTORY_WRITE_BEHIND="false")
+    a.get("s1").add_messages(_conversation(4))
+    assert len(a.get("s1").messages) == 4  # cached on replica a
+    b.clear("s1")
+    b.get("s1").add_messages([HumanMessage(content="fresh")])
+    assert [m.content for m in a.get("s1").messages] == ["fresh"]
+
+
+def test_mongo_late_flush_is_seen_by_another_replica(monkeypatch):
+    from datetime import timedelta
+
+    a, b = _mongo_replicas(monkeypatch, HISTORY_FLUSH_INTERVAL_MS=60_000)
+    b.get("s1").add_messages([HumanMessage(content="q0")])
+    assert [m.content for m in b.get("s1").messages] == ["q0"]  # b's watermark is set
+    a.get("s1").add_messages([AIMessage(content="late")])  # queued on a, flushed later
+    queued = a._buffer._queues["s1"][0]
+    queued["created_at"] -= timedelta(minutes=10)  # as if it had waited through retries
+    a.close()
+    assert [m.content for m in b.get("s1").messages] == ["q0", "late"]
+    b.close()
+
+
+def test_mongo_cache_is_reloaded_after_its_ttl(monkeypatch):
+    a, b = _mongo_replicas(monkeypatch, HISTORY_WRITE_BEHIND="false", HISTORY_CACHE_TTL_S=0)
+    a.get("s1").add_messages(_conversation(2))
+    a.get("s1")
+    b._coll.update_many({}, {"$set": {"message.data.content": "edited"}})
+    assert {m.content for m in a.get("s1").messages} == {"edited"}
+
+
+def test_mongo_cap_is_enforced_whatever_this_replica_has_cached(monkeypatch):
+    a, b = _mongo_replicas(monkeypatch, HISTORY_WRITE_BEHIND="false", HISTORY_MAX_MESSAGES=4)
+    a.get("s1").add_messages(_conversation(1))  # a has cached one message
+    b.get("s1").add_messages(_conversation(4)[1:])  # the session is now at the cap
+    a.append_many("s1", [HumanMessage(content="q4")])
+    assert a._coll.count_documents({"session_id": "s1"}) == 4
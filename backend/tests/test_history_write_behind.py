@@ -0,0 +1,139 @@
+import threading
+
+from app.history_write_behind import WriteBehindBuffer
+
+
+class _Sink:
+    """flush_fn recording every batch; fails while ``failing`` is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+        self.lock = threading.Lock()
+
+    def __call__(self, docs):
+        if self.failing:
+            raise RuntimeError("store down")
+        with self.lock:
+            self.batches.append(list(docs))
+
+    @property
+    def written(self):
+        return [doc for batch in self.batches for doc in batch]
+
+
+class _PartialWrite(Exception):
+    def __init__(self, inserted):
+        super().__init__("partial")
+        self.details = {"nInserted": inserted}
+
+
+def _buffer(sink, **kwargs):
+    kwargs.setdefault("max_batch", 1000)
+    kwargs.setdefault("interval_s", 60)
+    return WriteBehindBuffer(sink, name="test", **kwargs)
+
+
+def test_append_is_buffered_until_flush():
+    sink = _Sink()
+    buf = _buffer(sink)
+    buf.append("s", [{"n": 1}, {"n": 2}])
+    assert sink.written == []
+    assert buf.pending("s") == 2 and buf.needs_flush("s")
+    assert buf.flush()
+    assert sink.written == [{"n": 1}, {"n": 2}]
+    assert len(buf) == 0
+    buf.close()
+
+
+def test_flush_session_only_writes_that_session():
+    sink = _Sink()
+    buf = _buffer(sink)
+    buf.append("a", [{"n": 1}])
+    buf.append("b", [{"n": 2}])
+    buf.flush_session("a")
+    assert sink.written == [{"n": 1}]
+    assert buf.pending("b") == 1
+    buf.close()
+    assert sink.written == [{"n": 1}, {"n": 2}]
+
+
+def test_failed_batch_is_requeued_in_front_of_newer_docs():
+    sink = _Sink()
+    buf = _buffer(sink)
+    buf.append("s", [{"n": 1}, {"n": 2}])
+    sink.failing = True
+    assert not buf.flush()
+    buf.append("s", [{"n": 3}])
+    sink.failing = False
+    assert buf.flush()
+    assert [doc["n"] for doc in sink.written] == [1, 2, 3]
+    buf.close()
+
+
+def test_partial_write_retries_only_the_tail():
+    calls = []
+
+    def flush_fn(docs):
+        calls.append([doc["n"] for doc in docs])
+        if len(calls) == 1:
+            raise _PartialWrite(inserted=2)
+
+    buf = _buffer(flush_fn)
+    buf.append("a", [{"n": 1}])
+    buf.append("b", [{"n": 2}, {"n": 3}])
+    assert not buf.flush()
+    assert buf.pending("a") == 0 and buf.pending("b") == 1
+    assert buf.flush()
+    assert calls == [[1, 2, 3], [3]]
+    buf.close()
+
+
+def test_background_thread_flushes_on_interval():
+    sink = _Sink()
+    buf = _buffer(sink, interval_s=0.01)
+    buf.append("s", [{"n": 1}])
+    for _ in range(200):
+        if sink.written:
+            break
+        threading.Event().wait(0.01)
+    assert sink.written == [{"n": 1}]
+    buf.close()
+
+
+def test_close_writes_remaining_and_later_appends_go_straight_through():
+    sink = _Sink()
+    buf = _buffer(sink)
+    buf.append("s", [{"n": 1}])
+    buf.close()
+    assert sink.written == [{"n": 1}]
+    buf.append("s", [{"n": 2}])
+    assert sink.written == [{"n": 1}, {"n": 2}]
+
+
+def test_memory_stays_bounded_while_the_store_is_failing():
+    from app.history_write_behind import DROPPED
+
+    attempts = []
+
+    def failing(docs):
+        attempts.append(len(docs))
+        raise RuntimeError("store down")
+
+    def dropped():
+        return DROPPED.samples().get((("buffer", "bounded"),), 0)
+
+    before = dropped()
+    buf = WriteBehindBuffer(failing, name="bounded", max_batch=1000, interval_s=60, max_pending=100)
+    try:
+        for i in range(2000):
+            buf.append("old" if i < 50 else "new", [{"n": i}])
+            assert len(buf) < 100
+        # One synchronous attempt, then none until interval_s has passed.
+        assert len(attempts) == 1
+        assert dropped() - before == 2000 - len(buf)
+        # The session queued longest lost its documents first.
+        assert buf.pending("old") == 0
+        assert [doc["n"] for doc in buf._queues["new"]][-1] == 1999
+    finally:
+        buf._closed = True  # skip the flush-on-close retries against a store that is down
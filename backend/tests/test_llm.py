@@ -0,0 +1,72 @@
+import pytest
+
+
+class _Client:
+    """Stand-in for the Gemini client; records the keyword arguments of each call."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def _response(self, output_tokens):
+        from google.ai.generativelanguage_v1beta.types import GenerateContentResponse
+
+        return GenerateContentResponse(
+            {
+                "candidates": [{"content": {"parts": [{"text": f"t{output_tokens}"}], "role": "model"}}],
+                "usage_metadata": {
+                    "prompt_token_count": 3,
+                    "candidates_token_count": output_tokens,
+                    "total_token_count": 3 + output_tokens,
+                },
+            }
+        )
+
+    def generate_content(self, request, **kwargs):
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return self._response(1)
+
+    def stream_generate_content(self, request, **kwargs):
+        self.calls.append(kwargs)
+        return iter([self._response(1), self._response(2)])
+
+
+@pytest.fixture
+def model():
+    from app.services.llm import _rate_limited_model_class
+
+    return _rate_limited_model_class()(model="gemini-2.5-flash", google_api_key="offline", timeout=3)
+
+
+def test_building_the_model_does_not_patch_the_sdk():
+    from langchain_google_genai import chat_models
+
+    from app.services.llm import _rate_limited_model_class
+
+    before = chat_models._create_retry_decorator
+    _rate_limited_model_class.cache_clear()
+    _rate_limited_model_class()
+    assert chat_models._create_retry_decorator is before
+
+
+def test_calls_go_to_the_client_without_sdk_retries(model):
+    from google.api_core.exceptions import InvalidArgument
+
+    model.client = _Client()
+    assert model.invoke("hello").content == "t1"
+    assert model.client.calls == [{"retry": None, "timeout": 3.0, "metadata": ()}]
+
+    model.client = _Client(error=InvalidArgument("bad request"))
+    with pytest.raises(InvalidArgument):
+        model.invoke("hello")
+    assert len(model.client.calls) == 1  # the SDK's helper would have tried twice
+
+
+def test_stream_reports_usage_per_chunk(model):
+    model.client = _Client()
+    chunks = list(model.stream("hello"))
+    assert [c.content for c in chunks] == ["t1", "t2"]
+    assert [c.usage_metadata["output_tokens"] for c in chunks] == [1, 1]
+    assert [c.usage_metadata["input_tokens"] for c in chunks] == [3, 0]
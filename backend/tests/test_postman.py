@@ -0,0 +1,15 @@
+import json
+
+
+def test_postman_download_with_non_ascii_name(client):
+    response = client.post(
+        "/agent/postman",
+        json={"name": "Café API", "endpoints": ["GET /users", "POST /users/{id}"]},
+    )
+    assert response.status_code == 200
+    disposition = response.headers["content-disposition"]
+    assert 'filename="Caf__API.postman_collection.json"' in disposition
+    assert "filename*=UTF-8''Caf%C3%A9%20API.postman_collection.json" in disposition
+    collection = json.loads(response.content)
+    assert collection["info"]["name"] == "Café API"
+    assert len(collection["item"]) >= 1
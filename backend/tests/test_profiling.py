@@ -0,0 +1,26 @@
+import threading
+
+from app.services.profiling import ProfileSession
+
+
+def test_stop_waits_for_the_sampler_before_stacks_are_read():
+    session = ProfileSession(id="t", trigger="test", interval_s=0.001)
+    in_sample = threading.Event()
+    release = threading.Event()
+
+    def slow_sample():
+        in_sample.set()
+        release.wait(5)
+        session.stacks["late;sample"] += 1
+
+    session._sample = slow_sample
+    session.start()
+    assert in_sample.wait(5)
+    stopper = threading.Thread(target=session.stop)
+    stopper.start()
+    stopper.join(0.05)
+    assert stopper.is_alive()  # still inside a sample
+    release.set()
+    stopper.join(5)
+    assert not session._sampler.is_alive()
+    assert dict(session.stacks) == {"late;sample": 1}  # safe to iterate now
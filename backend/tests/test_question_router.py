@@ -0,0 +1,53 @@
+import pytest
+
+from app.services import question_router
+from app.services.question_router import Route, route_question
+
+
+@pytest.fixture(autouse=True)
+def fresh_sessions(monkeypatch):
+    monkeypatch.setattr(question_router, "_agent_sessions", question_router.OrderedDict())
+
+
+@pytest.mark.parametrize(
+    "question, route, matched",
+    [
+        ("What parameters does POST /orders accept?", Route.RAG, ()),
+        ("How do I authenticate requests?", Route.RAG, ()),
+        ("Rate limits?", Route.RAG, ()),
+        ("What does the 404 code mean", Route.RAG, ()),
+        ("Which status code does DELETE /users return?", Route.RAG, ()),
+        ("How do I paginate the users collection endpoint?", Route.RAG, ()),
+        ("Let's go through the auth flow step by step", Route.RAG, ()),
+        ("Write a python snippet for GET /users", Route.AGENT, ("code",)),
+        ("Can you show the same thing in Go please", Route.AGENT, ("code",)),
+        ("And in ruby?", Route.AGENT, ("code",)),
+        ("Show me the C# version", Route.AGENT, ("code",)),
+        ("Show me some code for creating an order", Route.AGENT, ("code",)),
+        ("Generate a Postman collection for the users API", Route.AGENT, ("postman",)),
+        ("Which endpoint should I use to delete a user?", Route.AGENT, ("endpoint_suggestion",)),
+        ("Build an integration that creates invoices", Route.AGENT, ("generation",)),
+    ],
+)
+def test_decisions(question, route, matched):
+    decision = route_question(question, session_id=f"table-{question}")
+    assert decision.route is route, decision
+    assert decision.matched == matched
+
+
+def test_follow_up_of_an_agent_turn_stays_with_the_agent():
+    assert route_question("Write a curl example for GET /users", "s").route is Route.AGENT
+    decision = route_question("Now do the same for orders", "s")
+    assert (decision.route, decision.reason) == (Route.AGENT, "follow_up")
+    # A plain lookup in between hands the session back to RAG.
+    assert route_question("What fields does an order have?", "s").route is Route.RAG
+    assert route_question("Explain that again", "s").route is Route.RAG
+
+
+def test_follow_up_without_an_agent_turn_uses_rag():
+    assert route_question("Do the same for orders", "fresh").route is Route.RAG
+
+
+def test_disabled_fast_path_always_uses_the_agent(monkeypatch):
+    monkeypatch.setenv("AGENT_FAST_PATH_ENABLED", "false")
+    assert route_question("How do I authenticate requests?").reason == "fast_path_disabled"
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import AdaptiveLimiter, RateLimitTimeout, current_priority, priority
+from app.utils.deadline import RequestBudget, budget_context
+
+
+class _Upstream(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: 0.0)
+
+
+def test_priority_defaults_to_interactive_inside_a_request():
+    assert current_priority() == "batch"
+    assert budget_context(RequestBudget(route="chat", timeout_s=5)).run(current_priority) == "interactive"
+    with priority("ingest"):
+        assert current_priority() == "ingest"
+    with pytest.raises(ValueError):
+        with priority("urgent"):
+            pass
+
+
+def test_throttled_and_transient_errors_are_retried():
+    limiter = AdaptiveLimiter("test", max_concurrency=4, max_retries=3)
+    failures = [_Upstream(429), _Upstream(503)]
+
+    def call():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert limiter.call(call) == "ok"
+    assert limiter.active == 0
+
+
+def test_other_errors_and_exhausted_retries_are_raised():
+    limiter = AdaptiveLimiter("test", max_concurrency=4, max_retries=2)
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise _Upstream(400)
+
+    with pytest.raises(_Upstream):
+        limiter.call(bad_request)
+    assert len(attempts) == 1
+
+    def always_throttled():
+        attempts.append(1)
+        raise _Upstream(429)
+
+    with pytest.raises(_Upstream):
+        limiter.call(always_throttled)
+    assert len(attempts) == 1 + 3  # first try plus two retries
+
+
+def test_window_halves_on_throttling_and_grows_back():
+    limiter = AdaptiveLimiter("test", max_concurrency=8)
+    limiter.acquire("interactive", None)
+    limiter.release("throttled", 0.1)
+    assert limiter.window == 4
+    for _ in range(40):
+        limiter.acquire("interactive", None)
+        limiter.release("ok", 0.1)
+    assert limiter.window == 8
+
+
+def test_slow_calls_shrink_the_window():
+    limiter = AdaptiveLimiter("test", max_concurrency=10, latency_target_s=0.5)
+    limiter.acquire("interactive", None)
+    limiter.release("ok", 2.0)
+    assert limiter.window == pytest.approx(9.0)
+
+
+def test_background_calls_use_only_their_share():
+    limiter = AdaptiveLimiter("test", max_concurrency=4, background_share=0.5)
+    limiter.acquire("batch", 0.1)
+    limiter.acquire("batch", 0.1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("batch", 0.05)
+    limiter.acquire("interactive", 0.1)  # interactive callers still get in
+    assert limiter.active == 3
+
+
+def test_waiting_interactive_call_goes_before_batch():
+    limiter = AdaptiveLimiter("test", max_concurrency=1)
+    limiter.acquire("interactive", None)
+    order = []
+
+    def wait(level):
+        limiter.acquire(level, 5)
+        order.append(level)
+        limiter.release("ok", 0.0)
+
+    batch = threading.Thread(target=wait, args=("batch",))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=wait, args=("interactive",))
+    interactive.start()
+    time.sleep(0.05)
+    limiter.release("ok", 0.0)
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_rate_bucket_spaces_out_calls():
+    limiter = AdaptiveLimiter("test", max_concurrency=4, rpm=600)  # 10/s, burst 10
+    start = time.monotonic()
+    for _ in range(12):
+        limiter.call(lambda: None)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_shared_bucket_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    a = AdaptiveLimiter("shared", max_concurrency=4, rpm=60, shared_path=path)  # burst of 1
+    b = AdaptiveLimiter("shared", max_concurrency=4, rpm=60, shared_path=path)
+    a.acquire("interactive", 0.1)
+    with pytest.raises(RateLimitTimeout):
+        b.acquire("interactive", 0.1)
+
+
+def test_slow_shared_bucket_does_not_block_other_callers(tmp_path):
+    limiter = AdaptiveLimiter("slow", max_concurrency=4, rpm=60, shared_path=str(tmp_path / "b.sqlite3"))
+    in_take, release = threading.Event(), threading.Event()
+
+    def slow_take():
+        in_take.set()
+        release.wait(5)  # another worker holds the SQLite write lock
+        return 0.0
+
+    limiter._bucket.take = slow_take
+    caller = threading.Thread(target=limiter.acquire, args=("interactive", 5))
+    caller.start()
+    assert in_take.wait(5)
+    assert limiter._cond.acquire(timeout=0.5)  # release() and other callers are not stuck
+    limiter._cond.release()
+    release.set()
+    caller.join(5)
+    assert limiter.active == 1
+
+
+def test_stream_is_not_retried_after_the_first_chunk():
+    limiter = AdaptiveLimiter("test", max_concurrency=2, max_retries=3)
+    starts = []
+
+    def stream():
+        starts.append(1)
+        yield "a"
+        raise _Upstream(503)
+
+    received = []
+    with pytest.raises(_Upstream):
+        for chunk in limiter.stream(stream):
+            received.append(chunk)
+    assert received == ["a"] and len(starts) == 1
+    assert limiter.active == 0
+
+
+def test_async_call_retries_and_releases():
+    limiter = AdaptiveLimiter("test", max_concurrency=2, max_retries=2)
+    failures = [_Upstream(429)]
+
+    async def call():
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    assert asyncio.run(limiter.acall(call)) == "ok"
+    assert limiter.active == 0
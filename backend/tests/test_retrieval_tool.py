@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+
+from app.tools import retrieval_tool
+from app.tools.cache import InMemoryToolCacheBackend, ToolResultCache, get_policy, make_cache_key
+from app.tools.retrieval_tool import _dedupe, format_passages
+
+
+def _doc(text, url="https://docs.example.com/users", chunk_id=0):
+    return Document(page_content=text, metadata={"url": url, "chunk_id": chunk_id})
+
+
+def test_dedupe_drops_repeated_and_contained_chunks():
+    docs = [
+        _doc("GET /users lists users.  Supports paging.", chunk_id=1),
+        _doc("GET /users lists users. Supports paging.", chunk_id=1),  # same chunk again
+        _doc("get /users   lists users.", chunk_id=2),  # contained in the first
+        _doc("POST /users creates a user.", chunk_id=3),
+        _doc("   ", chunk_id=4),
+    ]
+    assert [d.metadata["chunk_id"] for d in _dedupe(docs)] == [1, 3]
+
+
+def test_passages_are_numbered_and_tagged_with_their_source():
+    docs = [_doc("First.", chunk_id=7), Document(page_content="Second.", metadata={"source": "pdf"})]
+    assert format_passages(docs) == "[1] (https://docs.example.com/users, chunk 7) First.\n\n[2] (pdf) Second."
+
+
+def test_passages_and_the_total_are_clipped():
+    word = "token "
+    long_doc = _doc(word * 200, chunk_id=0)
+    first = format_passages([long_doc]).split(") ", 1)[1]
+    assert len(first) <= 700 + 2 and first.endswith(" …")
+
+    docs = [_doc(f"{i} " + word * 150, chunk_id=i) for i in range(20)]
+    rendered = format_passages(docs)
+    assert len(rendered) <= 4000 + 2 * len(docs)  # entries plus the blank lines between them
+    assert 1 < rendered.count("\n\n") + 1 < len(docs)
+
+
+def test_retrieval_mode_shares_the_cache_entry_across_sessions(monkeypatch):
+    backend = InMemoryToolCacheBackend()
+    cache = ToolResultCache(backend)
+    calls = []
+    monkeypatch.delenv("KNOWLEDGE_TOOL_MODE", raising=False)
+    monkeypatch.setattr(retrieval_tool, "get_tool_cache", lambda: cache)
+    monkeypatch.setattr(
+        retrieval_tool, "search_similar_documents", lambda question, k: calls.append(k) or [_doc("Users.")]
+    )
+    first = retrieval_tool.knowledge_search.invoke({"question": "users", "session_id": "a"})
+    second = retrieval_tool.knowledge_search.invoke({"question": "users", "session_id": "b"})
+    assert first == second and len(calls) == 1
+    policy = get_policy("knowledge_search")
+    key = make_cache_key("knowledge_search", {"question": "users", "mode": "retrieval"}, policy)
+    assert backend.get(key) == first  # keyed without session_id
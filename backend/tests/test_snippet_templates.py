@@ -0,0 +1,56 @@
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from app.tools.snippet_templates import _JS_RESERVED, render_snippet
+
+KEYWORD_PATH = "/courses/{class}/items/{from}/{new}/{response}"
+
+
+@pytest.mark.parametrize("lib", ["requests", "httpx"])
+def test_python_snippets_parse_with_keyword_path_params(lib):
+    code = render_snippet(KEYWORD_PATH, "POST", "python", '{"name": "x"}', lib)
+    compile(code, "<snippet>", "exec")
+    assert "class_ = " in code and "from_ = " in code and "response_ = " in code
+
+
+def test_params_differing_only_by_case_or_separator_stay_distinct():
+    url = "https://api.x.com/orgs/{orgId}/members/{org_id}"
+    code = render_snippet(url, "GET", "python")
+    compile(code, "<snippet>", "exec")
+    assert 'org_id = "<orgId>"' in code and 'org_id_2 = "<org_id>"' in code
+    assert "/orgs/{org_id}/members/{org_id_2}" in code
+    js = render_snippet(url, "GET", "javascript")
+    assert js.count("const orgId ") == 1 and "/members/${orgId2}" in js
+
+
+def test_python_snippet_for_plain_get():
+    code = render_snippet("/users/{userId}", "get", "python", "limit=10")
+    compile(code, "<snippet>", "exec")
+    assert 'f"{BASE_URL}/users/{user_id}"' in code
+    assert '"limit": 10' in code
+
+
+@pytest.mark.parametrize("lib", ["fetch", "axios"])
+def test_js_snippets_never_declare_reserved_or_taken_names(lib):
+    code = render_snippet("/x/{new}/{class}/{data}/{params}", "GET", "javascript", "q=1", lib)
+    declared = re.findall(r"^const (\w+) =", code, flags=re.M)
+    assert {"new_", "class_", "data_", "params_"} <= set(declared)
+    assert not set(declared) & _JS_RESERVED
+    assert len(declared) == len(set(declared))
+    assert "${new_}" in code
+
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+@pytest.mark.parametrize("lib", ["fetch", "axios"])
+def test_js_snippets_parse_with_keyword_path_params(lib, tmp_path):
+    source = tmp_path / "snippet.mjs"
+    source.write_text(render_snippet(KEYWORD_PATH, "POST", "javascript", '{"name": "x"}', lib))
+    subprocess.run(["node", "--check", str(source)], check=True, capture_output=True)
+
+
+def test_unsupported_library_falls_back():
+    assert render_snippet("/users", "GET", "ruby") is None
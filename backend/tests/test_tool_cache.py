@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from app.tools.cache import (
+    InMemoryToolCacheBackend,
+    SQLiteToolCacheBackend,
+    ToolResultCache,
+    Uncached,
+    get_policy,
+    make_cache_key,
+)
+from app.utils.deadline import DeadlineExceeded, RequestBudget, budget_context
+
+
+def test_key_ignores_whitespace_and_casefolds_flagged_args():
+    policy = get_policy("code_snippet")
+    a = make_cache_key("code_snippet", {"endpoint": "/users ", "method": "get"}, policy)
+    b = make_cache_key("code_snippet", {"endpoint": " /users", "method": "GET"}, policy)
+    c = make_cache_key("code_snippet", {"endpoint": "/Users", "method": "GET"}, policy)
+    assert a == b
+    assert a != c  # endpoint is case-sensitive
+
+
+def test_ttl_override_from_env(monkeypatch):
+    monkeypatch.setenv("TOOL_CACHE_TTL_CODE_SNIPPET", "5")
+    assert get_policy("code_snippet").ttl_seconds == 5.0
+
+
+def test_memory_backend_expiry_and_lru():
+    backend = InMemoryToolCacheBackend(max_entries=2)
+    backend.set("a", "t", "1", ttl_seconds=60)
+    backend.set("b", "t", "2", ttl_seconds=60)
+    backend.get("a")  # a is now most recent
+    backend.set("c", "t", "3", ttl_seconds=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    backend.set("d", "t", "4", ttl_seconds=-1)
+    assert backend.get("d") is None
+
+
+def test_sqlite_backend_roundtrip_and_delete_tools(tmp_path):
+    backend = SQLiteToolCacheBackend(str(tmp_path / "cache.sqlite3"))
+    backend.set("k1", "endpoint_suggester", "v1", ttl_seconds=60)
+    backend.set("k2", "code_snippet", "v2", ttl_seconds=60)
+    backend.set("k3", "code_snippet", "old", ttl_seconds=-1)
+    assert backend.get("k1") == "v1"
+    assert backend.get("k3") is None
+    assert backend.delete_tools(["endpoint_suggester"]) == 1
+    assert backend.get("k1") is None
+    assert SQLiteToolCacheBackend(str(tmp_path / "cache.sqlite3")).get("k2") == "v2"
+
+
+def test_get_or_compute_hits_and_stats():
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "answer"
+
+    assert cache.get_or_compute("code_snippet", {"method": "GET"}, compute) == "answer"
+    assert cache.get_or_compute("code_snippet", {"method": "get"}, compute) == "answer"
+    assert len(calls) == 1
+    assert cache.stats()["code_snippet"] == {"hits": 1, "misses": 1, "errors": 0, "hit_ratio": 0.5}
+
+
+def test_uncached_results_are_returned_but_not_stored():
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    result = cache.get_or_compute("knowledge_search", {"question": "q"}, lambda: Uncached("nothing found"))
+    assert result == "nothing found" and type(result) is str
+    assert cache.get_or_compute("knowledge_search", {"question": "q"}, lambda: "passages") == "passages"
+    assert cache.get_or_compute("knowledge_search", {"question": "q"}, lambda: "other") == "passages"
+
+
+def test_knowledge_search_does_not_cache_empty_retrievals(monkeypatch):
+    from app.tools import retrieval_tool
+
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    monkeypatch.setattr(retrieval_tool, "get_tool_cache", lambda: cache)
+    monkeypatch.setattr(retrieval_tool, "search_similar_documents", lambda question, k: [])
+    assert retrieval_tool.knowledge_search.invoke({"question": "q"}).startswith("No relevant")
+    assert cache.stats()["knowledge_search"]["misses"] == 1
+    retrieval_tool.knowledge_search.invoke({"question": "q"})
+    assert cache.stats()["knowledge_search"]["misses"] == 2
+
+
+def test_answer_mode_is_never_served_from_the_cache(monkeypatch):
+    from app.models.schemas import ChatResponse, SourceRef
+    from app.tools import retrieval_tool
+
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    turns = []
+
+    def answer_query(question, session_id):
+        turns.append((question, session_id))  # the real one records the turn in history
+        return ChatResponse(answer=f"answer {len(turns)}", sources=[SourceRef(id="c1")])
+
+    monkeypatch.setenv("KNOWLEDGE_TOOL_MODE", "answer")
+    monkeypatch.setattr(retrieval_tool, "get_tool_cache", lambda: cache)
+    monkeypatch.setattr(retrieval_tool, "answer_query", answer_query)
+    args = {"question": "q", "session_id": "s"}
+    assert retrieval_tool.knowledge_search.invoke(args) == "answer 1"
+    assert retrieval_tool.knowledge_search.invoke(args) == "answer 2"
+    assert turns == [("q", "s"), ("q", "s")]
+    assert "knowledge_search" not in cache.stats()
+
+
+def test_backend_errors_never_fail_the_tool():
+    class Broken(InMemoryToolCacheBackend):
+        def get(self, key):
+            raise OSError("disk")
+
+        def set(self, *args):
+            raise OSError("disk")
+
+    cache = ToolResultCache(Broken())
+    assert cache.get_or_compute("code_snippet", {}, lambda: "ok") == "ok"
+    assert cache.stats()["code_snippet"]["errors"] == 2
+
+
+def test_invalidation_drops_only_corpus_dependent_tools():
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    cache.put("knowledge_search", {"question": "q"}, "passages")
+    cache.put("code_snippet", {"method": "GET"}, "snippet")
+    assert cache.invalidate_corpus_dependent() == 1
+    assert cache.get_or_compute("code_snippet", {"method": "GET"}, lambda: "new") == "snippet"
+    assert cache.get_or_compute("knowledge_search", {"question": "q"}, lambda: "new") == "new"
+
+
+def test_miss_is_not_computed_after_the_deadline():
+    cache = ToolResultCache(InMemoryToolCacheBackend())
+    cache.put("code_snippet", {"method": "GET"}, "cached")
+    budget = RequestBudget(route="agent", timeout_s=0.0, started=time.monotonic() - 1)
+    ctx = budget_context(budget)
+    assert ctx.run(cache.get_or_compute, "code_snippet", {"method": "GET"}, lambda: "new") == "cached"
+    with pytest.raises(DeadlineExceeded):
+        ctx.run(cache.get_or_compute, "code_snippet", {"method": "POST"}, lambda: "new")
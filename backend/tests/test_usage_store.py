@@ -0,0 +1,67 @@
+import pytest
+
+from app.services.usage_store import SQLiteUsageStore, UsageStore, get_usage_store
+
+
+def _resolve():
+    return get_usage_store.__wrapped__()
+
+
+def test_usage_is_not_stored_without_a_backend_or_budget(monkeypatch):
+    monkeypatch.delenv("TOKEN_USAGE_BACKEND", raising=False)
+    monkeypatch.delenv("SESSION_TOKEN_BUDGET", raising=False)
+    assert _resolve() is None
+
+
+def test_a_session_budget_turns_on_the_default_backend(monkeypatch, tmp_path):
+    monkeypatch.delenv("TOKEN_USAGE_BACKEND", raising=False)
+    monkeypatch.setenv("SESSION_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("TOKEN_USAGE_SQLITE_PATH", str(tmp_path / "usage.sqlite3"))
+    store = _resolve()
+    try:
+        assert isinstance(store, SQLiteUsageStore)
+    finally:
+        store.close()
+
+
+def test_usage_store_is_abstract():
+    with pytest.raises(TypeError):
+        UsageStore()
+
+
+def test_mongo_store_completes_a_retried_partial_batch(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    from pymongo.errors import AutoReconnect
+
+    import app.mongo as mongo
+    from app.services.usage_store import MongoUsageStore
+
+    monkeypatch.setattr(mongo, "_sync_client", mongomock.MongoClient())
+    store = MongoUsageStore(collection="token_usage_test")
+    coll = store._coll
+
+    class _LostReply:
+        """Writes the first two rows, then loses the connection before replying."""
+
+        def __init__(self):
+            self.calls = 0
+
+        def insert_many(self, rows, ordered=True):
+            self.calls += 1
+            if self.calls == 1:
+                coll.insert_many(rows[:2])
+                raise AutoReconnect("connection reset")
+            return coll.insert_many(rows, ordered=ordered)
+
+        def __getattr__(self, name):
+            return getattr(coll, name)
+
+    store._coll = _LostReply()
+    counts = {"input_tokens": 1, "output_tokens": 0, "embedding_tokens": 0, "llm_calls": 1}
+    for i in range(5):
+        store.record({"ts": i, "request_id": "r", "session_id": "s", "route": "chat", "component": "rag",
+                      "model": "m", **counts})
+    assert not store._buffer.flush()  # the lost reply
+    assert store._buffer.flush()  # the retry stores what is missing
+    assert store.session_usage("s") == {"rag": {key: 5 * value for key, value in counts.items()}}
+    store.close()
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from app.services import warmup
+
+
+def _settle(state, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while state._running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not state._running
+
+
+@pytest.fixture
+def deps(monkeypatch):
+    """Replace the real steps with two controllable ones and a fresh state."""
+    gate = threading.Event()
+    outcomes = {"index": [RuntimeError("index offline")]}
+
+    def core():
+        assert gate.wait(5)
+
+    def index():
+        if outcomes["index"]:
+            raise outcomes["index"].pop(0)
+
+    monkeypatch.setattr(
+        warmup,
+        "_dependencies",
+        lambda: [warmup.Dependency("core", True, core), warmup.Dependency("index", False, index)],
+    )
+    state = warmup._WarmUp()
+    monkeypatch.setattr(warmup, "_STATE", state)
+    monkeypatch.setenv("WARMUP_ENABLED", "true")
+    monkeypatch.setenv("WARMUP_RETRY_S", "0")
+    return state, gate, outcomes
+
+
+def test_ready_is_503_while_warming_then_degraded(client, deps, monkeypatch):
+    state, gate, _ = deps
+    monkeypatch.setenv("WARMUP_RETRY_S", "3600")
+    state.start()
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming"
+
+    gate.set()
+    _settle(state)
+    body = client.get("/ready").json()
+    assert body["status"] == "degraded" and body["ready"] is True
+    assert body["dependencies"]["index"]["status"] == "error"
+
+
+def test_failed_optional_dependency_is_retried_while_degraded(client, deps):
+    state, gate, _ = deps
+    gate.set()
+    state.run()
+    assert state.status() == "degraded"
+
+    client.get("/ready")  # triggers the retry of "index" only
+    _settle(state)
+
+    body = client.get("/ready").json()
+    assert body["status"] == "ready"
+    assert body["dependencies"]["index"]["attempts"] == 2
+    assert body["dependencies"]["core"]["attempts"] == 1
+
+
+def test_failed_critical_dependency_is_retried(client, deps):
+    state, gate, outcomes = deps
+    outcomes["index"].clear()
+    gate.set()
+
+    def down():
+        raise ConnectionError("down")
+
+    state.dependencies["core"].warm = down
+    state.run()
+    assert client.get("/ready").status_code == 503
+    _settle(state)
+    assert state.status() == "failed"
+
+    state.dependencies["core"].warm = lambda: None
+    client.get("/ready")
+    _settle(state)
+    response = client.get("/ready")
+    assert response.status_code == 200 and response.json()["status"] == "ready"
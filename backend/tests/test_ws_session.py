@@ -0,0 +1,69 @@
+from app.history_store import get_history_store
+
+
+def _until(ws, *types):
+    """Receive messages until one of *types*; returns (tokens, last message)."""
+    tokens = []
+    while True:
+        message = ws.receive_json()
+        if message["type"] == "token":
+            tokens.append(message["text"])
+        elif message["type"] in types:
+            return tokens, message
+
+
+def test_pipelined_turns_are_answered_in_order(client):
+    with client.websocket_connect("/ws/ws-pipeline") as ws:
+        assert ws.receive_json() == {"type": "ready", "session_id": "ws-pipeline"}
+        ws.send_json({"type": "ask", "id": "1", "question": "How do I list users?"})
+        ws.send_json({"type": "ask", "id": "2", "question": "And page them?", "include_usage": True})
+        done = []
+        while len(done) < 2:
+            message = ws.receive_json()
+            if message["type"] == "done":
+                done.append(message)
+        assert [m["id"] for m in done] == ["1", "2"]
+        assert "usage" in done[1] and "usage" not in done[0]
+    messages = get_history_store().get("ws-pipeline").messages
+    assert [m.content for m in messages if m.type == "human"] == ["How do I list users?", "And page them?"]
+
+
+def test_queued_turn_can_be_cancelled(client):
+    with client.websocket_connect("/ws/ws-cancel") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "ask", "id": "a", "question": "first"})
+        ws.send_json({"type": "ask", "id": "b", "question": "second"})
+        ws.send_json({"type": "cancel", "id": "b"})
+        seen = {}
+        while len(seen) < 2:
+            message = ws.receive_json()
+            if message["type"] in ("done", "cancelled"):
+                seen[message["id"]] = message["type"]
+        assert seen == {"a": "done", "b": "cancelled"}
+
+
+def test_protocol_errors(client):
+    with client.websocket_connect("/ws/ws-errors") as ws:
+        ws.receive_json()
+        ws.send_text("not json")
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "ask", "id": "x", "question": "  "})
+        assert ws.receive_json() == {"type": "error", "id": "x", "status": 400, "detail": "Question must not be empty."}
+        ws.send_json({"type": "ask", "id": "y", "question": "q", "mode": "sql"})
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "cancel", "id": "missing"})
+        assert ws.receive_json()["status"] == 404
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_agent_mode_and_session_budget(client, monkeypatch):
+    with client.websocket_connect("/ws/ws-budget") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "ask", "id": "1", "question": "How do I list users?", "mode": "agent"})
+        tokens, message = _until(ws, "done", "error")
+        assert message["type"] == "done" and tokens
+        monkeypatch.setenv("SESSION_TOKEN_BUDGET", "1")
+        ws.send_json({"type": "ask", "id": "2", "question": "again"})
+        _, message = _until(ws, "done", "error")
+        assert message["status"] == 429